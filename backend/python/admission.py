@@ -0,0 +1,234 @@
+"""
+Overload protection for the inference function: per-request deadlines, a bounded admission
+queue that sheds load (HTTP 429 + Retry-After) once the estimated queueing delay exceeds what
+the caller can wait, and single-flight coalescing of concurrent requests for the same image.
+"""
+import math
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class DeadlineExceeded(TimeoutError):
+    """The caller's deadline passed before the work could be done."""
+
+
+class Overloaded(Exception):
+    """The request was shed; `retry_after_s` is a hint for the Retry-After header."""
+
+    def __init__(self, message, retry_after_s):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+    @property
+    def retry_after_header(self):
+        """Retry-After value: whole seconds, at least 1."""
+        return str(max(1, math.ceil(self.retry_after_s)))
+
+
+class Deadline:
+    """Point in time (time.perf_counter()) after which a request's result is no longer wanted."""
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, timeout_s):
+        self.expires_at = time.perf_counter() + timeout_s
+
+    def remaining(self):
+        return self.expires_at - time.perf_counter()
+
+    def check(self, stage):
+        """Raises DeadlineExceeded if the deadline passed; called before each expensive stage."""
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+class AdmissionController:
+    """
+    Bounds the requests worked on at once to `max_concurrent`, with at most `max_queue` waiting.
+
+    A request is rejected up front (Overloaded) when the queue is full or when its estimated
+    wait (position in the queue / max_concurrent x average service time) exceeds both
+    `max_wait_s` and its remaining deadline; a request that is admitted to the queue but
+    still waiting when its deadline passes gets DeadlineExceeded.
+    """
+
+    def __init__(self, max_concurrent, max_queue=64, max_wait_s=5.0, ewma_alpha=0.2):
+        """
+        Args:
+            max_concurrent (int): Requests worked on at once.
+            max_queue (int): Requests allowed to wait for a slot.
+            max_wait_s (float): Longest estimated wait accepted (further capped by the deadline).
+            ewma_alpha (float): Weight of the latest request in the average service time.
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be >= 1")
+        self.max_concurrent = int(max_concurrent)
+        self.max_queue = int(max_queue)
+        self.max_wait_s = float(max_wait_s)
+        self.ewma_alpha = float(ewma_alpha)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._waiting = 0
+        self._avg_service_s = 0.0
+        self._admitted = 0
+        self._shed = 0
+        self._expired_in_queue = 0
+        self._wait_sum_s = 0.0
+
+    def estimated_wait_s(self, position):
+        """Expected queueing delay of the `position`-th waiting request (1 = next in line)."""
+        with self._cond:
+            return self._estimated_wait_locked(position)
+
+    def _estimated_wait_locked(self, position):
+        return position * self._avg_service_s / self.max_concurrent
+
+    def admit(self, deadline=None):
+        """
+        Context manager holding one of the `max_concurrent` slots for the block.
+
+        Raises:
+            Overloaded: If the request is shed.
+            DeadlineExceeded: If the deadline passes while waiting for a slot.
+        """
+        return _Admission(self, deadline)
+
+    def _acquire(self, deadline):
+        started_at = time.perf_counter()
+        with self._cond:
+            if self._in_flight >= self.max_concurrent:
+                position = self._waiting + 1
+                estimated_wait_s = self._estimated_wait_locked(position)
+                budget_s = self.max_wait_s if deadline is None else min(self.max_wait_s, deadline.remaining())
+                if self._waiting >= self.max_queue or estimated_wait_s > budget_s:
+                    self._shed += 1
+                    raise Overloaded(
+                        f"Overloaded: {self._in_flight} requests in flight, {self._waiting} queued "
+                        f"(estimated wait {estimated_wait_s:.2f} s)",
+                        retry_after_s=max(estimated_wait_s, self._avg_service_s),
+                    )
+                self._waiting += 1
+                try:
+                    admitted = self._cond.wait_for(
+                        lambda: self._in_flight < self.max_concurrent,
+                        timeout=None if deadline is None else max(0.0, deadline.remaining()),
+                    )
+                finally:
+                    self._waiting -= 1
+                if not admitted:
+                    self._expired_in_queue += 1
+                    raise DeadlineExceeded("Deadline exceeded while waiting for admission")
+            self._in_flight += 1
+            self._admitted += 1
+            self._wait_sum_s += time.perf_counter() - started_at
+
+    def _release(self, service_s):
+        with self._cond:
+            self._in_flight -= 1
+            if self._avg_service_s == 0.0:
+                self._avg_service_s = service_s
+            else:
+                self._avg_service_s += self.ewma_alpha * (service_s - self._avg_service_s)
+            self._cond.notify_all()  # Waiters whose deadline passed drop out of wait_for on their own
+
+    def stats(self):
+        with self._cond:
+            return {
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "expired_in_queue": self._expired_in_queue,
+                "avg_admission_wait_ms": 1000.0 * self._wait_sum_s / self._admitted if self._admitted else 0.0,
+                "avg_service_ms": 1000.0 * self._avg_service_s,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+            }
+
+
+class _Admission:
+    """One admitted request (see AdmissionController.admit)."""
+
+    def __init__(self, controller, deadline):
+        self._controller = controller
+        self._deadline = deadline
+        self._started_at = None
+
+    def __enter__(self):
+        self._controller._acquire(self._deadline)
+        self._started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._controller._release(time.perf_counter() - self._started_at)
+        return False
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function, callers
+    arriving while it runs wait for and share its result (or exception).
+
+    The function runs under the leader's deadline. If it fails with DeadlineExceeded, a waiting
+    caller whose own `timeout` has not passed runs its own function instead (becoming the new
+    leader, or joining another waiter that did), so a short-deadline leader cannot fail callers
+    that were willing to wait longer.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> Future
+        self.leaders = 0
+        self.coalesced = 0
+        self.retried = 0
+
+    def do(self, key, fn, timeout=None):
+        """
+        Returns (fn() result, whether it was shared from another caller's call).
+
+        Raises:
+            DeadlineExceeded: If a waiting caller's `timeout` (seconds) passes first;
+                              the running call is not affected.
+        """
+        expires_at = None if timeout is None else time.perf_counter() + timeout
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=timeout), True
+            except DeadlineExceeded:
+                # The leader's deadline passed; retry under ours if it has not
+                remaining = None if expires_at is None else expires_at - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    raise
+                with self._lock:
+                    self.retried += 1
+                return self.do(key, fn, remaining)
+            except FutureTimeoutError:
+                raise DeadlineExceeded("Deadline exceeded while waiting for a coalesced request") from None
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def stats(self):
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "retried": self.retried,
+                    "in_flight": len(self._in_flight)}
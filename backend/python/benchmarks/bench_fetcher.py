@@ -0,0 +1,95 @@
+"""
+Benchmark of image download paths against a local keep-alive HTTP stand-in server:
+
+- get_file: the original tf.keras.utils.get_file download to /tmp + tf.io.read_file (TensorFlow required)
+- urlopen: a new connection per image with urllib
+- fetcher: ImageFetcher, sequential, reusing pooled connections
+- fetcher_parallel: ImageFetcher.fetch_bytes from a thread pool, as batch requests download their images
+
+Usage (from backend/python):
+    python benchmarks/bench_fetcher.py --images 40 --image-kb 300
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from image_fetcher import ImageFetcher  # noqa: E402
+from local_standins import LocalImageServer  # noqa: E402
+
+
+def _get_file_path(urls, tmp_dir):
+    import tensorflow as tf
+
+    for i, url in enumerate(urls):
+        # Unique file names so get_file downloads instead of hitting its own cache
+        path = tf.keras.utils.get_file(f"bench_{time.time_ns()}_{i}.jpg", url, cache_dir=tmp_dir)
+        tf.io.read_file(path).numpy()
+
+
+def _urlopen_path(urls):
+    for url in urls:
+        with urllib.request.urlopen(url) as response:
+            response.read()
+
+
+def _parallel_path(fetcher, urls, workers):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(fetcher.fetch_bytes, urls))
+
+
+def _timed(fn):
+    started_at = time.perf_counter()
+    fn()
+    return time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=40, help="Images per round.")
+    parser.add_argument("--image-kb", type=int, default=300, help="Size of each served image.")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=8, help="Download threads of fetcher_parallel.")
+    parser.add_argument("--output", help="Optional path of a JSON report.")
+    args = parser.parse_args()
+
+    images = {f"/leaf_{i}.jpg": os.urandom(args.image_kb * 1024) for i in range(args.images)}
+    fetcher = ImageFetcher(pool_maxsize=args.workers)
+    results = {}
+    with LocalImageServer(images) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        urls = [server.url(path) for path in images]
+        paths = {
+            "urlopen": lambda: _urlopen_path(urls),
+            "fetcher": lambda: [fetcher.fetch_bytes(url) for url in urls],
+            "fetcher_parallel": lambda: _parallel_path(fetcher, urls, args.workers),
+        }
+        try:
+            import tensorflow  # noqa: F401
+            paths["get_file"] = lambda: _get_file_path(urls, tmp_dir)
+        except ImportError:
+            print("TensorFlow not installed; skipping the get_file baseline.")
+
+        for name, fn in paths.items():
+            fn()  # warm-up (connection pools, imports)
+            seconds = min(_timed(fn) for _ in range(args.rounds))
+            results[name] = {
+                "ms_per_image": 1000.0 * seconds / args.images,
+                "images_per_second": args.images / seconds,
+            }
+
+    report = {"images": args.images, "image_kb": args.image_kb, "paths": results, "fetcher": fetcher.stats()}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
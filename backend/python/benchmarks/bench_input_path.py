@@ -0,0 +1,129 @@
+"""
+Microbenchmark of the interpreter input/output path: the original per-request code
+(get_input_details/get_output_details on every call, np.expand_dims/np.stack, INT8
+quantization through temporaries, set_tensor/get_tensor copies) against
+PooledInterpreter.run (cached tensor details, writes into interpreter.tensor() views,
+in-place (de)quantization on preallocated buffers).
+
+Reports latency and the transient Python/NumPy allocations per call (tracemalloc peak
+above baseline) for FP32 and INT8 tiny models, or for a given --model.
+
+Usage (from backend/python, TensorFlow installed):
+    python benchmarks/bench_input_path.py --batch-size 1 --iterations 200
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from interpreter_pool import PooledInterpreter  # noqa: E402
+from preprocessing import resize_bilinear  # noqa: E402
+from runtime import softmax  # noqa: E402
+from tiny_model import build_tiny_tflite_model  # noqa: E402
+
+INPUT_SIZE = 224
+
+
+def _legacy_run(interpreter, decoded_images):
+    """The pre-pool request path: resize, stack, quantize via temporaries, set/get_tensor copies."""
+    batch = np.stack([resize_bilinear(img, INPUT_SIZE, INPUT_SIZE) for img in decoded_images])
+    input_details = interpreter.get_input_details()
+    output_details = interpreter.get_output_details()
+    if batch.shape[0] != input_details[0]['shape'][0]:
+        interpreter.resize_tensor_input(input_details[0]['index'], batch.shape)
+        interpreter.allocate_tensors()
+        input_details = interpreter.get_input_details()
+        output_details = interpreter.get_output_details()
+    if input_details[0]['dtype'] == np.int8:
+        scale, zero_point = input_details[0]["quantization"]
+        batch = (batch / scale + zero_point).astype(np.int8)
+    interpreter.set_tensor(input_details[0]['index'], batch)
+    interpreter.invoke()
+    output = interpreter.get_tensor(output_details[0]['index'])
+    if output_details[0]['dtype'] == np.int8:
+        scale, zero_point = output_details[0]["quantization"]
+        output = (output.astype(np.float32) - zero_point) * scale
+    return softmax(output, axis=-1)
+
+
+def _pooled_run(pooled, decoded_images):
+    """The current request path (see main._run_inference)."""
+    def write_input(out, image):
+        resize_bilinear(image, INPUT_SIZE, INPUT_SIZE, out=out)
+
+    return softmax(pooled.run(decoded_images, write_input=write_input), axis=-1)
+
+
+def _measure(fn, decoded_images, iterations):
+    for _ in range(5):  # warm-up (also triggers any tensor resize)
+        fn(decoded_images)
+
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        fn(decoded_images)
+    latency_ms = 1000.0 * (time.perf_counter() - started_at) / iterations
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(min(iterations, 50)):
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(decoded_images)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - baseline)
+    tracemalloc.stop()
+    return {"latency_ms": latency_ms, "transient_alloc_bytes_per_call": float(np.mean(peaks))}
+
+
+def _bench_model(model_path, batch_size, iterations, rng):
+    decoded = [rng.integers(0, 256, size=(336, 448, 3), dtype=np.uint8) for _ in range(batch_size)]
+    legacy_interpreter = tf.lite.Interpreter(model_path=model_path)
+    legacy_interpreter.allocate_tensors()
+    pooled = PooledInterpreter(tf.lite.Interpreter(model_path=model_path))
+
+    legacy = _measure(lambda imgs: _legacy_run(legacy_interpreter, imgs), decoded, iterations)
+    current = _measure(lambda imgs: _pooled_run(pooled, imgs), decoded, iterations)
+    np.testing.assert_allclose(
+        _legacy_run(legacy_interpreter, decoded), _pooled_run(pooled, decoded), rtol=1e-5, atol=1e-6
+    )
+    return {"legacy": legacy, "pooled": current}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="A .tflite model to benchmark instead of the generated tiny models.")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", help="Optional path of a JSON report.")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    report = {"batch_size": args.batch_size, "iterations": args.iterations, "models": {}}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.model:
+            models = {os.path.basename(args.model): args.model}
+        else:
+            models = {
+                "tiny_fp32": build_tiny_tflite_model(os.path.join(tmp_dir, "tiny_fp32.tflite")),
+                "tiny_int8": build_tiny_tflite_model(os.path.join(tmp_dir, "tiny_int8.tflite"), quantize_int8=True),
+            }
+        for name, path in models.items():
+            report["models"][name] = _bench_model(path, args.batch_size, args.iterations, rng)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark of diagnosis payload size and serialization time per score encoding
+(see response_encoding.py), against the original response (full score list, json.dumps).
+
+For single and batch responses of synthetic softmax outputs, reports bytes per response and
+microseconds per serialization with the standard json module and, when installed, orjson.
+The "log" rows are the debug line that used to print the whole diagnosis versus the trimmed one.
+
+Usage (from backend/python):
+    python benchmarks/bench_response_encoding.py --classes 38 --batch-size 16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import response_encoding  # noqa: E402
+from response_encoding import SCORE_FORMATS, encode_scores  # noqa: E402
+
+
+def _probabilities(rng, classes, count):
+    logits = rng.normal(0, 3, size=(count, classes)).astype(np.float32)
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _diagnosis(predictions, class_names):
+    index = int(np.argmax(predictions))
+    return {
+        "class_name": class_names[index],
+        "confidence": float(predictions[index]),
+        "message": f"Detected: {class_names[index]} with {predictions[index]*100:.2f}% confidence.",
+    }
+
+
+def _original_body(rows, class_names):
+    """The response as built before the compact encodings: all scores, default json.dumps."""
+    results = [{
+        "diagnosis": {**_diagnosis(p, class_names), "full_prediction_scores": p.tolist()},
+        "diagnosisId": f"diagnosis_leaf_{i}_1700000000_{i}",
+        "cached": False,
+    } for i, p in enumerate(rows)]
+    return results[0] if len(results) == 1 else {"results": results}
+
+
+def _body(rows, class_names, score_format, top_k):
+    results = [{
+        "diagnosis": {**_diagnosis(p, class_names), **encode_scores(p, class_names, score_format, top_k)},
+        "diagnosisId": f"diagnosis_leaf_{i}_1700000000_{i}",
+        "cached": False,
+    } for i, p in enumerate(rows)]
+    return results[0] if len(results) == 1 else {"results": results}
+
+
+def _time_us(fn, repeats):
+    started_at = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return 1e6 * (time.perf_counter() - started_at) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--classes", type=int, default=38)
+    parser.add_argument("--batch-size", type=int, default=16, help="Images per batch response.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    class_names = [f"Plant___Disease_name_{i}" for i in range(args.classes)]
+    report = {"orjson": response_encoding.orjson is not None, "responses": {}}
+
+    for label, count in (("single", 1), (f"batch_{args.batch_size}", args.batch_size)):
+        rows = _probabilities(rng, args.classes, count)
+        encoders = {"original": (lambda: json.dumps(_original_body(rows, class_names)))}
+        for score_format in SCORE_FORMATS:
+            encoders[score_format] = (
+                lambda f=score_format: response_encoding.dumps(_body(rows, class_names, f, args.top_k))
+            )
+        report["responses"][label] = {
+            name: {"bytes": len(encoder()), "encode_us": round(_time_us(encoder, args.repeats), 2)}
+            for name, encoder in encoders.items()
+        }
+
+    diagnosis = {**_diagnosis(rows[0], class_names), "full_prediction_scores": rows[0].tolist()}
+    report["log_line_bytes"] = {
+        "original": len("Inference result: %s" % diagnosis),
+        "trimmed": len("Inference result: %s (%.4f)" % (diagnosis["class_name"], diagnosis["confidence"])),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
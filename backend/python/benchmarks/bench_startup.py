@@ -0,0 +1,112 @@
+"""
+Startup benchmark: time-to-first-prediction and per-worker memory for N prefork-style worker
+processes sharing one model cache directory, with lazy loading (model loaded inside the
+first request) versus eager warm-up (model loaded and warmed before traffic).
+
+Each worker is a fresh process that imports main, gets the local Firestore/Storage stand-ins
+(see load_test.install_local_clients) and then serves one request for a local image. For the
+eager mode the worker runs main._warm_up() right after import, as AGROAI_STARTUP_MODE=eager
+does, before the request "arrives".
+
+Reported per mode: time to ready, first-request latency, time from process start to first
+prediction, and RSS/PSS per worker (PSS splits the memory-mapped model between workers).
+
+Usage (from backend/python, TensorFlow installed for the tiny model):
+    python benchmarks/bench_startup.py --workers 4 --output startup.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import FakeRequest, install_local_clients, synthetic_jpeg  # noqa: E402
+from local_standins import LocalImageServer  # noqa: E402
+
+
+def _worker(mode, model_path, cache_dir, image_url, start_barrier, results):
+    process_started_at = time.perf_counter()
+    start_barrier.wait()  # All workers of a round start (and compete for the model download) together
+    os.environ.update({
+        "AGROAI_STARTUP_MODE": "lazy",  # Stand-ins are injected after import; eager warm-up is run explicitly
+        "AGROAI_MODEL_CACHE_DIR": cache_dir,
+        "AGROAI_LOG_LEVEL": "WARNING",
+    })
+    import main as service
+
+    with open(model_path, "rb") as f:
+        install_local_clients(service, f.read())
+    if mode == "eager":
+        service._warm_up()
+    ready_s = time.perf_counter() - process_started_at
+
+    request_started_at = time.perf_counter()
+    _, status, _ = service.predict_plant_disease(FakeRequest({"imageUrl": image_url}))
+    first_request_s = time.perf_counter() - request_started_at
+    results.put({
+        "status": status,
+        "ready_s": ready_s,
+        "first_request_ms": 1000.0 * first_request_s,
+        "time_to_first_prediction_s": time.perf_counter() - process_started_at,
+        **service._memory_mb(),
+    })
+
+
+def _run_round(mode, workers, model_path, image_url):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    barrier = context.Barrier(workers)
+    with tempfile.TemporaryDirectory(prefix="agroai-startup-") as cache_dir:
+        processes = [
+            context.Process(target=_worker, args=(mode, model_path, cache_dir, image_url, barrier, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        rounds = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    summary = {"workers": rounds}
+    for key in ("ready_s", "first_request_ms", "time_to_first_prediction_s", "rss_mb", "pss_mb"):
+        values = [r[key] for r in rounds if key in r]
+        if values:
+            summary[f"mean_{key}"] = float(np.mean(values))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes sharing the model cache.")
+    parser.add_argument("--model", help="TFLite model to serve (default: a generated tiny model).")
+    parser.add_argument("--output", help="Optional path of a JSON report.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="agroai-startup-bench-")
+    model_path = args.model
+    if model_path is None:
+        from tiny_model import build_tiny_tflite_model
+        model_path = build_tiny_tflite_model(os.path.join(work_dir, "tiny.tflite"))
+
+    image = synthetic_jpeg(np.random.default_rng(0), 1600, 1200)
+    report = {"workers": args.workers, "model": model_path, "modes": {}}
+    with LocalImageServer({"/leaf.jpg": image}, vary_by_query=True) as server:
+        for mode in ("lazy", "eager"):
+            report["modes"][mode] = _run_round(mode, args.workers, model_path, server.url(f"/leaf.jpg?mode={mode}"))
+
+    print(json.dumps({mode: {k: v for k, v in r.items() if k != "workers"} for mode, r in report["modes"].items()},
+                     indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
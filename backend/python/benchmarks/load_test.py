@@ -0,0 +1,270 @@
+"""
+Offline load test of predict_plant_disease, without deploying to Firebase.
+
+The function runs in-process against local stand-ins (benchmarks/local_standins.py): an
+in-memory Firestore, an in-memory Storage bucket serving the model and class names, and a
+keep-alive HTTP server serving a synthetic set of JPEG photos. The model is a tiny generated
+TFLite classifier (TensorFlow required) unless --model is given.
+
+Requests are replayed at the given concurrency; the report has throughput, latency
+percentiles, the per-stage breakdown from the Server-Timing header, peak RSS and the
+service's component stats. It is written as JSON (--output) so runs on different commits
+can be compared with --compare, optionally failing on a regression.
+
+Usage (from backend/python):
+    python benchmarks/load_test.py --requests 500 --concurrency 8 --output load_test.json
+    python benchmarks/load_test.py --env AGROAI_MICROBATCH_ENABLED=true --compare load_test.json
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from local_standins import InMemoryFirestore, LocalBucket, LocalImageServer  # noqa: E402
+
+NUM_CLASSES = 38
+
+
+class FakeRequest:
+    """The parts of the Flask request predict_plant_disease uses."""
+
+    method = "POST"
+    path = "/"
+
+    def __init__(self, body, headers=None):
+        self._body = body
+        self.headers = dict(headers or {})
+
+    def get_json(self, silent=False):
+        return self._body
+
+
+def install_local_clients(service, model_bytes, commit_latency_s=0.0):
+    """
+    Injects the Firestore and Storage stand-ins into an imported (not yet loaded) main module,
+    with the bucket serving `model_bytes` and NUM_CLASSES class names. Returns the Firestore stand-in.
+    """
+    bucket_name = urllib.parse.urlparse(service.TFLITE_MODEL_GCS_PATH_FULL).netloc
+    blob_path = lambda url: urllib.parse.urlparse(url).path.lstrip("/")  # noqa: E731
+    db = InMemoryFirestore(commit_latency_s=commit_latency_s)
+    service._db_client = db
+    service._bucket_client = LocalBucket(bucket_name, {
+        blob_path(service.TFLITE_MODEL_GCS_PATH_FULL): model_bytes,
+        blob_path(service.CLASS_NAMES_GCS_PATH_FULL): "\n".join(f"class_{i}" for i in range(NUM_CLASSES)).encode(),
+    })
+    return db
+
+
+def synthetic_jpeg(rng, width, height, quality=90):
+    """A smooth, photo-like JPEG (gradients plus mild noise) of the given size."""
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    base = rng.uniform(0, 255, size=(1, 1, 3)).astype(np.float32)
+    slope = rng.uniform(-120, 120, size=(2, 1, 1, 3)).astype(np.float32)
+    pixels = base + slope[0] * x + slope[1] * y + rng.normal(0, 8, size=(height, width, 3)).astype(np.float32)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def _parse_server_timing(value):
+    """Parses "stage;dur=1.5, other;dur=2" into {stage: milliseconds}."""
+    stages = {}
+    for part in (value or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.startswith("dur="):
+            stages[name] = float(params[len("dur="):])
+    return stages
+
+
+def _summary(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"mean": float(values.mean()), "p50": float(p50), "p95": float(p95), "p99": float(p99),
+            "max": float(values.max())}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(report, baseline_path, max_regression_pct):
+    """Prints the change against a previous report; returns False on a regression beyond the threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    changes = {"throughput_rps": (baseline["throughput_rps"], report["throughput_rps"], True)}
+    for percentile in ("p50", "p95", "p99"):
+        changes[f"latency_{percentile}_ms"] = (
+            baseline["latency_ms"][percentile], report["latency_ms"][percentile], False
+        )
+
+    ok = True
+    print(f"Compared with {baseline_path} (commit {baseline.get('commit')}):")
+    for name, (before, after, higher_is_better) in changes.items():
+        change_pct = 100.0 * (after - before) / before if before else 0.0
+        regression_pct = -change_pct if higher_is_better else change_pct
+        flag = ""
+        if max_regression_pct is not None and regression_pct > max_regression_pct:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"  {name:<22} {before:10.2f} -> {after:10.2f} ({change_pct:+.1f}%){flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests (after warm-up).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once.")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests after the cold-start request.")
+    parser.add_argument("--images", type=int, default=32, help="Distinct synthetic images served.")
+    parser.add_argument("--image-size", default="1600x1200", help="WIDTHxHEIGHT of the synthetic photos.")
+    parser.add_argument("--repeat-fraction", type=float, default=0.0,
+                        help="Fraction of requests re-sending an already diagnosed image (prediction cache hits).")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Send batch requests of this many imageUrls instead of single requests.")
+    parser.add_argument("--model", help="TFLite model to serve (default: a generated tiny model).")
+    parser.add_argument("--int8", action="store_true", help="Generate an INT8 tiny model.")
+    parser.add_argument("--firestore-latency-ms", type=float, default=20.0,
+                        help="Simulated round trip of each Firestore commit.")
+    parser.add_argument("--variant", help="Model variant requested with the X-Model-Variant header "
+                                          "(default: routed by the configured weights).")
+    parser.add_argument("--timeout-ms", type=float,
+                        help="Per-request deadline sent in the X-Request-Timeout-Ms header.")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Service setting for the run, e.g. AGROAI_MICROBATCH_ENABLED=true (repeatable).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Path of the JSON report.")
+    parser.add_argument("--compare", help="Previous JSON report to compare against.")
+    parser.add_argument("--max-regression-pct", type=float,
+                        help="With --compare: exit non-zero if throughput or a latency percentile regressed more.")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    rng = np.random.default_rng(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="agroai-load-test-")
+
+    # Service settings are read at import time, so they are set before importing main
+    env = {
+        "AGROAI_MODEL_CACHE_DIR": os.path.join(work_dir, "models"),
+        "AGROAI_IMAGE_CACHE_DIR": os.path.join(work_dir, "images"),
+        "AGROAI_LOG_LEVEL": "WARNING",
+    }
+    env.update(dict(item.split("=", 1) for item in args.env))
+    os.environ.update(env)
+    import main as service
+
+    if args.model:
+        model_path = args.model
+    else:
+        from tiny_model import build_tiny_tflite_model
+        model_path = build_tiny_tflite_model(
+            os.path.join(work_dir, "tiny.tflite"), num_classes=NUM_CLASSES, quantize_int8=args.int8, seed=args.seed
+        )
+    with open(model_path, "rb") as f:
+        model_bytes = f.read()
+
+    db = install_local_clients(service, model_bytes, commit_latency_s=args.firestore_latency_ms / 1000.0)
+
+    images = {f"/leaf_{i}.jpg": synthetic_jpeg(rng, width, height) for i in range(args.images)}
+    images_per_request = args.batch_size or 1
+
+    with LocalImageServer(images, vary_by_query=True) as server:
+        # Every upload is new (a unique token makes unique bytes) unless it is a deliberate repeat
+        total = 1 + args.warmup + args.requests
+        urls = []
+        for i in range(total * images_per_request):
+            path = f"/leaf_{i % args.images}.jpg"
+            if i < args.images or rng.random() >= args.repeat_fraction:
+                path += f"?token={i}"
+            urls.append(server.url(path))
+
+        def make_request(i):
+            if args.batch_size:
+                body = {"imageUrls": urls[i * args.batch_size:(i + 1) * args.batch_size]}
+            else:
+                body = {"imageUrl": urls[i]}
+            started_at = time.perf_counter()
+            request_headers = {service.MODEL_VARIANT_HEADER: args.variant} if args.variant else {}
+            if args.timeout_ms:
+                request_headers[service.REQUEST_TIMEOUT_HEADER] = str(args.timeout_ms)
+            _, status, headers = service.predict_plant_disease(FakeRequest(body, request_headers))
+            return status, 1000.0 * (time.perf_counter() - started_at), _parse_server_timing(headers.get("Server-Timing"))
+
+        cold_status, cold_ms, cold_stages = make_request(0)
+        if cold_status != 200:
+            raise SystemExit(f"Cold-start request failed with HTTP {cold_status}")
+        for i in range(1, args.warmup + 1):
+            make_request(i)
+
+        first = args.warmup + 1
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            results = list(executor.map(make_request, range(first, first + args.requests)))
+        duration_s = time.perf_counter() - started_at
+
+    if service._diagnosis_writer is not None:
+        service._diagnosis_writer.flush(timeout=30)
+
+    statuses = Counter(status for status, _, _ in results)
+    ok_latencies = [latency for status, latency, _ in results if status == 200]
+    stage_names = sorted({stage for _, _, stages in results for stage in stages})
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {**vars(args), "env": env, "runtime": service._runtime.name},
+        "requests": args.requests,
+        "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+        "duration_s": duration_s,
+        "throughput_rps": args.requests / duration_s,
+        "images_per_second": args.requests * images_per_request / duration_s,
+        "latency_ms": _summary(ok_latencies),
+        "stages_ms": {
+            stage: _summary([stages[stage] for _, _, stages in results if stage in stages]) for stage in stage_names
+        },
+        "cold_start": {"request_ms": cold_ms, "stages_ms": cold_stages, **service._cold_start},
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "firestore": {"commits": db.commits, "diagnoses": len(db.documents("diagnoses"))},
+        "components": {
+            "models": service._registry.stats(),
+            "cascade": service._cascade_stats.stats() if service.CASCADE_FAST_VARIANT else None,
+            "admission": service._admission.stats() if service._admission is not None else None,
+            "coalescing": service._single_flight.stats() if service._single_flight is not None else None,
+            "prediction_cache": service._prediction_cache.stats() if service._prediction_cache is not None else None,
+            "image_fetcher": service._image_fetcher.stats(),
+            "diagnosis_writer": service._diagnosis_writer.stats() if service._diagnosis_writer is not None else None,
+        },
+    }
+
+    print(json.dumps({key: report[key] for key in (
+        "commit", "status_counts", "throughput_rps", "images_per_second", "latency_ms", "stages_ms", "peak_rss_mb"
+    )}, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.output}")
+    if args.compare and not _compare(report, args.compare, args.max_regression_pct):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Local stand-ins for the external services the inference function talks to (image URLs,
+Firestore, Cloud Storage), so it can be exercised and benchmarked without deploying to Firebase.
+"""
+import datetime
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from firebase_admin import firestore
+
+
+class _ImageRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Firebase Storage download URLs
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        location = self.server.redirects.get(path)
+        if location is not None:
+            # Like signed/CDN download URLs that redirect to the object
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = self.server.images.get(path)
+        if body is None:
+            self.send_error(404)
+            return
+        if self.server.vary_by_query and query:
+            # Trailing bytes after the end of the image: decodes the same, hashes differently
+            body += b"\0" + query.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalImageServer:
+    """
+    Threaded keep-alive HTTP server serving in-memory images at `/<name>`.
+    With `vary_by_query`, the query string is appended to the body, so every distinct URL
+    is a distinct upload (content hash) of the same picture. `redirects` maps paths to the
+    Location they answer with 302.
+
+    Usage:
+        with LocalImageServer({"/leaf_0.jpg": jpeg_bytes}) as server:
+            url = server.url("/leaf_0.jpg")
+    """
+
+    def __init__(self, images, host="127.0.0.1", port=0, vary_by_query=False, redirects=None):
+        self._server = ThreadingHTTPServer((host, port), _ImageRequestHandler)
+        self._server.daemon_threads = True
+        self._server.images = dict(images)
+        self._server.vary_by_query = vary_by_query
+        self._server.redirects = dict(redirects or {})
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def url(self, path):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{path}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class InMemoryFirestore:
+    """
+    Minimal in-memory stand-in for the Firestore client: collection().document().set()/get()
+    and batch().set()/commit() (SERVER_TIMESTAMP fields included), with optional commit
+    latency and injected commit failures.
+    """
+
+    def __init__(self, commit_latency_s=0.0, fail_commits=0):
+        """
+        Args:
+            commit_latency_s (float): Simulated round trip of every set() and commit().
+            fail_commits (int): Number of upcoming commits that raise before succeeding again.
+        """
+        self.commit_latency_s = commit_latency_s
+        self.fail_commits = fail_commits
+        self.commits = 0
+        self._documents = {}  # (collection, doc_id) -> data
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        return _InMemoryCollection(self, name)
+
+    def batch(self):
+        return _InMemoryWriteBatch(self)
+
+    def documents(self, collection):
+        """Returns {doc_id: data} of a collection."""
+        with self._lock:
+            return {doc_id: data for (name, doc_id), data in self._documents.items() if name == collection}
+
+    def _apply(self, writes):
+        time.sleep(self.commit_latency_s)
+        with self._lock:
+            if self.fail_commits > 0:
+                self.fail_commits -= 1
+                raise ConnectionError("Injected Firestore commit failure")
+            self.commits += 1
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for key, data in writes:
+                # Like Firestore, SERVER_TIMESTAMP fields are stored as the commit time
+                self._documents[key] = {
+                    field: now if value is firestore.SERVER_TIMESTAMP else value for field, value in data.items()
+                }
+
+
+class _InMemoryCollection:
+    def __init__(self, db, name):
+        self._db = db
+        self.name = name
+
+    def document(self, doc_id):
+        return _InMemoryDocument(self._db, self.name, doc_id)
+
+
+class _InMemorySnapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class _InMemoryDocument:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self.key = (collection, doc_id)
+        self.id = doc_id
+
+    def set(self, data):
+        self._db._apply([(self.key, data)])
+
+    def get(self):
+        with self._db._lock:
+            return _InMemorySnapshot(self._db._documents.get(self.key))
+
+
+class _InMemoryWriteBatch:
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, document, data):
+        self._writes.append((document.key, data))
+
+    def commit(self):
+        self._db._apply(self._writes)
+
+
+class LocalBucket:
+    """
+    Minimal in-memory stand-in for a Cloud Storage bucket: blob(path).download_to_file()
+    with the byte range arguments ImageFetcher uses for gs:// URLs.
+    """
+
+    def __init__(self, name, blobs=None):
+        """
+        Args:
+            name (str): Bucket name (the netloc of the gs:// URLs served from it).
+            blobs (dict, optional): {object path: bytes}.
+        """
+        self.name = name
+        self.blobs = dict(blobs or {})
+        self.client = self  # bucket.client.bucket(name) resolves to this same stand-in
+
+    def bucket(self, name):
+        if name != self.name:
+            raise FileNotFoundError(f"Unknown bucket {name}")
+        return self
+
+    def blob(self, path):
+        return _LocalBlob(self, path)
+
+
+class _LocalBlob:
+    def __init__(self, bucket, path):
+        self._bucket = bucket
+        self.name = path
+
+    def download_to_file(self, fileobj, start=None, end=None, timeout=None):
+        data = self._bucket.blobs.get(self.name)
+        if data is None:
+            raise FileNotFoundError(f"gs://{self._bucket.name}/{self.name} does not exist")
+        start = start or 0
+        # Like the Storage client, `end` is inclusive
+        fileobj.write(data[start:end + 1] if end is not None else data[start:])
@@ -0,0 +1,100 @@
+"""
+Parity check for the Pillow/NumPy preprocessing stage against the original TF pipeline.
+
+Runs every image of a directory through both `decode_and_resize_tf` (tf.image.decode_image +
+tf.image.resize) and `decode_and_resize_pil` (reduced-resolution JPEG decode + NumPy bilinear
+resize), classifies both inputs with the same TFLite model and reports top-1 agreement,
+pixel differences and per-image preprocessing time. Exits non-zero when agreement is below
+--min-agreement, so it can gate preprocessing changes.
+
+Usage (from backend/python, TensorFlow and Pillow installed):
+    python benchmarks/preprocessing_parity.py --model /tmp/fp32_mvp_model.tflite --images ./sample_leaves
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interpreter_pool import PooledInterpreter  # noqa: E402
+from preprocessing import decode_and_resize_pil, decode_and_resize_tf  # noqa: E402
+from runtime import softmax  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def _list_images(image_dir):
+    paths = []
+    for root, _, files in os.walk(image_dir):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(paths)
+
+
+def _timed(fn, *args, **kwargs):
+    started_at = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="Path to the .tflite model used for classification.")
+    parser.add_argument("--images", required=True, help="Directory of test images (searched recursively).")
+    parser.add_argument("--size", type=int, default=224, help="Model input size.")
+    parser.add_argument("--min-agreement", type=float, default=0.99, help="Required top-1 agreement rate.")
+    parser.add_argument("--output", help="Optional path of a JSON report.")
+    args = parser.parse_args()
+
+    paths = _list_images(args.images)
+    if not paths:
+        sys.exit(f"No images found under {args.images}")
+
+    model = PooledInterpreter(tf.lite.Interpreter(model_path=args.model))
+    agree = 0
+    pixel_mae = []
+    prob_max_diff = []
+    tf_times = []
+    pil_times = []
+    disagreements = []
+    for path in paths:
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+        reference, tf_time = _timed(decode_and_resize_tf, image_bytes, args.size)
+        candidate, pil_time = _timed(decode_and_resize_pil, image_bytes, args.size)
+        tf_times.append(tf_time)
+        pil_times.append(pil_time)
+        pixel_mae.append(float(np.mean(np.abs(reference - candidate))))
+
+        probs = softmax(model.run(np.stack([reference, candidate])), axis=-1)
+        prob_max_diff.append(float(np.max(np.abs(probs[0] - probs[1]))))
+        if np.argmax(probs[0]) == np.argmax(probs[1]):
+            agree += 1
+        else:
+            disagreements.append(os.path.relpath(path, args.images))
+
+    report = {
+        "images": len(paths),
+        "top1_agreement": agree / len(paths),
+        "mean_pixel_mae": float(np.mean(pixel_mae)),
+        "max_pixel_mae": float(np.max(pixel_mae)),
+        "max_probability_diff": float(np.max(prob_max_diff)),
+        "tf_preprocess_ms_p50": 1000.0 * float(np.median(tf_times)),
+        "pil_preprocess_ms_p50": 1000.0 * float(np.median(pil_times)),
+        "disagreements": disagreements,
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if report["top1_agreement"] < args.min_agreement:
+        sys.exit(f"Top-1 agreement {report['top1_agreement']:.4f} is below {args.min_agreement}")
+
+
+if __name__ == "__main__":
+    main()
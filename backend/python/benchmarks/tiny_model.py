@@ -0,0 +1,50 @@
+"""
+Generates a tiny TFLite classifier with the same input/output signature as the served
+EfficientNetV2-B0 model ((batch, 224, 224, 3) float32 in [0, 255] -> (batch, num_classes)),
+so benchmarks can exercise the serving code without downloading the real model.
+"""
+import numpy as np
+
+
+def build_tiny_tflite_model(path, num_classes=38, input_size=224, quantize_int8=False, seed=0):
+    """
+    Builds, converts and writes a tiny Conv -> GAP -> Dense classifier.
+
+    Args:
+        path (str): Output .tflite path.
+        num_classes (int): Number of output classes.
+        input_size (int): Input height and width.
+        quantize_int8 (bool): Produce a full-integer model with INT8 input and output.
+        seed (int): Seed for weights and calibration data.
+
+    Returns:
+        str: `path`.
+    """
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    inputs = tf.keras.Input(shape=(input_size, input_size, 3))
+    x = tf.keras.layers.Rescaling(1.0 / 255)(inputs)
+    x = tf.keras.layers.Conv2D(16, 3, strides=4, activation="relu")(x)
+    x = tf.keras.layers.Conv2D(32, 3, strides=2, activation="relu")(x)
+    x = tf.keras.layers.GlobalAveragePooling2D()(x)
+    outputs = tf.keras.layers.Dense(num_classes, activation="softmax")(x)
+    model = tf.keras.Model(inputs, outputs)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantize_int8:
+        rng = np.random.default_rng(seed)
+
+        def representative_dataset_gen():
+            for _ in range(16):
+                yield [rng.uniform(0, 255, size=(1, input_size, input_size, 3)).astype(np.float32)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset_gen
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+    return path
@@ -0,0 +1,99 @@
+"""
+Confidence-gated cascade over two model variants: a fast one (e.g. the INT8 build) answers
+first, and only images it is unsure about (top-1 confidence or top-1/top-2 margin below a
+threshold) are escalated to the accurate one (e.g. the FP32 build).
+
+CascadeStats counts how often requests escalate and how often the two stages agree, both on
+escalated images and on a sample of confident fast answers re-checked by the accurate model
+(audits), which is what the thresholds are tuned against: the escalation rate sets the average
+CPU per request, the audit agreement the accuracy given up for it.
+"""
+import heapq
+import threading
+
+
+def top2(probabilities):
+    """Returns (top-1 index, top-1 probability, top-1 minus top-2 probability) of one prediction row."""
+    best = heapq.nlargest(2, range(len(probabilities)), key=probabilities.__getitem__)
+    confidence = float(probabilities[best[0]])
+    runner_up = float(probabilities[best[1]]) if len(best) > 1 else 0.0
+    return best[0], confidence, confidence - runner_up
+
+
+class CascadeRoute:
+    """The two variants of a cascade (acquired for one request) and its gate."""
+
+    name = "cascade"
+
+    def __init__(self, fast, accurate, min_confidence, min_margin=0.0):
+        """
+        Args:
+            fast (ModelVariant): Variant answering first.
+            accurate (ModelVariant): Variant the unsure images are escalated to.
+            min_confidence (float): Fast answers with a lower top-1 probability are escalated.
+            min_margin (float): Fast answers whose top-1 leads top-2 by less are escalated.
+        """
+        if fast.class_names != accurate.class_names:
+            raise ValueError(f"Cascade variants '{fast.name}' and '{accurate.name}' have different class names")
+        self.fast = fast
+        self.accurate = accurate
+        self.min_confidence = float(min_confidence)
+        self.min_margin = float(min_margin)
+        self.class_names = accurate.class_names
+        # Cascade answers depend on both models and the thresholds (used in prediction cache keys)
+        self.version = (f"cascade({fast.version}>{accurate.version};"
+                        f"confidence={self.min_confidence};margin={self.min_margin})")
+
+    def is_confident(self, probabilities):
+        """Returns (whether the fast answer stands, its top-1 index, confidence, margin)."""
+        index, confidence, margin = top2(probabilities)
+        return confidence >= self.min_confidence and margin >= self.min_margin, index, confidence, margin
+
+
+class CascadeStats:
+    """Thread-safe escalation and stage-agreement counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._answered_fast = 0
+        self._escalated = 0
+        self._escalated_agreed = 0
+        self._audits = 0
+        self._audits_agreed = 0
+        self._audits_skipped = 0
+
+    def record_fast(self):
+        with self._lock:
+            self._answered_fast += 1
+
+    def record_escalation(self, agreed):
+        """An escalated image; `agreed` is whether both stages predicted the same class."""
+        with self._lock:
+            self._escalated += 1
+            self._escalated_agreed += int(agreed)
+
+    def record_audit(self, agreed):
+        """A confident fast answer re-checked by the accurate model."""
+        with self._lock:
+            self._audits += 1
+            self._audits_agreed += int(agreed)
+
+    def record_audit_skipped(self):
+        """An audit dropped because the previous ones were still running."""
+        with self._lock:
+            self._audits_skipped += 1
+
+    def stats(self):
+        with self._lock:
+            images = self._answered_fast + self._escalated
+            return {
+                "images": images,
+                "answered_fast": self._answered_fast,
+                "escalated": self._escalated,
+                "escalation_rate": self._escalated / images if images else 0.0,
+                "escalated_agreement": self._escalated_agreed / self._escalated if self._escalated else None,
+                "audits": self._audits,
+                "audits_skipped": self._audits_skipped,
+                # Estimated accuracy of the fast answers relative to the accurate model
+                "audit_agreement": self._audits_agreed / self._audits if self._audits else None,
+            }
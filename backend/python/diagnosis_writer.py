@@ -0,0 +1,289 @@
+"""
+Background writer persisting diagnosis documents to Firestore off the request path.
+
+Request threads hand documents to `DiagnosisWriter.write()` and return their response
+immediately; a background thread groups queued documents into batched commits, bounded by
+`max_batch_size` documents or `max_wait_ms` after the first queued document. Failed commits
+are retried with exponential backoff and then kept in a bounded dead-letter list; the
+background thread re-queues them every `dead_letter_retry_s`, and `close()` gives them a last
+attempt before the final flush.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_MAX_BATCH_WRITES = 500
+
+_STOP = object()
+
+logger = logging.getLogger("agroai.diagnosis_writer")
+
+
+class _PendingWrite:
+    """One queued document, with the number of failed commits it has been part of."""
+
+    __slots__ = ("doc_id", "data", "enqueued_at", "attempts", "last_error")
+
+    def __init__(self, doc_id, data):
+        self.doc_id = doc_id
+        self.data = data
+        self.enqueued_at = time.perf_counter()
+        self.attempts = 0
+        self.last_error = None
+
+
+class DiagnosisWriter:
+    """
+    Buffers document writes and commits them in batches from a background thread.
+
+    Backpressure: `write()` blocks while `max_pending` documents are waiting. If the buffer
+    is still full after `enqueue_timeout_s`, the document is committed on the caller's thread
+    instead, so a slow or unavailable Firestore slows requests down rather than growing the
+    buffer without bound.
+    """
+
+    def __init__(self, db, collection="diagnoses", max_batch_size=100, max_wait_ms=100.0, max_pending=1000,
+                 enqueue_timeout_s=1.0, retries=3, backoff_seconds=0.5, max_dead_letters=1000,
+                 dead_letter_retry_s=60.0, name="diagnosis-writer"):
+        """
+        Args:
+            db: Firestore client (or a stand-in with the same collection/document/batch interface).
+            collection (str): Collection the documents are written to.
+            max_batch_size (int): Maximum documents per commit (at most FIRESTORE_MAX_BATCH_WRITES).
+            max_wait_ms (float): Maximum time the first queued document waits for others to join its commit.
+            max_pending (int): Buffer size; `write()` applies backpressure beyond it.
+            enqueue_timeout_s (float): How long `write()` waits for buffer space before writing inline.
+            retries (int): Retries of a failed commit before its documents are dead-lettered.
+            backoff_seconds (float): Base of the exponential backoff between retries.
+            max_dead_letters (int): Dead-lettered documents kept (oldest are dropped beyond it).
+            dead_letter_retry_s (float, optional): Delay before dead-lettered documents are re-queued
+                                                   (None: only at close or through `retry_dead_letters()`).
+            name (str): Name of the background thread.
+        """
+        if not 1 <= max_batch_size <= FIRESTORE_MAX_BATCH_WRITES:
+            raise ValueError(f"max_batch_size must be between 1 and {FIRESTORE_MAX_BATCH_WRITES}")
+        self.db = db
+        self.collection = collection
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = max(float(max_wait_ms), 0.0) / 1000.0
+        self.enqueue_timeout_s = enqueue_timeout_s
+        self.retries = int(retries)
+        self.backoff_seconds = float(backoff_seconds)
+        self.dead_letter_retry_s = dead_letter_retry_s
+
+        self._queue = queue.Queue(maxsize=max(1, int(max_pending)))
+        self._dead_letters = deque(maxlen=max(1, int(max_dead_letters)))
+        # Documents accepted but not yet committed or dead-lettered (for flush)
+        self._unfinished = 0
+        self._unfinished_cond = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self._written = 0
+        self._commits = 0
+        self._failed_commits = 0
+        self._retried_commits = 0
+        self._inline_writes = 0
+        self._dropped_dead_letters = 0
+        self._requeued_dead_letters = 0
+        # When the worker next re-queues dead letters (perf_counter), None if none are waiting
+        self._dead_letter_retry_at = None
+        self._write_delay_sum_s = 0.0
+        self._write_delay_max_s = 0.0
+        self._closed = False
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def write(self, doc_id, data):
+        """Queues `data` to be stored as document `doc_id` of the collection."""
+        if self._closed:
+            raise RuntimeError("DiagnosisWriter is closed")
+        item = _PendingWrite(doc_id, data)
+        with self._unfinished_cond:
+            self._unfinished += 1
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout_s)
+        except queue.Full:
+            # Backpressure: the caller pays for its own commit
+            with self._unfinished_cond:
+                self._unfinished -= 1
+                self._unfinished_cond.notify_all()
+            self.db.collection(self.collection).document(doc_id).set(data)
+            with self._stats_lock:
+                self._inline_writes += 1
+                self._written += 1
+
+    def flush(self, timeout=None):
+        """
+        Waits until every document accepted so far is committed or dead-lettered.
+
+        Returns:
+            bool: False if `timeout` (seconds) expired first.
+        """
+        with self._unfinished_cond:
+            return self._unfinished_cond.wait_for(lambda: self._unfinished == 0, timeout=timeout)
+
+    def close(self, timeout=None):
+        """Flushes queued documents and stops the background thread (registered with atexit by the caller)."""
+        if self._closed:
+            return
+        self._closed = True
+        self.retry_dead_letters()
+        if self.flush(timeout):
+            self._queue.put(_STOP)
+            self._worker.join()
+        else:
+            # The worker is a daemon thread; whatever is still queued is lost with the process
+            logger.warning("DiagnosisWriter closed with %d unwritten documents.", self._unfinished)
+
+    def dead_letters(self):
+        """Returns the dead-lettered writes as (doc_id, data, error message) tuples."""
+        with self._stats_lock:
+            return [(item.doc_id, item.data, str(item.last_error)) for item in self._dead_letters]
+
+    def retry_dead_letters(self):
+        """
+        Re-queues dead-lettered documents, oldest first, while the buffer has room (never blocks).
+
+        Returns:
+            int: The number of documents re-queued; the rest stay dead-lettered.
+        """
+        requeued = 0
+        while True:
+            with self._stats_lock:
+                if not self._dead_letters:
+                    break
+                item = self._dead_letters.popleft()
+            with self._unfinished_cond:
+                self._unfinished += 1
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                with self._unfinished_cond:
+                    self._unfinished -= 1
+                    self._unfinished_cond.notify_all()
+                with self._stats_lock:
+                    self._dead_letters.appendleft(item)
+                break
+            requeued += 1
+        if requeued:
+            with self._stats_lock:
+                self._requeued_dead_letters += requeued
+            logger.info("Re-queued %d dead-lettered diagnosis documents.", requeued)
+        return requeued
+
+    def stats(self):
+        """Returns commit, retry and buffer metrics as a JSON-serializable dict."""
+        with self._stats_lock:
+            return {
+                "written": self._written,
+                "commits": self._commits,
+                "avg_commit_size": (self._written - self._inline_writes) / self._commits if self._commits else 0.0,
+                "failed_commits": self._failed_commits,
+                "retried_commits": self._retried_commits,
+                "inline_writes": self._inline_writes,
+                "dead_letters": len(self._dead_letters),
+                "dropped_dead_letters": self._dropped_dead_letters,
+                "requeued_dead_letters": self._requeued_dead_letters,
+                "avg_write_delay_ms": 1000.0 * self._write_delay_sum_s / self._written if self._written else 0.0,
+                "max_write_delay_ms": 1000.0 * self._write_delay_max_s,
+                "pending": self._queue.qsize(),
+                "max_pending": self._queue.maxsize,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": 1000.0 * self.max_wait_s,
+            }
+
+    def _collect_batch(self, first):
+        """Gathers documents after `first` until the commit is full or its wait window closes."""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Put the sentinel back so the main loop exits after this commit
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _commit(self, batch):
+        write_batch = self.db.batch()
+        collection = self.db.collection(self.collection)
+        for item in batch:
+            write_batch.set(collection.document(item.doc_id), item.data)
+        write_batch.commit()
+
+    def _commit_with_retries(self, batch):
+        for attempt in range(self.retries + 1):
+            try:
+                self._commit(batch)
+                return None
+            except Exception as e:
+                error = e
+                with self._stats_lock:
+                    self._failed_commits += 1
+                for item in batch:
+                    item.attempts += 1
+                    item.last_error = e
+                if attempt < self.retries:
+                    with self._stats_lock:
+                        self._retried_commits += 1
+                    time.sleep(self.backoff_seconds * (2 ** attempt))
+        return error
+
+    def _retry_dead_letters_if_due(self):
+        with self._stats_lock:
+            retry_at = self._dead_letter_retry_at
+            if retry_at is None or time.perf_counter() < retry_at:
+                return
+            self._dead_letter_retry_at = None
+        self.retry_dead_letters()
+        with self._stats_lock:
+            if self._dead_letters and self._dead_letter_retry_at is None:
+                # The buffer was full: try the rest again after another interval
+                self._dead_letter_retry_at = time.perf_counter() + self.dead_letter_retry_s
+
+    def _run(self):
+        while True:
+            with self._stats_lock:
+                retry_at = self._dead_letter_retry_at
+            timeout = None if retry_at is None else max(0.0, retry_at - time.perf_counter())
+            try:
+                first = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                first = None
+            if first is _STOP:
+                return
+            self._retry_dead_letters_if_due()
+            if first is None:
+                continue
+            batch = self._collect_batch(first)
+            error = self._commit_with_retries(batch)
+
+            finished_at = time.perf_counter()
+            with self._stats_lock:
+                if error is None:
+                    self._commits += 1
+                    self._written += len(batch)
+                    for item in batch:
+                        delay = finished_at - item.enqueued_at
+                        self._write_delay_sum_s += delay
+                        self._write_delay_max_s = max(self._write_delay_max_s, delay)
+                else:
+                    overflow = len(self._dead_letters) + len(batch) - self._dead_letters.maxlen
+                    self._dropped_dead_letters += max(0, overflow)
+                    self._dead_letters.extend(batch)
+                    if self.dead_letter_retry_s is not None and self._dead_letter_retry_at is None:
+                        self._dead_letter_retry_at = finished_at + self.dead_letter_retry_s
+            if error is not None:
+                logger.error("Dead-lettered %d diagnosis documents after %d attempts: %s", len(batch), self.retries + 1, error)
+
+            with self._unfinished_cond:
+                self._unfinished -= len(batch)
+                self._unfinished_cond.notify_all()
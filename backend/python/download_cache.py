@@ -0,0 +1,344 @@
+"""
+Bounded, collision-safe caches for downloaded artifacts (model, class names, request images).
+
+Entries are keyed by a hash of the full URL (query string included), or by the expected
+content hash when the caller knows it, so two different `.../IMG_0001.jpg` uploads can
+never be served each other's bytes. Both caches evict least recently used entries to stay
+within a byte budget; `/tmp` counts against instance memory on serverless platforms.
+
+The on-disk cache is also safe to share between the worker processes of one host: a
+per-entry file lock makes one worker download while the others wait and then reuse the same
+file, so an interpreter built from that path (which memory-maps it) is backed by a single
+page-cache copy for all of them. The byte budget is shared as well: the workers keep a running
+total of the directory in a small usage file under a cache-wide lock, so a miss costs one small
+read and write instead of a directory scan. Only when the total exceeds the budget is the directory
+rescanned (which also corrects any drift) and the least recently used files (by mtime, which hits
+refresh) evicted, whichever worker wrote them. A reader whose file is evicted before it opens it
+downloads it again.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows (local development); workers then download independently
+    fcntl = None
+
+_TMP_PREFIX = ".download-"
+_LOCK_PREFIX = ".lock-"
+# Held while the directory is rescanned and files are evicted (entries are named by hashes, never "evict")
+_EVICTION_LOCK = _LOCK_PREFIX + "evict"
+# Running byte total of the cache entries, shared by the workers (read and written under _EVICTION_LOCK)
+_USAGE_FILE = ".usage"
+# Times get_bytes downloads an entry again after it was evicted before it could be opened
+_EVICTED_RETRIES = 2
+# Temp files older than this are leftovers of a crashed download, not another worker's download in progress
+_STALE_TMP_SECONDS = 3600
+
+
+def _url_key(url):
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ChecksumMismatchError(ValueError):
+    """Raised when downloaded content does not match the expected SHA-256."""
+
+
+class _KeyLocks:
+    """
+    Per-key locks so concurrent requests for the same URL download it only once.
+    A key's lock is dropped when nobody holds or waits for it, so the table stays small.
+    """
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, number of holders/waiters]
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive advisory lock on `path` held across processes (no-op without fcntl)."""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DownloadCache:
+    """
+    On-disk cache with atomic writes and LRU eviction under a byte budget.
+
+    Files are written to a temporary file in the cache directory and renamed into place,
+    so readers never observe partial downloads.
+    """
+
+    def __init__(self, root_dir, max_bytes, fetch_to):
+        """
+        Args:
+            root_dir (str): Cache directory (created if missing).
+            max_bytes (int): Byte budget of the directory, shared by all processes using it; least
+                             recently used files are deleted beyond it. An entry larger than the
+                             budget is kept as the only entry.
+            fetch_to (callable): `fetch_to(url, fileobj)` streams the content of `url` into `fileobj`.
+        """
+        self.root_dir = root_dir
+        self.max_bytes = int(max_bytes)
+        self.fetch_to = fetch_to
+        self._index = OrderedDict()  # file name -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = _KeyLocks()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(root_dir, exist_ok=True)
+        with _file_lock(os.path.join(self.root_dir, _EVICTION_LOCK)):
+            self._load_index()
+            self._write_usage()
+
+    def _load_index(self):
+        """Rebuilds the LRU index from the directory (oldest access first) and drops stale temp files."""
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        entries = []
+        for name in os.listdir(self.root_dir):
+            path = os.path.join(self.root_dir, name)
+            if name.startswith(_LOCK_PREFIX) or name == _USAGE_FILE:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # Renamed or evicted by another worker meanwhile
+                continue
+            if name.startswith(_TMP_PREFIX):
+                if stat.st_mtime < time.time() - _STALE_TMP_SECONDS:
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:  # Another worker dropped it first
+                        pass
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._index[name] = size
+            self._total_bytes += size
+
+    def _read_usage(self):
+        """Returns the shared byte total, or None if it is missing or unreadable."""
+        try:
+            with open(os.path.join(self.root_dir, _USAGE_FILE)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_usage(self):
+        with open(os.path.join(self.root_dir, _USAGE_FILE), 'w') as f:
+            f.write(str(self._total_bytes))
+
+    def _file_name(self, url, sha256):
+        extension = os.path.splitext(os.path.basename(url).split('?')[0])[1]
+        return (sha256 or _url_key(url)) + extension
+
+    def _touch(self, name):
+        """Marks an entry as most recently used (in memory and on disk, for the next index rebuild)."""
+        with self._lock:
+            if name in self._index:
+                self._index.move_to_end(name)
+        try:
+            os.utime(os.path.join(self.root_dir, name))
+        except FileNotFoundError:
+            pass
+
+    def _add(self, name):
+        """
+        Called after `name` was renamed into place: adds it to the shared byte total and, only
+        if that exceeds the budget (other workers' files count against it too), rescans the
+        directory and evicts least recently used files (never `name`, which is about to be
+        returned) until it fits.
+        """
+        try:
+            size = os.path.getsize(os.path.join(self.root_dir, name))
+        except FileNotFoundError:  # Evicted by another worker already
+            return
+        with self._lock, _file_lock(os.path.join(self.root_dir, _EVICTION_LOCK)):
+            usage = self._read_usage()
+            if usage is not None and usage + size <= self.max_bytes:
+                self._index[name] = size
+                self._index.move_to_end(name)
+                self._total_bytes = usage + size
+                self._write_usage()
+                return
+
+            self._load_index()
+            victims = iter([entry for entry in self._index if entry != name])
+            while self._total_bytes > self.max_bytes and len(self._index) > 1:
+                victim = next(victims)
+                self._total_bytes -= self._index.pop(victim)
+                self.evictions += 1
+                # Safe on POSIX even if another thread still has the file open or mmapped.
+                # Dropping the lock file too can at worst let two workers download the same entry again.
+                for victim_name in (victim, _LOCK_PREFIX + victim):
+                    try:
+                        os.unlink(os.path.join(self.root_dir, victim_name))
+                    except FileNotFoundError:
+                        pass
+            self._write_usage()
+
+    def get_path(self, url, sha256=None):
+        """
+        Returns the local path of `url`, downloading it first on a miss.
+
+        Args:
+            url (str): Source URL (gs:// or http(s)).
+            sha256 (str, optional): Expected content hash. When given it is the cache key
+                                    and the download is verified against it.
+        """
+        name = self._file_name(url, sha256)
+        path = os.path.join(self.root_dir, name)
+        # Threads of this process wait on the key lock, other worker processes on the file lock
+        with self._key_locks.hold(name), _file_lock(os.path.join(self.root_dir, _LOCK_PREFIX + name)):
+            if os.path.exists(path):
+                self._count("hits")
+                self._touch(name)
+                return path
+
+            self._count("misses")
+            fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix=_TMP_PREFIX)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    self.fetch_to(url, f)
+                if sha256:
+                    actual = _file_sha256(tmp_path)
+                    if actual != sha256:
+                        raise ChecksumMismatchError(f"SHA-256 of {url} is {actual}, expected {sha256}")
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._add(name)
+            return path
+
+    def get_bytes(self, url, sha256=None):
+        """
+        Returns the content of `url`, downloading it first on a miss. If another worker evicts
+        the file before it is opened, that counts as a miss: it is downloaded again (and past
+        _EVICTED_RETRIES, straight into memory).
+        """
+        for _ in range(_EVICTED_RETRIES + 1):
+            try:
+                with open(self.get_path(url, sha256), 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        buffer = io.BytesIO()
+        self.fetch_to(url, buffer)
+        data = buffer.getvalue()
+        if sha256 and hashlib.sha256(data).hexdigest() != sha256:
+            raise ChecksumMismatchError(f"SHA-256 of {url} does not match {sha256}")
+        return data
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": "disk",
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class MemoryDownloadCache:
+    """
+    In-memory variant for request images: never touches the filesystem.
+    With max_bytes=0 nothing is retained and every call downloads.
+    """
+
+    def __init__(self, max_bytes, fetch_to):
+        self.max_bytes = int(max_bytes)
+        self.fetch_to = fetch_to
+        self._entries = OrderedDict()  # key -> bytes, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = _KeyLocks()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_bytes(self, url, sha256=None):
+        """Returns the content of `url`, downloading it first on a miss."""
+        key = sha256 or _url_key(url)
+        with self._key_locks.hold(key):
+            with self._lock:
+                data = self._entries.get(key)
+                if data is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return data
+                self.misses += 1
+
+            buffer = io.BytesIO()
+            self.fetch_to(url, buffer)
+            data = buffer.getvalue()
+            if sha256 and hashlib.sha256(data).hexdigest() != sha256:
+                raise ChecksumMismatchError(f"SHA-256 of {url} does not match {sha256}")
+
+            if len(data) <= self.max_bytes:
+                with self._lock:
+                    self._entries[key] = data
+                    self._total_bytes += len(data)
+                    while self._total_bytes > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._total_bytes -= len(evicted)
+                        self.evictions += 1
+            return data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": "memory",
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
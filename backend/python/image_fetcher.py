@@ -0,0 +1,161 @@
+"""
+Pooled, streaming HTTP(S)/GCS fetcher for request images and model artifacts.
+
+Connections are kept alive in per-host pools (urllib3.PoolManager) instead of opening a new
+connection per download, bodies are streamed into memory (or a file) with a size cutoff,
+and transient failures are retried with exponential backoff.
+"""
+import io
+import threading
+import time
+import urllib.parse
+
+import urllib3
+
+# Statuses worth retrying: throttling and transient server/gateway errors
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# Redirects followed per download
+MAX_REDIRECTS = 5
+
+
+class FetchError(RuntimeError):
+    """Raised when a URL cannot be fetched (after retries)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseTooLargeError(FetchError):
+    """Raised when a response body exceeds the fetcher's size cutoff."""
+
+
+def _split_gcs_url(url):
+    """Splits gs://bucket/path into (bucket, path)."""
+    parsed = urllib.parse.urlparse(url)
+    return parsed.netloc, parsed.path.lstrip('/')
+
+
+class ImageFetcher:
+    """Thread-safe fetcher sharing keep-alive connection pools across requests."""
+
+    def __init__(self, max_bytes=25 * 1024 * 1024, connect_timeout=5.0, read_timeout=30.0,
+                 retries=2, backoff_seconds=0.2, pool_maxsize=16, num_pools=32,
+                 chunk_size=64 * 1024, bucket=None):
+        """
+        Args:
+            max_bytes (int or None): Size cutoff per response; None disables it.
+            connect_timeout (float): Seconds to establish a connection.
+            read_timeout (float): Seconds between received bytes.
+            retries (int): Retries after the first attempt for connection/read errors and RETRY_STATUSES.
+            backoff_seconds (float): Base of the exponential backoff between attempts.
+            pool_maxsize (int): Keep-alive connections kept per host (size it to the download concurrency).
+            num_pools (int): Number of hosts whose pools are kept.
+            chunk_size (int): Streaming read size.
+            bucket: Storage bucket client used for gs:// URLs.
+        """
+        self.max_bytes = max_bytes
+        self.retries = int(retries)
+        self.backoff_seconds = float(backoff_seconds)
+        self.chunk_size = int(chunk_size)
+        self.bucket = bucket
+        self.timeout = urllib3.Timeout(connect=connect_timeout, read=read_timeout)
+        # Retries are handled in fetch_to so partially streamed bodies can be discarded first; urllib3
+        # only follows redirects (signed and CDN image URLs redirect routinely). Past MAX_REDIRECTS the
+        # 3xx response is returned and fails like any other non-200 status.
+        self._http = urllib3.PoolManager(num_pools=num_pools, maxsize=pool_maxsize, block=False, retries=urllib3.Retry(
+            total=None, connect=0, read=0, status=0, other=0, redirect=MAX_REDIRECTS, raise_on_redirect=False,
+        ))
+        self.pool_maxsize = pool_maxsize
+
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._retried = 0
+        self._failures = 0
+        self._bytes = 0
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for counter, value in increments.items():
+                setattr(self, counter, getattr(self, counter) + value)
+
+    def _fetch_gcs(self, url, fileobj):
+        bucket_name, blob_path = _split_gcs_url(url)
+        bucket = self.bucket if self.bucket.name == bucket_name else self.bucket.client.bucket(bucket_name)
+        # Ask for at most max_bytes + 1 bytes (`end` is inclusive): receiving that many means the object is too large
+        start = fileobj.tell()
+        bucket.blob(blob_path).download_to_file(fileobj, start=0, end=self.max_bytes, timeout=self.timeout.read_timeout)
+        if self.max_bytes is not None and fileobj.tell() - start > self.max_bytes:
+            raise ResponseTooLargeError(f"{url} exceeds the size limit of {self.max_bytes} bytes")
+
+    def _fetch_http(self, url, fileobj):
+        response = self._http.request("GET", url, preload_content=False, timeout=self.timeout)
+        try:
+            if response.status != 200:
+                raise FetchError(f"GET {url} returned HTTP {response.status}", status=response.status)
+            length = response.headers.get("Content-Length")
+            if self.max_bytes is not None and length and int(length) > self.max_bytes:
+                raise ResponseTooLargeError(f"{url} is {length} bytes, above the limit of {self.max_bytes} bytes")
+            received = 0
+            for chunk in response.stream(self.chunk_size):
+                received += len(chunk)
+                if self.max_bytes is not None and received > self.max_bytes:
+                    raise ResponseTooLargeError(f"{url} exceeds the size limit of {self.max_bytes} bytes")
+                fileobj.write(chunk)
+        except BaseException:
+            # Close instead of draining (the body may be huge); the pool replaces closed connections
+            response.close()
+            raise
+        finally:
+            response.release_conn()
+
+    def fetch_to(self, url, fileobj):
+        """
+        Streams `url` (http(s) or gs://) into a writable, seekable file object.
+
+        Raises:
+            ResponseTooLargeError: If the body exceeds `max_bytes` (not retried).
+            FetchError: If all attempts failed.
+        """
+        start = fileobj.tell()
+        for attempt in range(self.retries + 1):
+            self._count(_requests=1)
+            try:
+                if url.startswith("gs://"):
+                    self._fetch_gcs(url, fileobj)
+                else:
+                    self._fetch_http(url, fileobj)
+                self._count(_bytes=fileobj.tell() - start)
+                return
+            except ResponseTooLargeError:
+                self._count(_failures=1)
+                raise
+            except Exception as e:
+                # Network/timeout errors and RETRY_STATUSES are retried; other HTTP errors are final
+                retryable = not isinstance(e, FetchError) or e.status in RETRY_STATUSES
+                if not retryable or attempt == self.retries:
+                    self._count(_failures=1)
+                    if isinstance(e, FetchError):
+                        raise
+                    raise FetchError(f"GET {url} failed: {e}") from e
+            # Discard whatever the failed attempt streamed, then back off
+            fileobj.seek(start)
+            fileobj.truncate()
+            self._count(_retried=1)
+            time.sleep(self.backoff_seconds * (2 ** attempt))
+
+    def fetch_bytes(self, url):
+        """Fetches `url` into memory."""
+        buffer = io.BytesIO()
+        self.fetch_to(url, buffer)
+        return buffer.getvalue()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "requests": self._requests,
+                "retried": self._retried,
+                "failures": self._failures,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
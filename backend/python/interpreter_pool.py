@@ -0,0 +1,251 @@
+import threading
+import time
+import queue
+from contextlib import contextmanager
+
+import numpy as np
+
+from telemetry import span
+
+_INT8_INFO = np.iinfo(np.int8)
+
+
+class PooledInterpreter:
+    """
+    One allocated TFLite interpreter owned by an InterpreterPool.
+    Only the thread that checked it out may call run().
+
+    Tensor details and quantization parameters are cached at load time. Inputs are
+    written straight into the interpreter's input tensor through `interpreter.tensor()`
+    views, and INT8 (de)quantization runs in place on preallocated arrays, so a steady
+    stream of same-sized batches does not allocate per request.
+
+    With `batch_sizes`, the input tensor is only ever allocated for those batch sizes: a batch
+    is padded up to the smallest one that fits (the padding slots are computed and ignored),
+    and a batch larger than all of them runs as several invocations of the largest. Batches
+    of varying size then rarely resize and re-allocate the interpreter's tensors.
+    """
+
+    def __init__(self, interpreter, batch_sizes=None):
+        """
+        Args:
+            interpreter: A not yet allocated TFLite interpreter.
+            batch_sizes (sequence, optional): Batch sizes the input tensor is allocated for;
+                                              None allocates for each batch's own size.
+        """
+        self.interpreter = interpreter
+        self.batch_sizes = tuple(sorted({int(size) for size in batch_sizes})) if batch_sizes else None
+        self.interpreter.allocate_tensors()
+
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        self.input_index = input_details['index']
+        self.output_index = output_details['index']
+        self.input_dtype = input_details['dtype']
+        self.output_dtype = output_details['dtype']
+        self.input_shape = tuple(int(d) for d in input_details['shape'][1:])  # (height, width, 3)
+        self.num_outputs = int(output_details['shape'][-1])
+        self.input_scale, self.input_zero_point = input_details['quantization']
+        self.output_scale, self.output_zero_point = output_details['quantization']
+
+        # Batch dimension the input tensor is currently allocated for.
+        # Resizing + re-allocating is only done when an incoming batch has a different size.
+        self.batch_size = int(input_details['shape'][0])
+        self.resizes = 0
+        self._capacity = 0
+        self._input_scratch = None  # float32 staging buffer, only needed for INT8 inputs
+        self._output_buffer = None  # float32 (dequantized) outputs
+        self._ensure_capacity(self.batch_size)
+
+    def _ensure_capacity(self, batch_size):
+        """Grows the preallocated buffers; smaller batches use leading slices of them."""
+        if batch_size <= self._capacity:
+            return
+        if self.input_dtype == np.int8:
+            self._input_scratch = np.empty((batch_size, *self.input_shape), dtype=np.float32)
+        self._output_buffer = np.empty((batch_size, self.num_outputs), dtype=np.float32)
+        self._capacity = batch_size
+
+    def _resize(self, batch_size):
+        """Resizes the input tensor to `batch_size` and re-allocates the interpreter's tensors."""
+        self.interpreter.resize_tensor_input(self.input_index, [batch_size, *self.input_shape])
+        self.interpreter.allocate_tensors()
+        self.batch_size = batch_size
+        self.resizes += 1
+
+    def _invocation_size(self, batch_size):
+        """Batch size of the invocations that run a batch of `batch_size` images."""
+        if self.batch_sizes is None:
+            return batch_size
+        for size in self.batch_sizes:
+            if size >= batch_size:
+                return size
+        return self.batch_sizes[-1]
+
+    def run(self, images, write_input=np.copyto, timings=None):
+        """
+        Runs a batch of images: ONE invocation, unless the batch is larger than every
+        allowed batch size (see `batch_sizes`).
+
+        Args:
+            images (sequence): One entry per batch slot; a stacked array works too.
+            write_input (callable): `write_input(out, image)` writes one preprocessed image
+                                    into `out`, a float32-compatible (height, width, 3) slot
+                                    of the input tensor. Defaults to a plain copy.
+            timings (telemetry.StageTimings, optional): Receives the "input" (write/resize and
+                                                        quantize), "invoke" and "output" stages.
+
+        Returns:
+            np.ndarray: float32 model output of shape (batch, num_classes), dequantized if needed.
+                        This is a view into a reused buffer: it is only valid until the
+                        interpreter is checked back into the pool.
+        """
+        batch_size = len(images)
+        invocation_size = self._invocation_size(batch_size)
+        if invocation_size != self.batch_size:
+            with span(timings, "input"):
+                self._resize(invocation_size)
+        self._ensure_capacity(max(batch_size, invocation_size))
+
+        output = self._output_buffer[:batch_size]
+        for start in range(0, batch_size, invocation_size):
+            self._invoke(images[start:start + invocation_size], output[start:start + invocation_size],
+                         write_input, timings)
+        return output
+
+    def _invoke(self, images, output, write_input, timings):
+        """One invocation over at most `self.batch_size` images; their outputs go to `output`."""
+        batch_size = len(images)
+        # The tensor views (and any slice of them) must be released before invoke(),
+        # or TFLite refuses to run; hence indexing instead of keeping loop variables around.
+        with span(timings, "input"):
+            input_view = self.interpreter.tensor(self.input_index)()
+            if self.input_dtype == np.int8:
+                scratch = self._input_scratch[:batch_size]
+                for i, image in enumerate(images):
+                    write_input(scratch[i], image)
+                # In place: q = round(x / scale + zero_point), saturated to the INT8 range
+                # (as tflite_evaluation._quantize_input does, so the INT8 report matches serving)
+                scratch /= self.input_scale
+                scratch += self.input_zero_point
+                np.rint(scratch, out=scratch)
+                np.clip(scratch, _INT8_INFO.min, _INT8_INFO.max, out=scratch)
+                np.copyto(input_view[:batch_size], scratch, casting='unsafe')
+            else:
+                for i, image in enumerate(images):
+                    write_input(input_view[i], image)
+            del input_view
+
+        with span(timings, "invoke"):
+            self.interpreter.invoke()
+
+        with span(timings, "output"):
+            # Rows past batch_size are padding
+            output_view = self.interpreter.tensor(self.output_index)()[:batch_size]
+            if self.output_dtype == np.int8:
+                # In place: x = (q - zero_point) * scale
+                np.subtract(output_view, self.output_zero_point, out=output, casting='unsafe')
+                output *= self.output_scale
+            else:
+                np.copyto(output, output_view, casting='unsafe')
+            del output_view
+
+
+class InterpreterPool:
+    """
+    Fixed-size pool of pre-allocated TFLite interpreters.
+
+    TFLite interpreters are not thread-safe, so every inference checks one interpreter
+    out for exclusive use and returns it afterwards. With N interpreters, N requests can
+    run inference concurrently on one instance without crossing inputs or outputs.
+    """
+
+    def __init__(self, interpreter_factory, size, batch_sizes=None):
+        """
+        Args:
+            interpreter_factory (callable): Returns a new, not yet allocated interpreter.
+                                            Intra-op threads (`num_threads`) are configured here.
+            size (int): Number of interpreters kept in the pool.
+            batch_sizes (sequence, optional): Batch sizes the interpreters are allocated for
+                                              (see PooledInterpreter).
+        """
+        if size < 1:
+            raise ValueError("Interpreter pool size must be >= 1")
+        self.size = int(size)
+        self._available = queue.LifoQueue()  # LIFO keeps the most recently used (cache-warm) interpreter busy
+        for _ in range(self.size):
+            self._available.put(PooledInterpreter(interpreter_factory(), batch_sizes))
+        self._interpreters = list(self._available.queue)
+
+        self._stats_lock = threading.Lock()
+        self._checkouts = 0
+        self._contended_checkouts = 0
+        self._wait_sum_s = 0.0
+        self._wait_max_s = 0.0
+
+    @contextmanager
+    def checkout(self, timeout=None, timings=None):
+        """
+        Context manager yielding a PooledInterpreter for exclusive use.
+        The wait for a free interpreter is added to `timings` (StageTimings, optional) as "pool_wait".
+
+        Raises:
+            TimeoutError: If no interpreter became free within `timeout` seconds.
+        """
+        started_at = time.perf_counter()
+        try:
+            pooled = self._available.get_nowait()
+            contended = False
+        except queue.Empty:
+            contended = True
+            try:
+                pooled = self._available.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No free interpreter after {timeout} s")
+        waited = time.perf_counter() - started_at
+        if timings is not None:
+            timings.add("pool_wait", waited)
+
+        with self._stats_lock:
+            self._checkouts += 1
+            self._contended_checkouts += int(contended)
+            self._wait_sum_s += waited
+            self._wait_max_s = max(self._wait_max_s, waited)
+
+        try:
+            yield pooled
+        finally:
+            self._available.put(pooled)
+
+    def warm_up(self, image, invocations=1, write_input=np.copyto):
+        """
+        Runs dummy single-image invocations on EVERY pooled interpreter, so the one-time costs
+        of the first invoke (delegate weight packing, arena growth, page faults on the mapped
+        model file) are paid before traffic arrives. Holds the whole pool while running.
+
+        Args:
+            image (np.ndarray): Dummy input, written with `write_input` like a real one.
+            invocations (int): Invocations per interpreter.
+            write_input (callable): See PooledInterpreter.run.
+        """
+        pooled_interpreters = [self._available.get() for _ in range(self.size)]
+        try:
+            for pooled in pooled_interpreters:
+                for _ in range(invocations):
+                    pooled.run([image], write_input=write_input)
+        finally:
+            for pooled in pooled_interpreters:
+                self._available.put(pooled)
+
+    def stats(self):
+        """Returns pool utilization metrics as a JSON-serializable dict."""
+        with self._stats_lock:
+            return {
+                "size": self.size,
+                "available": self._available.qsize(),
+                "checkouts": self._checkouts,
+                "contended_checkouts": self._contended_checkouts,
+                "avg_wait_ms": 1000.0 * self._wait_sum_s / self._checkouts if self._checkouts else 0.0,
+                "max_wait_ms": 1000.0 * self._wait_max_s,
+                "tensor_resizes": sum(pooled.resizes for pooled in self._interpreters),
+            }
@@ -1,18 +1,100 @@
+import time
+_IMPORT_STARTED_AT = time.perf_counter() # Cold-start accounting: module import begins here
+
 import functions_framework
-import tensorflow as tf
 import numpy as np
 import os
 import json
+import base64
+import hashlib
+import resource
+import atexit
+import threading
+import uuid
+import random
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, firestore, storage # Import necessary modules
 
+from cascade import CascadeRoute, CascadeStats
+from interpreter_pool import InterpreterPool
+from model_registry import ModelRegistry, ModelVariant, UnknownVariantError
+from micro_batcher import MicroBatcher
+from prediction_cache import PredictionCache, LRUTTLCache, FirestorePredictionStore
+from preprocessing import ImageTooLargeError, decode_pixels, decode_and_resize_tf, resize_bilinear
+from preprocessing import warm_up as warm_up_decoder
+from runtime import resolve_runtime, softmax
+from download_cache import DownloadCache, MemoryDownloadCache
+from image_fetcher import ImageFetcher, ResponseTooLargeError
+from admission import AdmissionController, Deadline, DeadlineExceeded, Overloaded, SingleFlight
+from diagnosis_writer import DiagnosisWriter
+from response_encoding import SCORE_FORMATS, decode_scores, dumps, encode_scores
+from telemetry import MetricsRegistry, StageTimings, configure_logging, span, stats_gauges
+
+# --- Cold-start accounting ---
+# Import time of this module (without the interpreter runtime, which is imported lazily),
+# plus runtime import, model load and first-request latency once they happen.
+_cold_start = {"module_import_s": time.perf_counter() - _IMPORT_STARTED_AT}
+
+# --- Metrics (exported at GET /metrics in the Prometheus text format) ---
+# Requests that load the model are reported in _cold_start only, so the latency histograms describe warm instances.
+_metrics = MetricsRegistry()
+_requests_total = _metrics.counter(
+    "agroai_requests_total", "Requests handled by predict_plant_disease.", ("mode", "status", "variant"))
+_request_seconds = _metrics.histogram(
+    "agroai_request_duration_seconds", "Steady-state request latency (cold-start requests excluded).",
+    ("mode", "variant"))
+_stage_seconds = _metrics.histogram(
+    "agroai_stage_duration_seconds", "Steady-state time per request stage or inference invocation.",
+    ("stage", "variant"))
+_cascade_images_total = _metrics.counter(
+    "agroai_cascade_images_total", "Images answered in cascade mode, by the stage that decided.", ("stage",))
+_cascade_agreement_total = _metrics.counter(
+    "agroai_cascade_agreement_total",
+    "Fast/accurate stage comparisons (escalated images and audited fast answers) by whether the top-1 class agreed.",
+    ("sample", "agreed"))
+_cascade_confidence = _metrics.histogram(
+    "agroai_cascade_fast_confidence", "Top-1 probability of the fast cascade stage.", (),
+    buckets=(0.3, 0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 0.99, 1.0))
+
 # --- Global variables for TFLite model and class names (loaded once for warm starts) ---
+# Resolved interpreter runtime (see SERVING_RUNTIME)
+_runtime = None
+# Pooled keep-alive HTTP/GCS fetchers for request images (size-limited) and model artifacts (see FETCH_* settings)
+_image_fetcher = None
+_model_fetcher = None
+# Byte-bounded download caches for model artifacts (on disk) and request images (see *_CACHE_* settings)
+_model_cache = None
+_image_cache = None
 # These remain as global variables, but are initialized to None.
 # They will be populated by _load_model_and_class_names() on the first function invocation.
-interpreter = None
-input_details = None
-output_details = None
-class_names = []
+# Served model variants (see MODEL_* settings). Each has its own interpreter pool (interpreters are not
+# thread-safe, so each inference checks one out, see INTERPRETER_* settings), class names, version and,
+# with MICROBATCH_* settings, micro-batcher aggregating concurrent single-image requests.
+_registry = None
+# Last check of the registry manifest for hot-swaps, and the guard keeping checks one at a time
+_registry_checked_at = 0.0
+_registry_refresh_lock = threading.Lock()
+# Diagnoses keyed by image content + model version (see PREDICTION_CACHE_* settings)
+_prediction_cache = None
+# Escalation/agreement counters of the cascade mode (see CASCADE_* settings)
+_cascade_stats = CascadeStats()
+# Limits the background audits of confident fast answers (see CASCADE_AUDIT_RATE)
+_cascade_audit_slots = threading.BoundedSemaphore(1)
+# Load shedding and coalescing of identical in-flight requests (see ADMISSION_* and COALESCE_ENABLED)
+_admission = None
+_single_flight = None
+
+# Commits diagnosis documents in the background, off the request path (see DIAGNOSIS_WRITE_* settings)
+_diagnosis_writer = None
+
+# Set once everything above is loaded; the lock makes concurrent first requests (and the
+# warm-up thread) wait for a single load instead of each loading their own copy
+_model_ready = False
+_load_lock = threading.Lock()
+# Reported at GET /ready: "lazy" (loads on first request), "starting", "ready" or "failed"
+_readiness = {"state": "lazy", "error": None}
 
 # --- Firebase Admin SDK Clients (also initialized lazily) ---
 # These will hold the client instances (Firestore, Storage) after initialization.
@@ -25,64 +107,810 @@ FIREBASE_STORAGE_BUCKET_NAME = "agroai-phoenix.firebasestorage.app" # Confirmed
 TFLITE_MODEL_GCS_PATH_FULL = f"gs://{FIREBASE_STORAGE_BUCKET_NAME}/ml_models/fp32_mvp_model.tflite"
 CLASS_NAMES_GCS_PATH_FULL = f"gs://{FIREBASE_STORAGE_BUCKET_NAME}/ml_models/class_names.txt"
 
+# --- Inference settings ---
+# Serving runtime: "auto" (slim LiteRT/tflite_runtime + Pillow/NumPy when installed, else full TF),
+# "litert", "tflite_runtime" or "tensorflow" (original full-TensorFlow path).
+SERVING_RUNTIME = os.environ.get("AGROAI_SERVING_RUNTIME", "auto")
+
+# Level of the structured (JSON) logs: per-request details are DEBUG, one summary line per request is INFO
+LOG_LEVEL = os.environ.get("AGROAI_LOG_LEVEL", "INFO")
+logger = configure_logging(LOG_LEVEL).getChild("inference")
+# Download caches. Files are keyed by a hash of the full URL and evicted LRU beyond the byte budget;
+# /tmp is memory-backed on serverless, so request images default to an in-memory cache ("memory", "disk" or "off").
+MODEL_CACHE_DIR = os.environ.get("AGROAI_MODEL_CACHE_DIR", "/tmp/agroai-cache/models")
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("AGROAI_MODEL_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+IMAGE_CACHE_MODE = os.environ.get("AGROAI_IMAGE_CACHE", "memory")
+IMAGE_CACHE_DIR = os.environ.get("AGROAI_IMAGE_CACHE_DIR", "/tmp/agroai-cache/images")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("AGROAI_IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Image fetcher: size cutoff, timeouts and retries (exponential backoff) per download
+FETCH_MAX_BYTES = int(os.environ.get("AGROAI_FETCH_MAX_BYTES", str(25 * 1024 * 1024)))
+FETCH_CONNECT_TIMEOUT_S = float(os.environ.get("AGROAI_FETCH_CONNECT_TIMEOUT_S", "5"))
+FETCH_READ_TIMEOUT_S = float(os.environ.get("AGROAI_FETCH_READ_TIMEOUT_S", "30"))
+FETCH_RETRIES = int(os.environ.get("AGROAI_FETCH_RETRIES", "2"))
+FETCH_BACKOFF_S = float(os.environ.get("AGROAI_FETCH_BACKOFF_S", "0.2"))
+# Model version used in prediction cache keys; defaults to the model file name plus a content hash
+MODEL_VERSION = os.environ.get("AGROAI_MODEL_VERSION")
+# Served model variants: an inline registry configuration (JSON, format in model_registry.py), or a JSON
+# manifest at MODEL_REGISTRY_URL re-read every MODEL_REGISTRY_POLL_S seconds (0 = once) to hot-swap versions.
+# Without either, the single "default" variant is TFLITE_MODEL_GCS_PATH_FULL (versioned by MODEL_VERSION).
+# A new model uploaded over an existing URL must come with its sha256, which keys the model download cache.
+MODELS_CONFIG = os.environ.get("AGROAI_MODELS")
+MODEL_REGISTRY_URL = os.environ.get("AGROAI_MODEL_REGISTRY_URL")
+MODEL_REGISTRY_POLL_S = float(os.environ.get("AGROAI_MODEL_REGISTRY_POLL_S", "60"))
+# How long a swapped-out version keeps serving its in-flight requests before it is closed anyway
+MODEL_DRAIN_TIMEOUT_S = float(os.environ.get("AGROAI_MODEL_DRAIN_TIMEOUT_S", "300"))
+# Requests pick a variant by name with this header; others are routed at random by variant weight
+MODEL_VARIANT_HEADER = "X-Model-Variant"
+MODEL_INPUT_SIZE = 224 # TFLite model input size (EfficientNetV2-B0 default)
+# Uploads with more pixels than this are rejected before decoding (protects instance memory)
+MAX_IMAGE_PIXELS = int(os.environ.get("AGROAI_MAX_IMAGE_PIXELS", "40000000"))
+# Batch mode: upper bound on images per request (also keeps a single Firestore batch under its 500 write limit)
+MAX_BATCH_IMAGES = int(os.environ.get("AGROAI_MAX_BATCH_IMAGES", "64"))
+# Batch mode: number of images downloaded/decoded concurrently
+BATCH_DOWNLOAD_WORKERS = int(os.environ.get("AGROAI_BATCH_DOWNLOAD_WORKERS", "8"))
+# Micro-batching of concurrent single-image requests: trades up to MICROBATCH_MAX_WAIT_MS
+# of extra latency for fewer, larger interpreter invocations under load.
+MICROBATCH_ENABLED = os.environ.get("AGROAI_MICROBATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+MICROBATCH_MAX_SIZE = int(os.environ.get("AGROAI_MICROBATCH_MAX_SIZE", "8"))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("AGROAI_MICROBATCH_MAX_WAIT_MS", "5"))
+# Cascade mode: requests not naming a variant are answered by CASCADE_FAST_VARIANT (e.g. an INT8 build)
+# and escalated to CASCADE_ACCURATE_VARIANT (default: the registry's default variant) only when the fast
+# top-1 probability is below CASCADE_MIN_CONFIDENCE or leads the runner-up by less than CASCADE_MIN_MARGIN.
+# CASCADE_AUDIT_RATE of the confident fast answers are re-run on the accurate variant in the background
+# to measure how often the stages agree (GET /stats "cascade"). Unset CASCADE_FAST_VARIANT disables it.
+CASCADE_FAST_VARIANT = os.environ.get("AGROAI_CASCADE_FAST_VARIANT")
+CASCADE_ACCURATE_VARIANT = os.environ.get("AGROAI_CASCADE_ACCURATE_VARIANT")
+CASCADE_MIN_CONFIDENCE = float(os.environ.get("AGROAI_CASCADE_MIN_CONFIDENCE", "0.85"))
+CASCADE_MIN_MARGIN = float(os.environ.get("AGROAI_CASCADE_MIN_MARGIN", "0.0"))
+CASCADE_AUDIT_RATE = float(os.environ.get("AGROAI_CASCADE_AUDIT_RATE", "0.0"))
+# Interpreter pool: how many requests can run inference at once, and the intra-op threads
+# each interpreter uses. Pool size x threads should roughly match the instance's core count.
+INTERPRETER_POOL_SIZE = int(os.environ.get("AGROAI_INTERPRETER_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+INTERPRETER_NUM_THREADS = int(os.environ.get(
+    "AGROAI_INTERPRETER_NUM_THREADS", str(max(1, (os.cpu_count() or 1) // INTERPRETER_POOL_SIZE))
+))
+# Batch sizes the interpreters' input tensors are allocated for: batches are padded up to the next one
+# (larger batches run in several invocations), so varying batch sizes do not re-allocate tensors per call
+INTERPRETER_BATCH_SIZES = [int(size) for size in os.environ.get(
+    "AGROAI_INTERPRETER_BATCH_SIZES", f"1,{MICROBATCH_MAX_SIZE}"
+).split(",") if size.strip()]
+# Prediction cache: in-process LRU tier (entries, TTL) and optional persistent tier ("firestore" or unset)
+PREDICTION_CACHE_ENABLED = os.environ.get("AGROAI_PREDICTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PREDICTION_CACHE_MAX_ENTRIES = int(os.environ.get("AGROAI_PREDICTION_CACHE_MAX_ENTRIES", "1024"))
+PREDICTION_CACHE_TTL_SECONDS = float(os.environ.get("AGROAI_PREDICTION_CACHE_TTL_SECONDS", "3600"))
+PREDICTION_CACHE_PERSISTENT = os.environ.get("AGROAI_PREDICTION_CACHE_PERSISTENT", "")
+# Class probabilities in responses (full, topk, float16, uint8 or none, see response_encoding.py);
+# requests can override them with "scores" and "topK". Firestore documents use DIAGNOSIS_SCORES.
+# Both default to "full" (full_prediction_scores, which existing clients and documents rely on);
+# the compact encodings are opt-in.
+RESPONSE_SCORES = os.environ.get("AGROAI_RESPONSE_SCORES", "full")
+RESPONSE_TOP_K = int(os.environ.get("AGROAI_RESPONSE_TOP_K", "5"))
+DIAGNOSIS_SCORES = os.environ.get("AGROAI_DIAGNOSIS_SCORES", "full")
+# Admission control: at most ADMISSION_MAX_CONCURRENT requests are worked on at once and ADMISSION_MAX_QUEUE
+# wait for a slot. A request whose estimated wait exceeds ADMISSION_MAX_WAIT_S (or its deadline) is answered
+# with 429 and a Retry-After header right away instead of timing out later. 0 disables admission control.
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("AGROAI_ADMISSION_MAX_CONCURRENT", str(4 * INTERPRETER_POOL_SIZE)))
+ADMISSION_MAX_QUEUE = int(os.environ.get("AGROAI_ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_MAX_WAIT_S = float(os.environ.get("AGROAI_ADMISSION_MAX_WAIT_S", "5"))
+# Per-request deadline, which callers can shorten with the REQUEST_TIMEOUT_HEADER (milliseconds).
+# Work not started when it passes (admission, download, decode, inference) is dropped with a 504.
+REQUEST_TIMEOUT_S = float(os.environ.get("AGROAI_REQUEST_TIMEOUT_S", "60"))
+REQUEST_TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+# Concurrent single-image requests for the same imageUrl and model share one download and inference
+COALESCE_ENABLED = os.environ.get("AGROAI_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Diagnosis persistence: "async" returns responses as soon as inference finishes and commits
+# documents in batches from a background thread; "sync" commits before responding
+DIAGNOSIS_WRITE_MODE = os.environ.get("AGROAI_DIAGNOSIS_WRITE_MODE", "async")
+DIAGNOSIS_WRITE_MAX_BATCH = int(os.environ.get("AGROAI_DIAGNOSIS_WRITE_MAX_BATCH", "100"))
+DIAGNOSIS_WRITE_MAX_WAIT_MS = float(os.environ.get("AGROAI_DIAGNOSIS_WRITE_MAX_WAIT_MS", "100"))
+DIAGNOSIS_WRITE_MAX_PENDING = int(os.environ.get("AGROAI_DIAGNOSIS_WRITE_MAX_PENDING", "1000"))
+DIAGNOSIS_WRITE_RETRIES = int(os.environ.get("AGROAI_DIAGNOSIS_WRITE_RETRIES", "3"))
+# Seconds before documents whose commits failed every retry are queued again
+DIAGNOSIS_WRITE_DEAD_LETTER_RETRY_S = float(os.environ.get("AGROAI_DIAGNOSIS_WRITE_DEAD_LETTER_RETRY_S", "60"))
+# How long shutdown waits for queued documents to be committed
+DIAGNOSIS_WRITE_FLUSH_TIMEOUT_S = float(os.environ.get("AGROAI_DIAGNOSIS_WRITE_FLUSH_TIMEOUT_S", "10"))
+# Startup: "lazy" loads the model inside the first request; "eager" loads and warms it up while the
+# module is imported (before the worker accepts traffic); "background" does so in a thread started
+# at import, with GET /ready reporting not-ready until it finishes
+STARTUP_MODE = os.environ.get("AGROAI_STARTUP_MODE", "lazy")
+# Dummy invocations per pooled interpreter during warm-up (the first invoke is much slower than the rest)
+WARMUP_INVOCATIONS = int(os.environ.get("AGROAI_WARMUP_INVOCATIONS", "2"))
+
 
 def _load_model_and_class_names():
     """
     Loads the TFLite model and class names from Firebase Storage if not already loaded.
     This function also handles lazy initialization of Firebase Admin SDK clients.
     Designed for warm starts: executes heavy ops only on the first invocation of an instance.
+    Thread-safe: callers arriving during the load wait for it instead of loading again.
     """
-    global interpreter, input_details, output_details, class_names, _db_client, _bucket_client
+    global _model_ready
+    if _model_ready:
+        return
+    with _load_lock:
+        if not _model_ready:
+            _load_resources()
+            _model_ready = True
+
+
+def _load_resources():
+    """Initializes whatever is not loaded yet (called under _load_lock); see _load_model_and_class_names."""
+    global _runtime, _image_fetcher, _model_fetcher, _model_cache, _image_cache, _registry, _registry_checked_at
+    global _db_client, _bucket_client, _prediction_cache, _diagnosis_writer, _admission, _single_flight
 
     # --- Lazy Firebase Admin SDK Initialization ---
     # This ensures firebase_admin.initialize_app() and client instantiation
     # only happen on the first function invocation for a given instance.
-    if not firebase_admin._apps:
-        print(f"[{os.getpid()}] Initializing Firebase Admin SDK...")
+    # Skipped when both clients were injected (local load tests, see benchmarks/load_test.py)
+    if (_db_client is None or _bucket_client is None) and not firebase_admin._apps:
+        logger.info("Initializing Firebase Admin SDK...")
         # Cloud Functions environment automatically provides credentials.
         firebase_admin.initialize_app()
-        print(f"[{os.getpid()}] Firebase Admin SDK initialized.")
+        logger.info("Firebase Admin SDK initialized.")
 
     if _db_client is None:
-        print(f"[{os.getpid()}] Initializing Firestore client...")
+        logger.info("Initializing Firestore client...")
         _db_client = firestore.client()
-        print(f"[{os.getpid()}] Firestore client initialized.")
+        logger.info("Firestore client initialized.")
 
     if _bucket_client is None:
-        print(f"[{os.getpid()}] Initializing Storage bucket client...")
+        logger.info("Initializing Storage bucket client...")
         _bucket_client = storage.bucket()
-        print(f"[{os.getpid()}] Storage bucket client initialized.")
+        logger.info("Storage bucket client initialized.")
 
 
-    # --- TFLite Model Loading ---
-    if interpreter is None:
-        print(f"[{os.getpid()}] Starting model download from {TFLITE_MODEL_GCS_PATH_FULL}...")
-        try:
-            model_path = tf.keras.utils.get_file(
-                os.path.basename(TFLITE_MODEL_GCS_PATH_FULL), TFLITE_MODEL_GCS_PATH_FULL, cache_dir="/tmp/"
+    # --- Interpreter runtime ---
+    if _runtime is None:
+        _runtime = resolve_runtime(SERVING_RUNTIME)
+        _cold_start["runtime"] = _runtime.name
+        _cold_start["runtime_import_s"] = _runtime.import_seconds
+        logger.info(f"Serving runtime '{_runtime.name}' imported in {_runtime.import_seconds:.3f} s.")
+
+    # --- Fetchers and download caches ---
+    if _model_cache is None:
+        _image_fetcher = ImageFetcher(
+            max_bytes=FETCH_MAX_BYTES,
+            connect_timeout=FETCH_CONNECT_TIMEOUT_S,
+            read_timeout=FETCH_READ_TIMEOUT_S,
+            retries=FETCH_RETRIES,
+            backoff_seconds=FETCH_BACKOFF_S,
+            pool_maxsize=max(BATCH_DOWNLOAD_WORKERS, INTERPRETER_POOL_SIZE), # Enough keep-alive connections for a batch
+            bucket=_bucket_client,
+        )
+        _model_fetcher = ImageFetcher(max_bytes=None, retries=FETCH_RETRIES, pool_maxsize=1, bucket=_bucket_client)
+        _model_cache = DownloadCache(MODEL_CACHE_DIR, MODEL_CACHE_MAX_BYTES, _model_fetcher.fetch_to)
+        if IMAGE_CACHE_MODE == "disk":
+            _image_cache = DownloadCache(IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, _image_fetcher.fetch_to)
+        else:
+            # "off" keeps nothing: every image is fetched straight into memory
+            _image_cache = MemoryDownloadCache(
+                IMAGE_CACHE_MAX_BYTES if IMAGE_CACHE_MODE == "memory" else 0, _image_fetcher.fetch_to
             )
-            interpreter = tf.lite.Interpreter(model_path=model_path)
-            interpreter.allocate_tensors()
-            input_details = interpreter.get_input_details()
-            output_details = interpreter.get_output_details()
-            print(f"[{os.getpid()}] TFLite model loaded and allocated.")
+
+    # --- TFLite models and class names ---
+    if _registry is None:
+        load_started_at = time.perf_counter()
+        registry = ModelRegistry(_load_variant, drain_timeout_s=MODEL_DRAIN_TIMEOUT_S)
+        try:
+            registry.apply(_registry_config())
+            if CASCADE_FAST_VARIANT:
+                # Fail at load time, not on every request, if the cascade is misconfigured
+                with registry.acquire(CASCADE_FAST_VARIANT) as fast, \
+                        registry.acquire(CASCADE_ACCURATE_VARIANT or registry.default) as accurate:
+                    cascade = CascadeRoute(fast, accurate, CASCADE_MIN_CONFIDENCE, CASCADE_MIN_MARGIN)
+                logger.info(f"Cascade mode enabled: {cascade.version}.")
         except Exception as e:
-            print(f"[{os.getpid()}] Failed to load TFLite model from GCS: {e}")
+            logger.exception("Failed to load models: %s", e)
             raise RuntimeError(f"Model loading failed: {e}")
+        _registry = registry
+        _registry_checked_at = time.monotonic()
+        _cold_start["model_load_s"] = time.perf_counter() - load_started_at
+
+    # --- Prediction cache ---
+    if PREDICTION_CACHE_ENABLED and _prediction_cache is None:
+        persistent_tier = None
+        if PREDICTION_CACHE_PERSISTENT == "firestore":
+            persistent_tier = FirestorePredictionStore(_db_client, ttl_seconds=PREDICTION_CACHE_TTL_SECONDS)
+        _prediction_cache = PredictionCache(
+            LRUTTLCache(PREDICTION_CACHE_MAX_ENTRIES, PREDICTION_CACHE_TTL_SECONDS),
+            persistent_tier=persistent_tier,
+        )
+        logger.info(f"Prediction cache enabled for model versions {_registry.versions()}.")
+
+    # --- Admission control and request coalescing ---
+    if ADMISSION_MAX_CONCURRENT > 0 and _admission is None:
+        _admission = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_MAX_WAIT_S)
+    if COALESCE_ENABLED and _single_flight is None:
+        _single_flight = SingleFlight()
+
+    # --- Background diagnosis writer ---
+    if DIAGNOSIS_WRITE_MODE == "async" and _diagnosis_writer is None:
+        _diagnosis_writer = DiagnosisWriter(
+            _db_client,
+            collection='diagnoses',
+            max_batch_size=DIAGNOSIS_WRITE_MAX_BATCH,
+            max_wait_ms=DIAGNOSIS_WRITE_MAX_WAIT_MS,
+            max_pending=DIAGNOSIS_WRITE_MAX_PENDING,
+            retries=DIAGNOSIS_WRITE_RETRIES,
+            dead_letter_retry_s=DIAGNOSIS_WRITE_DEAD_LETTER_RETRY_S,
+        )
+        # Commit whatever is still buffered when the instance shuts down
+        atexit.register(_diagnosis_writer.close, DIAGNOSIS_WRITE_FLUSH_TIMEOUT_S)
+        logger.info(f"Asynchronous diagnosis writes enabled (max batch {DIAGNOSIS_WRITE_MAX_BATCH}, "
+                    f"max wait {DIAGNOSIS_WRITE_MAX_WAIT_MS} ms).")
+
+
+def _registry_config():
+    """The model registry configuration: manifest at MODEL_REGISTRY_URL, AGROAI_MODELS or the single default model."""
+    if MODEL_REGISTRY_URL:
+        return json.loads(_model_fetcher.fetch_bytes(MODEL_REGISTRY_URL))
+    if MODELS_CONFIG:
+        return json.loads(MODELS_CONFIG)
+    return {"default": "default", "variants": {"default": {
+        "model_url": TFLITE_MODEL_GCS_PATH_FULL,
+        "class_names_url": CLASS_NAMES_GCS_PATH_FULL,
+        "version": MODEL_VERSION,
+        "weight": 1,
+    }}}
+
+
+def _load_variant(name, spec):
+    """
+    Downloads one model variant and its class names and builds its interpreter pool
+    (and micro-batcher). Variants loaded for a hot-swap are warmed up before they are
+    swapped in; at startup, _warm_up warms all variants.
+    """
+    logger.info(f"Loading model variant '{name}' from {spec['model_url']}...")
+    model_path = _model_cache.get_path(spec["model_url"], sha256=spec.get("sha256"))
+    # Built from the path (not model_content), TFLite memory-maps the model file, so all pooled
+    # interpreters, and all worker processes sharing MODEL_CACHE_DIR, use one page-cache copy
+    interpreter_pool = InterpreterPool(
+        lambda: _runtime.interpreter_class(model_path=model_path, num_threads=INTERPRETER_NUM_THREADS),
+        size=INTERPRETER_POOL_SIZE,
+        batch_sizes=INTERPRETER_BATCH_SIZES,
+    )
+    with open(_download_file(spec["class_names_url"]), 'r') as f:
+        variant_class_names = [line.strip() for line in f]
+    version = spec.get("version") or (
+        f"{os.path.basename(model_path)}@{(spec.get('sha256') or _file_sha256(model_path))[:12]}"
+    )
+    variant = ModelVariant(name, version, interpreter_pool, variant_class_names, spec)
 
-    # --- Class Names Loading ---
-    if not class_names:
-        print(f"[{os.getpid()}] Starting class names download from {CLASS_NAMES_GCS_PATH_FULL}...")
+    if MICROBATCH_ENABLED:
+        variant.micro_batcher = MicroBatcher(
+            lambda images: _run_micro_batch(variant, images),
+            max_batch_size=MICROBATCH_MAX_SIZE,
+            max_wait_ms=MICROBATCH_MAX_WAIT_MS,
+            num_workers=INTERPRETER_POOL_SIZE, # One batch in flight per pooled interpreter
+            name=f"micro-batcher-{name}",
+        )
+    if _registry is not None:
+        _warm_up_variant(variant)
+    logger.info(f"Model variant '{name}' version {version} loaded: {len(variant_class_names)} classes, "
+                f"{INTERPRETER_POOL_SIZE} interpreters ({INTERPRETER_NUM_THREADS} threads each)"
+                f"{', micro-batching' if MICROBATCH_ENABLED else ''}.")
+    return variant
+
+
+def _warm_up_variant(variant):
+    """Runs WARMUP_INVOCATIONS dummy invocations on every interpreter of the variant's pool."""
+    dummy = np.zeros((MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3), dtype=np.float32)
+    variant.interpreter_pool.warm_up(dummy, invocations=WARMUP_INVOCATIONS, write_input=_write_model_input)
+
+
+def _maybe_refresh_registry():
+    """
+    Re-reads the registry manifest every MODEL_REGISTRY_POLL_S seconds, in a background thread so
+    no request waits for a new version to load; changed variants are hot-swapped by the registry.
+    """
+    global _registry_checked_at
+    if not MODEL_REGISTRY_URL or MODEL_REGISTRY_POLL_S <= 0:
+        return
+    if time.monotonic() - _registry_checked_at < MODEL_REGISTRY_POLL_S:
+        return
+    if not _registry_refresh_lock.acquire(blocking=False):
+        return # Another request already started the check
+    _registry_checked_at = time.monotonic()
+
+    def refresh():
         try:
-            class_names_local_path = tf.keras.utils.get_file(
-                os.path.basename(CLASS_NAMES_GCS_PATH_FULL), CLASS_NAMES_GCS_PATH_FULL, cache_dir="/tmp/"
-            )
-            with open(class_names_local_path, 'r') as f:
-                class_names = [line.strip() for line in f]
-            print(f"[{os.getpid()}] Loaded {len(class_names)} class names.")
+            reloaded = _registry.apply(_registry_config())
+            if reloaded:
+                logger.info("Model registry updated", extra={"fields": {
+                    "reloaded": reloaded, "versions": _registry.versions()
+                }})
         except Exception as e:
-            print(f"[{os.getpid()}] Failed to load class names from GCS: {e}")
-            raise RuntimeError(f"Class names loading failed: {e}")
+            logger.exception("Model registry refresh failed (keeping the loaded versions): %s", e)
+        finally:
+            _registry_refresh_lock.release()
+
+    threading.Thread(target=refresh, name="model-registry-refresh", daemon=True).start()
+
+
+def _file_sha256(path):
+    """Hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_lookup(image_bytes, variant):
+    """Returns (cache_key, cached_result) for an image and model version; both are None when the cache is disabled."""
+    if _prediction_cache is None:
+        return None, None
+    cache_key = PredictionCache.make_key(image_bytes, variant.version)
+    return cache_key, _prediction_cache.get(cache_key)
+
+
+def _download_file(url):
+    """Downloads a model artifact once into the on-disk model cache and returns its local path."""
+    return _model_cache.get_path(url)
+
+
+def _download_image(image_url):
+    """
+    Downloads an image and returns its raw (encoded) bytes.
+    The image cache is keyed by the full URL (including the download token), so
+    uploads that share a file name never collide.
+    """
+    return _image_cache.get_bytes(image_url)
+
+
+def _decode_image(image_bytes):
+    """
+    Decodes encoded image bytes for the model.
+    The slim runtimes return reduced-resolution uint8 pixels whose final resize happens in
+    _write_model_input; the tensorflow runtime returns the resized float32 array right away.
+    """
+    if _runtime.is_slim:
+        return decode_pixels(image_bytes, MODEL_INPUT_SIZE, max_pixels=MAX_IMAGE_PIXELS)
+    return decode_and_resize_tf(image_bytes, MODEL_INPUT_SIZE, max_pixels=MAX_IMAGE_PIXELS)
+
+
+def _write_model_input(out, image):
+    """Writes one decoded image into its (MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, 3) input tensor slot."""
+    if image.shape == out.shape:
+        np.copyto(out, image, casting='unsafe')
+    else:
+        resize_bilinear(image, MODEL_INPUT_SIZE, MODEL_INPUT_SIZE, out=out)
+
+
+def _run_inference(images, variant, timings=None):
+    """
+    Runs ONE interpreter invocation over a batch of decoded images (see _decode_image),
+    on an interpreter checked out of the pool for exclusive use. Images are written
+    straight into the interpreter's input tensor.
+
+    Args:
+        images (list): Decoded images, one per batch slot.
+        variant (ModelVariant): Model version to run.
+        timings (StageTimings, optional): Receives the pool wait, input, invoke, output and softmax stages.
+
+    Returns:
+        np.ndarray: Softmax probabilities of shape (batch, num_classes).
+    """
+    with variant.interpreter_pool.checkout(timings=timings) as pooled:
+        output = pooled.run(images, write_input=_write_model_input, timings=timings)
+        with span(timings, "softmax"):
+            # Apply softmax if the model outputs logits (raw scores) - common for classification models.
+            # The output buffer is reused by the next checkout, so the probabilities go to a new array.
+            return softmax(output, axis=-1)
+
+
+def _run_micro_batch(variant, images):
+    """run_batch of a variant's micro-batcher; stage timings are per invocation, shared by the batched requests."""
+    timings = StageTimings()
+    predictions = list(_run_inference(images, variant, timings))
+    for stage, seconds in timings.stages.items():
+        _stage_seconds.observe(seconds, stage=stage, variant=variant.name)
+    return predictions
+
+
+def _predict_one(image, variant, timings=None, deadline=None):
+    """Class probabilities of one image: through the variant's micro-batcher if enabled, otherwise a batch of one."""
+    if variant.micro_batcher is not None:
+        # Combined with other concurrent requests; we get back our own row of the output.
+        # "inference" includes the queue delay; per-invocation stages are recorded by _run_micro_batch.
+        # Left out of the batch (TimeoutError) if the deadline passes while queued.
+        with span(timings, "inference"):
+            future = variant.micro_batcher.submit(image, deadline.expires_at if deadline else None)
+            try:
+                return future.result()
+            except TimeoutError as e:
+                raise DeadlineExceeded(str(e)) from None
+    return _run_inference([image], variant, timings)[0]
+
+
+def _predict(images, route, timings=None, deadline=None):
+    """
+    Class probabilities for each decoded image from `route` (a ModelVariant, or a CascadeRoute
+    escalating the unsure images of the fast stage to the accurate one in a single invocation).
+
+    Returns:
+        list: One (probabilities, deciding ModelVariant, cascade stage or None) per image.
+    """
+    def run(variant, variant_images):
+        if len(variant_images) == 1:
+            return [_predict_one(variant_images[0], variant, timings, deadline)]
+        return list(_run_inference(variant_images, variant, timings))
+
+    if not isinstance(route, CascadeRoute):
+        return [(predictions, route, None) for predictions in run(route, images)]
+
+    fast_predictions = run(route.fast, images)
+    results = [None] * len(images)
+    escalated = []
+    for i, predictions in enumerate(fast_predictions):
+        confident, _, confidence, _ = route.is_confident(predictions)
+        _cascade_confidence.observe(confidence)
+        if confident:
+            results[i] = (predictions, route.fast, "fast")
+            _cascade_stats.record_fast()
+            _cascade_images_total.inc(stage="fast")
+            _maybe_audit(images[i], route, predictions)
+        else:
+            escalated.append(i)
+
+    if escalated:
+        if deadline is not None:
+            deadline.check("escalation")
+        with span(timings, "escalation"):
+            accurate_predictions = run(route.accurate, [images[i] for i in escalated])
+        for i, predictions in zip(escalated, accurate_predictions):
+            agreed = int(np.argmax(predictions)) == int(np.argmax(fast_predictions[i]))
+            results[i] = (predictions, route.accurate, "accurate")
+            _cascade_stats.record_escalation(agreed)
+            _cascade_images_total.inc(stage="accurate")
+            _cascade_agreement_total.inc(sample="escalated", agreed=str(agreed).lower())
+    return results
+
+
+def _maybe_audit(image, route, fast_predictions):
+    """
+    Re-runs a CASCADE_AUDIT_RATE sample of confident fast answers on the accurate variant in a
+    background thread, one at a time (skipped while one is running) so audits stay off the request path.
+    """
+    if CASCADE_AUDIT_RATE <= 0 or random.random() >= CASCADE_AUDIT_RATE:
+        return
+    if not _cascade_audit_slots.acquire(blocking=False):
+        _cascade_stats.record_audit_skipped()
+        return
+    fast_class = route.fast.class_names[int(np.argmax(fast_predictions))]
+    accurate_name = route.accurate.name
+
+    def audit():
+        try:
+            # Acquired again: the request holding the route may finish (and a swap retire it) first
+            with _registry.acquire(accurate_name) as accurate:
+                predictions = _run_inference([image], accurate)[0]
+                agreed = accurate.class_names[int(np.argmax(predictions))] == fast_class
+            _cascade_stats.record_audit(agreed)
+            _cascade_agreement_total.inc(sample="audit", agreed=str(agreed).lower())
+        except Exception as e:
+            logger.warning("Cascade audit failed: %s", e)
+        finally:
+            _cascade_audit_slots.release()
+
+    threading.Thread(target=audit, name="cascade-audit", daemon=True).start()
+
+
+@contextmanager
+def _acquire_route(requested_variant):
+    """
+    Context manager yielding what answers a request: the requested variant, or in cascade mode
+    (requests not naming a variant) a CascadeRoute over the fast and accurate variants.
+
+    Raises:
+        UnknownVariantError: If the requested (or a cascade) variant is not loaded.
+    """
+    if requested_variant or not CASCADE_FAST_VARIANT:
+        with _registry.acquire(requested_variant) as variant:
+            yield variant
+        return
+    with ExitStack() as stack:
+        fast = stack.enter_context(_registry.acquire(CASCADE_FAST_VARIANT))
+        accurate = stack.enter_context(_registry.acquire(CASCADE_ACCURATE_VARIANT or _registry.default))
+        yield CascadeRoute(fast, accurate, CASCADE_MIN_CONFIDENCE, CASCADE_MIN_MARGIN)
+
+
+def _decision_fields(decided_by, cascade_stage):
+    """Response/document fields naming the model that produced a diagnosis."""
+    fields = {"modelVariant": decided_by.name, "modelVersion": decided_by.version}
+    if cascade_stage is not None:
+        fields["cascadeStage"] = cascade_stage
+    return fields
+
+
+def _build_diagnosis(predictions, class_names):
+    """Builds the top-1 fields of a diagnosis from one row of class probabilities (scores: see _with_scores)."""
+    predicted_class_idx = np.argmax(predictions)
+    predicted_confidence = np.max(predictions)
+
+    return {
+        "class_name": class_names[predicted_class_idx],
+        "confidence": float(predicted_confidence),
+        "message": f"Detected: {class_names[predicted_class_idx]} with {predicted_confidence*100:.2f}% confidence."
+    }
+
+
+def _with_scores(diagnosis, predictions, class_names, score_format, top_k=RESPONSE_TOP_K):
+    """`diagnosis` plus the class probabilities encoded in `score_format` (see response_encoding.py)."""
+    return {**diagnosis, **encode_scores(predictions, class_names, score_format, top_k)}
+
+
+def _cached_diagnosis(diagnosis, class_names, score_format, top_k):
+    """
+    Re-encodes the scores of a cached diagnosis (stored as float16, so "full" scores from
+    the cache have ~3 significant digits) in the requested format.
+    """
+    predictions = decode_scores(diagnosis)
+    if predictions is None:
+        return diagnosis
+    top1 = {key: diagnosis[key] for key in ("class_name", "confidence", "message") if key in diagnosis}
+    return _with_scores(top1, predictions, class_names, score_format, top_k)
+
+
+def _score_options(request_json):
+    """
+    The (score format, top k) a request asked for, defaulting to RESPONSE_SCORES/RESPONSE_TOP_K.
+
+    Raises:
+        ValueError: For an unknown format or a top k that is not a positive integer.
+    """
+    score_format = request_json.get("scores") or RESPONSE_SCORES
+    if score_format not in SCORE_FORMATS:
+        raise ValueError(f"Unknown scores format '{score_format}', expected one of {', '.join(SCORE_FORMATS)}")
+    top_k = request_json.get("topK", RESPONSE_TOP_K)
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+        raise ValueError("topK must be a positive integer")
+    return score_format, top_k
+
+
+
+def _parse_batch_items(request_json):
+    """
+    Normalizes a batch request body into a list of items.
+
+    Accepts either `"imageUrls": ["https://...", ...]` or
+    `"images": [{"imageUrl": "https://..."} | {"imageBase64": "<base64 bytes>"}, ...]`.
+    Items are validated individually so one malformed entry does not fail the whole batch.
+    """
+    raw_items = request_json.get('images')
+    if raw_items is None:
+        raw_items = [{"imageUrl": url} for url in request_json.get('imageUrls') or []]
+
+    items = []
+    for index, raw_item in enumerate(raw_items):
+        item = {"index": index, "imageUrl": None, "imageBase64": None, "error": None}
+        if isinstance(raw_item, str):
+            item["imageUrl"] = raw_item
+        elif isinstance(raw_item, dict) and (raw_item.get('imageUrl') or raw_item.get('imageBase64')):
+            item["imageUrl"] = raw_item.get('imageUrl')
+            item["imageBase64"] = raw_item.get('imageBase64')
+        else:
+            item["error"] = "Each image must be a URL string or an object with 'imageUrl' or 'imageBase64'."
+        items.append(item)
+    return items
+
+
+def _load_batch_item(item, variant, deadline, timings=None):
+    """
+    Downloads (or base64-decodes) and preprocesses one batch item.
+    Sets item["cacheKey"] and item["contentKey"] (see _diagnosis_doc_id) and returns
+    (image_array, cached_result, error); cache hits are not decoded.
+    Stage timings of the items of a batch add up in `timings`.
+    """
+    item["cacheKey"] = item["contentKey"] = None
+    if item["error"]:
+        return None, None, item["error"]
+    try:
+        deadline.check("download")
+        with span(timings, "download"):
+            if item["imageBase64"]:
+                image_bytes = base64.b64decode(item["imageBase64"], validate=True)
+            else:
+                image_bytes = _download_image(item["imageUrl"])
+        with span(timings, "cache_lookup"):
+            item["cacheKey"], cached = _cache_lookup(image_bytes, variant)
+        item["contentKey"] = item["cacheKey"] or hashlib.sha256(image_bytes).hexdigest()
+        if cached is not None:
+            return None, cached, None
+        with span(timings, "decode"):
+            return _decode_image(image_bytes), None, None
+    except Exception as e:
+        logger.warning("Failed to load batch item %d: %s", item['index'], e)
+        return None, None, str(e)
+
+
+def _diagnosis_doc_id(content_key):
+    """
+    Builds a unique Firestore document ID for a diagnosis. `content_key` (the prediction cache
+    key, or the SHA-256 of the image bytes) groups the diagnoses of the same image; the random
+    suffix keeps concurrent diagnoses of the same image from overwriting each other.
+    """
+    return f"diagnosis_{content_key[:16]}_{uuid.uuid4().hex}"
+
+
+def _diagnosis_document(image_url, diagnosis_result, decision_fields):
+    """Firestore document stored for each diagnosis (decision_fields: see _decision_fields)."""
+    return {
+        "imageUrl": image_url,
+        "diagnosis": diagnosis_result,
+        **decision_fields,
+        "timestamp": firestore.SERVER_TIMESTAMP,
+        "module": "module1"
+    }
+
+
+def _store_diagnoses(db, documents):
+    """
+    Persists (doc_id, document) pairs: queued on the background writer in async mode,
+    otherwise committed before returning (one batched commit for several documents).
+    """
+    if _diagnosis_writer is not None:
+        for diagnosis_doc_id, document in documents:
+            _diagnosis_writer.write(diagnosis_doc_id, document)
+        return
+    if len(documents) == 1:
+        db.collection('diagnoses').document(documents[0][0]).set(documents[0][1])
+        return
+    firestore_batch = db.batch()
+    for diagnosis_doc_id, document in documents:
+        firestore_batch.set(db.collection('diagnoses').document(diagnosis_doc_id), document)
+    firestore_batch.commit()
+
+
+def _handle_batch_request(request_json, db, headers, variant, deadline, timings=None):
+    """
+    Batch mode: downloads and decodes all images concurrently, runs a single
+    interpreter invocation of `variant` over the stacked batch and reports results per image.
+    In cascade mode (`variant` is a CascadeRoute) the unsure images get a second, accurate invocation.
+    In `timings`, "load" is the wall-clock time of the concurrent download/decode phase,
+    while the per-image download, cache_lookup and decode stages are summed over the images.
+    Images not downloaded before the deadline fail individually; past it, inference is skipped.
+    """
+    items = _parse_batch_items(request_json)
+    if not items:
+        logger.warning("Bad Request: Empty image list in batch request.")
+        return ('{"error": "Batch request must contain at least one image"}', 400, headers)
+    if len(items) > MAX_BATCH_IMAGES:
+        logger.warning("Bad Request: Batch of %d images exceeds limit of %d.", len(items), MAX_BATCH_IMAGES)
+        return (json.dumps({"error": f"Batch request exceeds the limit of {MAX_BATCH_IMAGES} images"}), 400, headers)
+
+    try:
+        score_format, top_k = _score_options(request_json)
+    except ValueError as e:
+        logger.warning("Bad Request: %s", e)
+        return (json.dumps({"error": str(e)}), 400, headers)
+
+    logger.debug("Received batch request with %d images.", len(items))
+
+    # Download and decode concurrently; per-item failures are recorded instead of raised
+    with span(timings, "load"), ThreadPoolExecutor(max_workers=min(BATCH_DOWNLOAD_WORKERS, len(items))) as executor:
+        loaded = list(executor.map(lambda item: _load_batch_item(item, variant, deadline, timings), items))
+
+    results = [None] * len(items)
+    ok_items = []
+    ok_images = []
+    cache_hits = 0
+    for item, (image, cached, error) in zip(items, loaded):
+        if error:
+            results[item["index"]] = {"index": item["index"], "imageUrl": item["imageUrl"], "error": error}
+        elif cached is not None:
+            results[item["index"]] = {
+                "index": item["index"],
+                "imageUrl": item["imageUrl"],
+                **cached,
+                "diagnosis": _cached_diagnosis(cached["diagnosis"], variant.class_names, score_format, top_k),
+                "cached": True
+            }
+            cache_hits += 1
+        else:
+            ok_items.append(item)
+            ok_images.append(image)
+
+    if ok_images:
+        deadline.check("batch inference")
+        try:
+            predictions = _predict(ok_images, variant, timings, deadline)
+        except DeadlineExceeded:
+            raise # Answered with a 504 by _handle_predict_request
+        except Exception as e:
+            logger.exception("Error during batch inference: %s", e)
+            return (json.dumps({"error": str(e), "message": "Failed to run batch diagnosis."}), 500, headers)
+
+        documents = []
+        cache_entries = []
+        for item, (item_predictions, decided_by, cascade_stage) in zip(ok_items, predictions):
+            names = decided_by.class_names
+            diagnosis_result = _build_diagnosis(item_predictions, names)
+            diagnosis_doc_id = _diagnosis_doc_id(item["contentKey"])
+            decision = _decision_fields(decided_by, cascade_stage)
+            documents.append((diagnosis_doc_id, _diagnosis_document(
+                item["imageUrl"], _with_scores(diagnosis_result, item_predictions, names, DIAGNOSIS_SCORES), decision
+            )))
+            results[item["index"]] = {
+                "index": item["index"],
+                "imageUrl": item["imageUrl"],
+                "diagnosis": _with_scores(diagnosis_result, item_predictions, names, score_format, top_k),
+                "diagnosisId": diagnosis_doc_id,
+                **decision,
+                "cached": False
+            }
+            cache_entries.append((item["cacheKey"], {
+                "diagnosis": _with_scores(diagnosis_result, item_predictions, names, "float16"),
+                "diagnosisId": diagnosis_doc_id,
+                **decision
+            }))
+
+        # One commit for all diagnoses of the batch (or queued for the background writer)
+        with span(timings, "firestore"):
+            _store_diagnoses(db, documents)
+        logger.debug("%s %d batch diagnoses for Firestore.",
+                     'Queued' if _diagnosis_writer is not None else 'Stored', len(documents))
+
+        if _prediction_cache is not None:
+            with span(timings, "cache_store"):
+                for cache_key, entry in cache_entries:
+                    _prediction_cache.set(cache_key, entry)
+
+    succeeded = len(ok_items) + cache_hits
+    logger.debug("Batch finished: %d succeeded (%d from cache), %d failed.", succeeded, cache_hits, len(items) - succeeded)
+    return (dumps({
+        "results": results,
+        "succeeded": succeeded,
+        "failed": len(items) - succeeded,
+        "modelVariant": variant.name,
+        "modelVersion": variant.version
+    }), 200, headers)
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is reported in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _memory_mb():
+    """
+    Current RSS and PSS of this process in MB (Linux only, empty otherwise).
+    PSS divides shared pages (e.g. the memory-mapped model) between the processes mapping them,
+    so summing it over prefork workers gives their real footprint.
+    """
+    fields_kb = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if value.strip().endswith('kB'):
+                    fields_kb[key] = int(value.split()[0])
+    except OSError:
+        return {}
+    return {"rss_mb": fields_kb.get("Rss", 0) / 1024.0, "pss_mb": fields_kb.get("Pss", 0) / 1024.0}
+
+
+def _warm_up():
+    """
+    Loads everything and runs dummy invocations on every pooled interpreter of every model variant (and one decode),
+    so the first request is served at steady-state speed. Used by the eager/background STARTUP_MODEs.
+    """
+    _readiness.update(state="starting", error=None)
+    started_at = time.perf_counter()
+    try:
+        _load_model_and_class_names()
+        warm_up_decoder(MODEL_INPUT_SIZE)
+        for variant in _registry.variants():
+            _warm_up_variant(variant)
+    except Exception as e:
+        _readiness.update(state="failed", error=str(e))
+        logger.exception("Warm-up failed: %s", e)
+        return
+    _cold_start["warmup_s"] = time.perf_counter() - started_at
+    _cold_start["time_to_ready_s"] = time.perf_counter() - _IMPORT_STARTED_AT
+    _cold_start.update({f"{key}_after_warmup": value for key, value in _memory_mb().items()})
+    _readiness["state"] = "ready"
+    logger.info("Warm-up finished", extra={"fields": {"cold_start": _cold_start}})
 
 
 @functions_framework.http
@@ -90,10 +918,63 @@ def predict_plant_disease(request):
     """
     Cloud Function for Module 1 TFLite inference.
     Triggered by an HTTP request (called from Node.js orchestrator).
+
+    Single mode: `{"imageUrl": "..."}`.
+    Batch mode: `{"imageUrls": [...]}` or `{"images": [{"imageUrl": ...} | {"imageBase64": ...}]}`,
+    answered with one result (or error) per image from a single interpreter invocation.
+    The model variant is named by the X-Model-Variant request header, or picked by the configured
+    weights (or the CASCADE_* settings); the response reports the model that answered
+    (modelVariant, modelVersion, cascadeStage in cascade mode, and the X-Model-Variant header).
+    Class probabilities are returned as "scores" asks: full (default), topk (with "topK"), float16, uint8 or none.
+    Under overload requests are shed with 429 + Retry-After (see ADMISSION_* settings); work still
+    pending when the request's deadline passes is dropped with 504 (see REQUEST_TIMEOUT_S).
+
+    GET requests to the operational paths (see _OPS_ROUTES) are answered by this same process,
+    since functions_framework serves one target per process: `GET <function URL>/stats`.
     """
+    ops_handler = _OPS_ROUTES.get(request.path.rstrip("/")) if request.method == "GET" else None
+    if ops_handler is not None:
+        return ops_handler(request)
+
+    request_started_at = time.perf_counter()
+    cold = not _model_ready # This request pays for the lazy model load
+    timings = StageTimings()
+    body, status, headers = _handle_predict_request(request, timings)
+    elapsed = time.perf_counter() - request_started_at
+
+    request_json = request.get_json(silent=True) if request.method != 'OPTIONS' else None
+    mode = "batch" if request_json and ('imageUrls' in request_json or 'images' in request_json) else "single"
+    variant_name = headers.get(MODEL_VARIANT_HEADER, "none") # Not set when no variant was selected
+    _requests_total.inc(mode=mode, status=status, variant=variant_name)
+    if not cold:
+        _request_seconds.observe(elapsed, mode=mode, variant=variant_name)
+        for stage, seconds in timings.stages.items():
+            _stage_seconds.observe(seconds, stage=stage, variant=variant_name)
+
+    if "first_request_s" not in _cold_start:
+        # Includes the lazy model load; compare against steady-state latency to size the cold-start penalty
+        _cold_start["first_request_s"] = elapsed
+        _cold_start["time_to_first_response_s"] = time.perf_counter() - _IMPORT_STARTED_AT
+        _cold_start["peak_rss_mb_after_first_request"] = _peak_rss_mb()
+        _cold_start["first_request_stages_ms"] = timings.as_ms()
+        logger.info("Cold start", extra={"fields": {"cold_start": _cold_start}})
+
+    timings.add("total", elapsed)
+    headers['Server-Timing'] = timings.server_timing_header()
+    headers['Timing-Allow-Origin'] = '*' # Lets browser clients read Server-Timing cross-origin
+    logger.info("Request finished", extra={"fields": {
+        "mode": mode, "status": status, "variant": variant_name, "cold_start": cold, "stages_ms": timings.as_ms()
+    }})
+    return (body, status, headers)
+
+
+def _handle_predict_request(request, timings):
+    """Handles one predict_plant_disease request (single or batch mode), recording stage timings."""
     # Call the lazy loader on function invocation.
     # This is the FIRST time any heavy initialization will run for this instance.
-    _load_model_and_class_names()
+    with span(timings if not _model_ready else None, "model_load"):
+        _load_model_and_class_names()
+    _maybe_refresh_registry()
 
     # Now that clients are guaranteed to be initialized, use them.
     db = _db_client # Use the lazily initialized Firestore client
@@ -104,101 +985,271 @@ def predict_plant_disease(request):
         headers = {
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'POST, GET, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Allow-Headers': f'Content-Type, {MODEL_VARIANT_HEADER}, {REQUEST_TIMEOUT_HEADER}',
             'Access-Control-Max-Age': '3600'
         }
         return ('', 204, headers)
 
     headers = {
-        'Access-Control-Allow-Origin': '*'
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': f'{MODEL_VARIANT_HEADER}, Retry-After'
     }
 
-    request_json = request.get_json(silent=True)
+    requested_variant = request.headers.get(MODEL_VARIANT_HEADER)
+    try:
+        deadline = _request_deadline(request)
+    except ValueError:
+        logger.warning("Bad Request: Invalid %s header.", REQUEST_TIMEOUT_HEADER)
+        return (json.dumps({"error": f"{REQUEST_TIMEOUT_HEADER} must be a number of milliseconds"}), 400, headers)
+    try:
+        with ExitStack() as stack:
+            with span(timings, "admission"):
+                if _admission is not None:
+                    stack.enter_context(_admission.admit(deadline))
+            variant = stack.enter_context(_acquire_route(requested_variant))
+            headers[MODEL_VARIANT_HEADER] = variant.name
+            request_json = request.get_json(silent=True)
+            if request_json and ('imageUrls' in request_json or 'images' in request_json):
+                return _handle_batch_request(request_json, db, headers, variant, deadline, timings)
+            return _handle_single_request(request_json, db, headers, variant, deadline, timings)
+    except Overloaded as e:
+        logger.warning("Shedding request: %s", e)
+        headers['Retry-After'] = e.retry_after_header
+        return (json.dumps({"error": str(e)}), 429, headers)
+    except DeadlineExceeded as e:
+        logger.warning("Dropping request: %s", e)
+        return (json.dumps({"error": str(e)}), 504, headers)
+    except UnknownVariantError:
+        logger.warning("Bad Request: Unknown model variant %r.", requested_variant)
+        return (json.dumps({
+            "error": f"Unknown model variant '{requested_variant}'",
+            "variants": sorted(_registry.versions())
+        }), 400, headers)
+
+
+def _request_deadline(request):
+    """
+    The request's Deadline: REQUEST_TIMEOUT_S, or the caller's shorter REQUEST_TIMEOUT_HEADER.
+
+    Raises:
+        ValueError: If the header is not a number.
+    """
+    timeout_s = REQUEST_TIMEOUT_S
+    header = request.headers.get(REQUEST_TIMEOUT_HEADER)
+    if header is not None:
+        timeout_s = min(timeout_s, float(header) / 1000.0)
+    return Deadline(timeout_s)
+
+
+def _handle_single_request(request_json, db, headers, variant, deadline, timings):
+    """
+    Single mode: diagnoses the image at request_json["imageUrl"] with `variant`.
+    Concurrent requests for the same URL and model share one download and inference (see COALESCE_ENABLED).
+    """
     if not request_json or 'imageUrl' not in request_json:
-        print(f"[{os.getpid()}] Bad Request: Missing imageUrl in JSON body.")
+        logger.warning("Bad Request: Missing imageUrl in JSON body.")
         return ('{"error": "Missing imageUrl in request body"}', 400, headers)
 
+    try:
+        score_format, top_k = _score_options(request_json)
+    except ValueError as e:
+        logger.warning("Bad Request: %s", e)
+        return (json.dumps({"error": str(e)}), 400, headers)
+
     image_url = request_json['imageUrl']
-    print(f"[{os.getpid()}] Received request for image URL: {image_url}")
+    logger.debug("Received request for image URL: %s", image_url)
 
     try:
-        # Download image from the provided URL (could be Firebase Storage or any public URL)
-        # tf.keras.utils.get_file handles downloading to /tmp/ and caching
-        # Clean filename from URL query parameters (e.g., "?alt=media&token=...")
-        img_local_path = tf.keras.utils.get_file(
-            os.path.basename(image_url).split('?')[0],
-            image_url,
-            cache_dir="/tmp/"
-        )
+        diagnose = lambda: _diagnose_image_url(image_url, db, variant, deadline, timings)  # noqa: E731
+        if _single_flight is not None:
+            waiting_since = time.perf_counter()
+            outcome, shared = _single_flight.do((image_url, variant.version), diagnose, timeout=deadline.remaining())
+            # If the leader's (shorter) deadline ran out, the work is re-run under this request's deadline
+            if shared:
+                # The stages ran in the request that led the flight
+                timings.add("coalesced", time.perf_counter() - waiting_since)
+        else:
+            outcome = diagnose()
 
-        # Read, decode, resize, and preprocess the image
-        img = tf.io.read_file(img_local_path)
-        img = tf.image.decode_image(img, channels=3, expand_animations=False) # Ensure 3 channels, no GIFs
-        img = tf.image.resize(img, [224, 224]) # TFLite model input size (EfficientNetV2-B0 default)
-        img = tf.cast(img, tf.float32) # Ensure float32 for model input (if not int8)
-        img = np.expand_dims(img, axis=0) # Add batch dimension
-
-        # Get input and output tensors details for TFLite interpreter
-        input_details = interpreter.get_input_details()
-        output_details = interpreter.get_output_details()
-
-        # Handle quantization if the model input type is INT8
-        input_dtype = input_details[0]['dtype']
-        if input_dtype == np.int8:
-            print(f"[{os.getpid()}] Input type is INT8, quantizing image for TFLite model...")
-            input_scale, input_zero_point = input_details[0]["quantization"]
-            img = (img / input_scale + input_zero_point).astype(input_dtype)
-        elif input_dtype == np.float32:
-            pass # No specific normalization for EfficientNetV2's internal preprocessing
+        entry = outcome["entry"]
+        if outcome["predictions"] is not None:
+            diagnosis = _with_scores(outcome["diagnosis"], outcome["predictions"], outcome["class_names"],
+                                     score_format, top_k)
         else:
-            print(f"[{os.getpid()}] Warning: Unexpected TFLite input dtype: {input_dtype}")
+            diagnosis = _cached_diagnosis(entry["diagnosis"], outcome["class_names"], score_format, top_k)
+        # Entries cached before the model fields were stored fall back to the variant answering now
+        return (dumps({
+            "modelVariant": variant.name,
+            "modelVersion": variant.version,
+            **entry,
+            "diagnosis": diagnosis,
+            "cached": outcome["cached"]
+        }), 200, headers)
+
+    except (ImageTooLargeError, ResponseTooLargeError) as e:
+        logger.warning("Rejected oversized image: %s", e)
+        return (json.dumps({"error": str(e), "message": "Image is too large for diagnosis."}), 413, headers)
+    except DeadlineExceeded:
+        raise # Answered with a 504 by _handle_predict_request
+    except Exception as e:
+        logger.exception("Error during image processing or inference: %s", e)
+        return (json.dumps({"error": str(e), "message": "Failed to process image for diagnosis."}), 500, headers)
+
 
+def _diagnose_image_url(image_url, db, variant, deadline, timings):
+    """
+    Downloads, diagnoses and stores one image (or finds it in the prediction cache).
 
-        # Set the input tensor
-        interpreter.set_tensor(input_details[0]['index'], img)
+    Returns:
+        dict: "entry" (the prediction cache entry: diagnosis with float16 scores, diagnosisId, model fields),
+              "diagnosis" (top-1 fields), "predictions" (class probabilities, None on a cache hit),
+              "class_names" and "cached".
+    """
+    # Download image from the provided URL (could be Firebase Storage or any public URL)
+    deadline.check("download")
+    with timings.span("download"):
+        image_bytes = _download_image(image_url)
 
-        # Invoke inference
-        interpreter.invoke()
+    # Same image bytes + same model version: return the stored diagnosis without running inference
+    with timings.span("cache_lookup"):
+        cache_key, cached = _cache_lookup(image_bytes, variant)
+    if cached is not None:
+        logger.debug("Prediction cache hit: %s", cached['diagnosisId'])
+        return {"entry": cached, "diagnosis": None, "predictions": None,
+                "class_names": variant.class_names, "cached": True}
 
-        # Get the output tensor
-        output = interpreter.get_tensor(output_details[0]['index'])
+    # Decode the image (final resize happens when it is written into the input tensor)
+    deadline.check("decode")
+    with timings.span("decode"):
+        img = _decode_image(image_bytes)
 
-        # Handle dequantization if the model output type is INT8
-        output_dtype = output_details[0]['dtype']
-        if output_dtype == np.int8:
-            output_scale, output_zero_point = output_details[0]["quantization"]
-            output = (output.astype(np.float32) - output_zero_point) * output_scale
+    # Batch of one (or micro-batched); in cascade mode escalated to the accurate variant when unsure
+    deadline.check("inference")
+    (predictions, decided_by, cascade_stage), = _predict([img], variant, timings, deadline)
+    names = decided_by.class_names
+    diagnosis_result = _build_diagnosis(predictions, names)
+    decision = _decision_fields(decided_by, cascade_stage)
 
-        # Apply softmax if the model outputs logits (raw scores) - common for classification models
-        predictions = tf.nn.softmax(output[0]).numpy()
+    logger.debug("Inference result: %s (%.4f)", diagnosis_result["class_name"], diagnosis_result["confidence"])
 
-        predicted_class_idx = np.argmax(predictions)
-        predicted_confidence = np.max(predictions)
+    diagnosis_doc_id = _diagnosis_doc_id(cache_key or hashlib.sha256(image_bytes).hexdigest())
 
-        diagnosis_result = {
-            "class_name": class_names[predicted_class_idx],
-            "confidence": float(predicted_confidence),
-            "full_prediction_scores": predictions.tolist(), # Store all class probabilities
-            "message": f"Detected: {class_names[predicted_class_idx]} with {predicted_confidence*100:.2f}% confidence."
-        }
+    # Save relevant parts to Firestore (in the background unless DIAGNOSIS_WRITE_MODE is "sync")
+    with timings.span("firestore"):
+        _store_diagnoses(db, [(diagnosis_doc_id, _diagnosis_document(
+            image_url, _with_scores(diagnosis_result, predictions, names, DIAGNOSIS_SCORES), decision
+        ))])
+    logger.debug("Diagnosis %s Firestore with ID: %s",
+                 'queued for' if _diagnosis_writer is not None else 'stored in', diagnosis_doc_id)
 
-        print(f"[{os.getpid()}] Inference result: {diagnosis_result}")
+    entry = {
+        "diagnosis": _with_scores(diagnosis_result, predictions, names, "float16"),
+        "diagnosisId": diagnosis_doc_id,
+        **decision
+    }
+    if _prediction_cache is not None:
+        with timings.span("cache_store"):
+            _prediction_cache.set(cache_key, entry)
+    return {"entry": entry, "diagnosis": diagnosis_result, "predictions": predictions,
+            "class_names": names, "cached": False}
 
-        diagnosis_doc_id = f"diagnosis_{os.path.basename(image_url).split('?')[0].replace('.', '_')}_{tf.timestamp().numpy().astype(int)}"
-        
-        # Save relevant parts to Firestore using the lazily initialized client
-        db.collection('diagnoses').document(diagnosis_doc_id).set({
-            "imageUrl": image_url,
-            "diagnosis": diagnosis_result,
-            "timestamp": firestore.FieldValue.server_timestamp(),
-            "module": "module1"
-        })
-        print(f"[{os.getpid()}] Diagnosis stored in Firestore with ID: {diagnosis_doc_id}")
 
-        return (json.dumps({"diagnosis": diagnosis_result, "diagnosisId": diagnosis_doc_id}), 200, headers)
+def _inference_stats(request):
+    """
+    Reports runtime metrics of the inference service for this instance
+    (cold-start timings, loaded model variants with their interpreter pool utilization,
+    achieved micro-batch sizes and queue delays,
+    prediction cache hit/miss counters, download cache and fetcher usage, background diagnosis writes).
+    """
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'application/json'
+    }
+    stats = {
+        "pid": os.getpid(),
+        "cold_start": _cold_start,
+        "peak_rss_mb": _peak_rss_mb(),
+        "models": _registry.stats() if _registry is not None else None,
+        "cascade": _cascade_stats.stats() if CASCADE_FAST_VARIANT else None,
+        "admission": _admission.stats() if _admission is not None else None,
+        "coalescing": _single_flight.stats() if _single_flight is not None else None,
+        "prediction_cache": _prediction_cache.stats() if _prediction_cache is not None else None,
+        "model_download_cache": _model_cache.stats() if _model_cache is not None else None,
+        "image_download_cache": _image_cache.stats() if _image_cache is not None else None,
+        "image_fetcher": _image_fetcher.stats() if _image_fetcher is not None else None,
+        "diagnosis_writer": _diagnosis_writer.stats() if _diagnosis_writer is not None else None,
+        "readiness": _readiness,
+        "memory": _memory_mb(),
+    }
+    return (json.dumps(stats), 200, headers)
 
-    except Exception as e:
-        print(f"[{os.getpid()}] Error during image processing or inference: {e}")
-        import traceback
-        traceback.print_exc()
-        return (json.dumps({"error": str(e), "message": "Failed to process image for diagnosis."}), 500, headers)
\ No newline at end of file
+
+def _inference_metrics(request):
+    """
+    Exports this instance's metrics in the Prometheus text exposition format:
+    request counters, steady-state request/stage latency histograms, cold-start timings
+    and the counters of the per-variant pools, caches, fetcher and diagnosis writer as gauges.
+    """
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'
+    }
+    gauges = stats_gauges("agroai_cold_start", _cold_start, "Cold-start timing of this instance")
+    gauges += stats_gauges("agroai_process", {"peak_rss_mb": _peak_rss_mb(), **_memory_mb()}, "Process resource usage")
+    if _registry is not None:
+        variants = _registry.variants()
+        gauges += stats_gauges("agroai_interpreter_pool", {v.name: v.interpreter_pool.stats() for v in variants},
+                               "Current interpreter pool stats", label_name="variant")
+        gauges += stats_gauges("agroai_micro_batching", {
+            v.name: v.micro_batcher.stats() for v in variants if v.micro_batcher is not None
+        }, "Current micro batching stats", label_name="variant")
+    if CASCADE_FAST_VARIANT:
+        gauges += stats_gauges("agroai_cascade", _cascade_stats.stats(), "Cascade escalation and stage agreement")
+    components = {
+        "admission": _admission,
+        "coalescing": _single_flight,
+        "prediction_cache": _prediction_cache,
+        "model_download_cache": _model_cache,
+        "image_download_cache": _image_cache,
+        "image_fetcher": _image_fetcher,
+        "diagnosis_writer": _diagnosis_writer,
+    }
+    for name, component in components.items():
+        if component is not None:
+            gauges += stats_gauges(f"agroai_{name}", component.stats(), f"Current {name.replace('_', ' ')} stats")
+    return (_metrics.render(gauges), 200, headers)
+
+
+def _inference_ready(request):
+    """
+    Readiness probe: 200 once the model is loaded and warmed up, 503 while starting or after
+    a failed warm-up. In the lazy STARTUP_MODE the instance is always reported ready
+    (the model loads inside the first request, as before).
+    """
+    headers = {
+        'Access-Control-Allow-Origin': '*',
+        'Content-Type': 'application/json'
+    }
+    ready = _readiness["state"] in ("lazy", "ready")
+    body = {"ready": ready, "startup_mode": STARTUP_MODE, **_readiness,
+            "model_versions": _registry.versions() if _registry is not None else None}
+    return (json.dumps(body), 200 if ready else 503, headers)
+
+
+# Operational endpoints served by predict_plant_disease (GET <path>), so they report the process
+# that actually handles predictions
+_OPS_ROUTES = {
+    "/stats": _inference_stats,
+    "/metrics": _inference_metrics,
+    "/ready": _inference_ready,
+}
+
+
+# --- Startup ---
+if STARTUP_MODE == "eager":
+    _warm_up()
+elif STARTUP_MODE == "background":
+    _readiness["state"] = "starting"
+    threading.Thread(target=_warm_up, name="model-warm-up", daemon=True).start()
+elif STARTUP_MODE != "lazy":
+    raise ValueError(f"Unknown AGROAI_STARTUP_MODE '{STARTUP_MODE}', expected lazy, eager or background")
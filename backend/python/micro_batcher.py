@@ -0,0 +1,157 @@
+import threading
+import time
+import queue
+from concurrent.futures import Future
+
+
+class _PendingItem:
+    """One submitted item waiting in the queue, together with the future its caller waits on."""
+
+    __slots__ = ("payload", "future", "enqueued_at", "expires_at")
+
+    def __init__(self, payload, expires_at=None):
+        self.payload = payload
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.expires_at = expires_at
+
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    In-process request aggregator in front of a batch function.
+
+    Single items submitted from concurrent request threads are collected until either
+    `max_batch_size` items are waiting or `max_wait_ms` has passed since the first item
+    of the batch arrived. The whole batch is then handed to `run_batch` in one call and
+    every caller receives its own slice of the output through a Future.
+    With `num_workers` > 1, that many batches may be in flight at once
+    (e.g. one per pooled interpreter).
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, num_workers=1, name="micro-batcher"):
+        """
+        Args:
+            run_batch (callable): Takes a list of payloads and returns a sequence of results
+                                  of the same length and order.
+            max_batch_size (int): Maximum number of items combined into one batch.
+            max_wait_ms (float): Maximum time the first item of a batch waits for company.
+            num_workers (int): Number of background worker threads running batches.
+            name (str): Name prefix of the background worker threads.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.run_batch = run_batch
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = max(float(max_wait_ms), 0.0) / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._failed_batches = 0
+        self._expired = 0
+        self._batch_size_counts = {}  # achieved batch size -> number of batches
+        self._queue_delay_sum_s = 0.0
+        self._queue_delay_max_s = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, int(num_workers)))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, payload, expires_at=None):
+        """
+        Queues one item and returns a Future resolving to its result.
+        If the batch only runs after `expires_at` (time.perf_counter() value), the item is left
+        out of it and the Future fails with TimeoutError.
+        """
+        item = _PendingItem(payload, expires_at)
+        self._queue.put(item)
+        return item.future
+
+    def close(self):
+        """Stops the workers after the items already queued have been processed."""
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self):
+        """Returns achieved batch size and queue delay metrics as a JSON-serializable dict."""
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "failed_batches": self._failed_batches,
+                "expired": self._expired,
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_size_counts.items())),
+                "avg_queue_delay_ms": 1000.0 * self._queue_delay_sum_s / self._items if self._items else 0.0,
+                "max_queue_delay_ms": 1000.0 * self._queue_delay_max_s,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": 1000.0 * self.max_wait_s,
+                "workers": len(self._workers),
+            }
+
+    def _collect_batch(self, first):
+        """Gathers items after `first` until the batch is full or its wait window closes."""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Put the sentinel back so the main loop exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect_batch(first)
+
+            started_at = time.perf_counter()
+            # Callers that have given up are not worth an interpreter slot
+            expired = [item for item in batch if item.expires_at is not None and item.expires_at <= started_at]
+            if expired:
+                batch = [item for item in batch if item not in expired]
+                with self._stats_lock:
+                    self._expired += len(expired)
+                for item in expired:
+                    item.future.set_exception(TimeoutError("Deadline expired before the batch ran"))
+                if not batch:
+                    continue
+            delays = [started_at - item.enqueued_at for item in batch]
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_size_counts[len(batch)] = self._batch_size_counts.get(len(batch), 0) + 1
+                self._queue_delay_sum_s += sum(delays)
+                self._queue_delay_max_s = max(self._queue_delay_max_s, max(delays))
+
+            try:
+                results = self.run_batch([item.payload for item in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                with self._stats_lock:
+                    self._failed_batches += 1
+                for item in batch:
+                    item.future.set_exception(e)
+                continue
+
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
@@ -0,0 +1,204 @@
+"""
+Registry of the model versions served side by side (e.g. FP32, dynamic-range and INT8
+variants of the same classifier), with per-request routing and hot-swapping.
+
+Configuration (inline in AGROAI_MODELS or as a JSON manifest at AGROAI_MODEL_REGISTRY_URL):
+
+    {
+      "default": "fp32",
+      "variants": {
+        "fp32": {"model_url": "gs://.../fp32_model.tflite", "class_names_url": "gs://.../class_names.txt",
+                 "sha256": "<optional>", "version": "<optional>", "weight": 90},
+        "int8": {"model_url": "gs://.../int8_model.tflite", "class_names_url": "gs://.../class_names.txt",
+                 "weight": 10}
+      }
+    }
+
+Requests name a variant explicitly (header) or are routed at random in proportion to the
+weights, which gives canary rollouts and A/B latency comparisons. Applying a new
+configuration loads changed variants first and then swaps them in atomically; requests
+already running on the old version finish on it, and it is closed once they have drained.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Spec keys that change what is loaded; other keys (weight) are routing only
+_LOAD_KEYS = ("model_url", "class_names_url", "sha256", "version")
+
+
+class UnknownVariantError(KeyError):
+    """Raised when a request names a variant that is not loaded."""
+
+
+class ModelVariant:
+    """One loaded model version: its interpreter pool, class names and in-flight request count."""
+
+    def __init__(self, name, version, interpreter_pool, class_names, spec, micro_batcher=None):
+        self.name = name
+        self.version = version
+        self.interpreter_pool = interpreter_pool
+        self.class_names = class_names
+        self.spec = dict(spec)
+        self.micro_batcher = micro_batcher
+        self.loaded_at = time.time()
+        self._in_flight = 0
+        self._drained = threading.Condition()
+
+    def _enter(self):
+        with self._drained:
+            self._in_flight += 1
+
+    def _exit(self):
+        with self._drained:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._drained.notify_all()
+
+    def drain(self, timeout=None):
+        """Waits until no request is running on this variant. Returns False on timeout."""
+        with self._drained:
+            return self._drained.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+    def close(self):
+        """Stops the variant's micro-batcher; the interpreters are released with the variant."""
+        if self.micro_batcher is not None:
+            self.micro_batcher.close()
+
+    def stats(self):
+        with self._drained:
+            in_flight = self._in_flight
+        return {
+            "version": self.version,
+            "weight": self.spec.get("weight", 0),
+            "in_flight": in_flight,
+            "loaded_at": self.loaded_at,
+            "num_classes": len(self.class_names),
+            "interpreter_pool": self.interpreter_pool.stats(),
+            "micro_batching": self.micro_batcher.stats() if self.micro_batcher is not None else None,
+        }
+
+
+class ModelRegistry:
+    """Thread-safe set of loaded ModelVariants with weighted routing and drained hot-swaps."""
+
+    def __init__(self, load_variant, drain_timeout_s=300.0, rng=None):
+        """
+        Args:
+            load_variant (callable): `load_variant(name, spec)` returns a loaded ModelVariant.
+            drain_timeout_s (float): How long a replaced variant may keep serving in-flight
+                                     requests before it is closed anyway.
+            rng (random.Random, optional): Source of the weighted routing decisions.
+        """
+        self.load_variant = load_variant
+        self.drain_timeout_s = drain_timeout_s
+        self._rng = rng or random.Random()
+        self._variants = {}  # name -> ModelVariant
+        self._default = None
+        self._lock = threading.Lock()
+        self._apply_lock = threading.Lock()  # One configuration change at a time
+        self.swaps = 0
+
+    def apply(self, config):
+        """
+        Makes the registry match `config` (see the module docstring): loads new or changed
+        variants, updates weights, swaps atomically and drains replaced/removed variants
+        in the background. If a variant fails to load, nothing is swapped.
+
+        Returns:
+            list: Names of the variants that were (re)loaded.
+        """
+        variants = config.get("variants") or {}
+        if not variants:
+            raise ValueError("Model registry configuration has no variants")
+        default = config.get("default") or next(iter(variants))
+        if default not in variants:
+            raise ValueError(f"Default variant '{default}' is not configured")
+
+        with self._apply_lock:
+            with self._lock:
+                current = dict(self._variants)
+            loaded = {}
+            for name, spec in variants.items():
+                old = current.get(name)
+                if old is None or any(old.spec.get(key) != spec.get(key) for key in _LOAD_KEYS):
+                    loaded[name] = self.load_variant(name, spec)
+                else:
+                    old.spec["weight"] = spec.get("weight", 0)
+
+            with self._lock:
+                retired = [variant for name, variant in self._variants.items() if name not in variants or name in loaded]
+                self._variants = {name: loaded.get(name, current.get(name)) for name in variants}
+                self._default = default
+                self.swaps += sum(1 for name in loaded if name in current)
+
+        for variant in retired:
+            threading.Thread(target=self._retire, args=(variant,), name=f"retire-{variant.name}", daemon=True).start()
+        return list(loaded)
+
+    def _retire(self, variant):
+        variant.drain(self.drain_timeout_s)
+        variant.close()
+
+    def _select_locked(self, name):
+        if name:
+            variant = self._variants.get(name)
+            if variant is None:
+                raise UnknownVariantError(name)
+            return variant
+        candidates = [v for v in self._variants.values() if v.spec.get("weight", 0) > 0]
+        if not candidates:
+            return self._variants[self._default]
+        return self._rng.choices(candidates, weights=[v.spec["weight"] for v in candidates])[0]
+
+    def select(self, name=None):
+        """
+        Returns the variant named `name`, or one picked at random in proportion to the
+        configured weights (the default variant when all weights are zero).
+
+        Raises:
+            UnknownVariantError: If `name` is not loaded.
+        """
+        with self._lock:
+            return self._select_locked(name)
+
+    @contextmanager
+    def acquire(self, name=None):
+        """
+        Context manager yielding a selected variant (see select) that is not closed before
+        the block exits, even if a new version is swapped in meanwhile.
+        """
+        with self._lock:
+            # Counted as in flight before a concurrent swap can retire it
+            variant = self._select_locked(name)
+            variant._enter()
+        try:
+            yield variant
+        finally:
+            variant._exit()
+
+    @property
+    def default(self):
+        """Name of the default variant."""
+        with self._lock:
+            return self._default
+
+    def variants(self):
+        with self._lock:
+            return list(self._variants.values())
+
+    def versions(self):
+        """Returns {variant name: model version}."""
+        with self._lock:
+            return {name: variant.version for name, variant in self._variants.items()}
+
+    def stats(self):
+        with self._lock:
+            variants = dict(self._variants)
+            default = self._default
+        return {
+            "default": default,
+            "swaps": self.swaps,
+            "variants": {name: variant.stats() for name, variant in variants.items()},
+        }
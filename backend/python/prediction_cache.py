@@ -0,0 +1,169 @@
+"""
+Content-addressed cache of diagnoses, keyed by a hash of the image bytes plus the model version.
+
+A retried upload or a re-shared photo hits the cache and gets the stored diagnosis back
+without decoding the image or touching the interpreter. The in-process tier is an LRU with
+size and TTL eviction; an optional persistent tier (Firestore, or the in-memory stand-in
+for local runs) survives instance restarts and is shared between instances.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUTTLCache:
+    """Thread-safe in-process LRU cache with a maximum entry count and a per-entry TTL."""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600.0, clock=time.monotonic):
+        """
+        Args:
+            max_entries (int): Least recently used entries are evicted beyond this size.
+            ttl_seconds (float): Entries older than this are treated as missing. None disables expiry.
+            clock (callable): Monotonic time source (injectable for tests/benchmarks).
+        """
+        self.max_entries = int(max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class InMemoryPredictionStore:
+    """Local stand-in for the persistent tier (same get/set interface as FirestorePredictionStore)."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+
+class FirestorePredictionStore:
+    """Persistent tier storing one document per cache key in a Firestore collection."""
+
+    def __init__(self, db, collection="prediction_cache", ttl_seconds=None):
+        """
+        Args:
+            db: Firestore client.
+            collection (str): Collection holding the cache documents.
+            ttl_seconds (float, optional): Documents older than this are ignored on read.
+        """
+        self.db = db
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        snapshot = self.db.collection(self.collection).document(key).get()
+        if not snapshot.exists:
+            return None
+        data = snapshot.to_dict()
+        if self.ttl_seconds is not None and data.get("storedAt", 0) + self.ttl_seconds <= time.time():
+            return None
+        return data.get("value")
+
+    def set(self, key, value):
+        self.db.collection(self.collection).document(key).set({"value": value, "storedAt": time.time()})
+
+
+class PredictionCache:
+    """Two-tier (in-process LRU + optional persistent store) cache with hit/miss counters."""
+
+    def __init__(self, memory_tier, persistent_tier=None):
+        self.memory_tier = memory_tier
+        self.persistent_tier = persistent_tier
+        self._stats_lock = threading.Lock()
+        self._memory_hits = 0
+        self._persistent_hits = 0
+        self._misses = 0
+        self._persistent_errors = 0
+
+    @staticmethod
+    def make_key(image_bytes, model_version):
+        """Content address of an image for a given model version."""
+        digest = hashlib.sha256()
+        digest.update(model_version.encode())
+        digest.update(b"\0")
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Returns the cached value or None. Persistent-tier hits are promoted to memory."""
+        value = self.memory_tier.get(key)
+        if value is not None:
+            self._count("_memory_hits")
+            return value
+
+        if self.persistent_tier is not None:
+            try:
+                value = self.persistent_tier.get(key)
+            except Exception:
+                # The persistent tier is an optimization; fall through to inference when it fails
+                self._count("_persistent_errors")
+                value = None
+            if value is not None:
+                self.memory_tier.set(key, value)
+                self._count("_persistent_hits")
+                return value
+
+        self._count("_misses")
+        return None
+
+    def set(self, key, value):
+        self.memory_tier.set(key, value)
+        if self.persistent_tier is not None:
+            try:
+                self.persistent_tier.set(key, value)
+            except Exception:
+                self._count("_persistent_errors")
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """Returns hit/miss counters as a JSON-serializable dict."""
+        with self._stats_lock:
+            lookups = self._memory_hits + self._persistent_hits + self._misses
+            return {
+                "lookups": lookups,
+                "memory_hits": self._memory_hits,
+                "persistent_hits": self._persistent_hits,
+                "misses": self._misses,
+                "hit_rate": (self._memory_hits + self._persistent_hits) / lookups if lookups else 0.0,
+                "persistent_errors": self._persistent_errors,
+                "memory_entries": len(self.memory_tier),
+                "memory_evictions": self.memory_tier.evictions,
+            }
@@ -0,0 +1,137 @@
+"""
+Image decode + resize stage of the inference function.
+
+Both pipelines turn encoded image bytes into a float32 array of shape (size, size, 3)
+in the [0, 255] range expected by the EfficientNetV2 TFLite model.
+
+The Pillow pipeline avoids decoding pixels that the resize would throw away: JPEGs are
+decoded with libjpeg DCT-domain downscaling (1/2, 1/4 or 1/8 scale via `Image.draft`) to
+the smallest size that is still >= the model input, and the remaining resize is a
+vectorized NumPy bilinear resize with the same sampling as tf.image.resize.
+"""
+import io
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the pixel-count ceiling."""
+
+
+def _open_checked(image_bytes, max_pixels):
+    """Opens an image lazily (header only) and enforces the pixel-count ceiling before any decode."""
+    img = Image.open(io.BytesIO(image_bytes))
+    width, height = img.size
+    if max_pixels and width * height > max_pixels:
+        img.close()
+        raise ImageTooLargeError(
+            f"Image of {width}x{height} pixels exceeds the limit of {max_pixels} pixels."
+        )
+    return img
+
+
+@lru_cache(maxsize=64)
+def _bilinear_taps(in_size, out_size):
+    """
+    Source indices and interpolation weights for one axis, using half-pixel centers
+    (identical to tf.image.resize(method="bilinear", antialias=False)).
+    """
+    src = (np.arange(out_size, dtype=np.float64) + 0.5) * (in_size / out_size) - 0.5
+    src = np.clip(src, 0, in_size - 1)
+    lower = np.floor(src).astype(np.intp)
+    upper = np.minimum(lower + 1, in_size - 1)
+    frac = (src - lower).astype(np.float32)
+    return lower, upper, frac
+
+
+def resize_bilinear(image, height, width, out=None):
+    """
+    Vectorized bilinear resize of an (H, W, C) array.
+
+    Args:
+        image (np.ndarray): Input image, any numeric dtype.
+        height (int): Output height.
+        width (int): Output width.
+        out (np.ndarray, optional): float32 array of shape (height, width, C) to write into.
+
+    Returns:
+        np.ndarray: float32 array of shape (height, width, C).
+    """
+    y0, y1, fy = _bilinear_taps(image.shape[0], height)
+    x0, x1, fx = _bilinear_taps(image.shape[1], width)
+
+    # Interpolate rows first so the column pass only touches `height` rows
+    top = image[y0].astype(np.float32)
+    bottom = image[y1].astype(np.float32)
+    bottom -= top
+    bottom *= fy[:, None, None]
+    rows = top
+    rows += bottom
+
+    left = rows[:, x0]
+    right = rows[:, x1]
+    right -= left
+    right *= fx[None, :, None]
+    return np.add(left, right, out=out)
+
+
+def decode_pixels(image_bytes, size, max_pixels=None):
+    """
+    Decodes an image to a uint8 RGB array that is at least `size` x `size` but, for JPEGs,
+    usually much smaller than the full-resolution photo. The final resize is left to
+    resize_bilinear so it can write straight into the interpreter's input tensor.
+
+    Args:
+        image_bytes (bytes): Encoded image (JPEG, PNG, WebP, ...).
+        size (int): Model input height and width.
+        max_pixels (int, optional): Pixel-count ceiling checked before decoding.
+
+    Raises:
+        ImageTooLargeError: If the image has more than `max_pixels` pixels.
+    """
+    with _open_checked(image_bytes, max_pixels) as img:
+        img.seek(0)  # First frame only, matching expand_animations=False
+        # JPEG only (no-op otherwise): decode at the largest DCT scale whose output is still >= size x size
+        img.draft("RGB", (size, size))
+        return np.asarray(img.convert("RGB"))
+
+
+def decode_and_resize_pil(image_bytes, size, max_pixels=None, out=None):
+    """
+    Pillow/NumPy implementation used by the slim serving runtimes.
+
+    Args:
+        image_bytes (bytes): Encoded image (JPEG, PNG, WebP, ...).
+        size (int): Model input height and width.
+        max_pixels (int, optional): Pixel-count ceiling checked before decoding.
+        out (np.ndarray, optional): float32 array of shape (size, size, 3) to write into.
+
+    Raises:
+        ImageTooLargeError: If the image has more than `max_pixels` pixels.
+    """
+    return resize_bilinear(decode_pixels(image_bytes, size, max_pixels), size, size, out=out)
+
+
+def warm_up(size):
+    """
+    Round-trips a blank JPEG through decode_pixels and resize_bilinear so Pillow's plugin
+    registry and the decoder are initialized before the first request.
+    """
+    buffer = io.BytesIO()
+    Image.new("RGB", (2 * size, 2 * size)).save(buffer, format="JPEG")
+    return resize_bilinear(decode_pixels(buffer.getvalue(), size), size, size)
+
+
+def decode_and_resize_tf(image_bytes, size, max_pixels=None):
+    """Original TensorFlow implementation (tensorflow serving runtime)."""
+    import tensorflow as tf
+
+    if max_pixels:
+        _open_checked(image_bytes, max_pixels).close()
+
+    img = tf.image.decode_image(image_bytes, channels=3, expand_animations=False) # Ensure 3 channels, no GIFs
+    img = tf.image.resize(img, [size, size])
+    img = tf.cast(img, tf.float32) # Ensure float32 for model input (if not int8)
+    return img.numpy()
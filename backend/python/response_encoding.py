@@ -0,0 +1,73 @@
+"""
+Encodings of the class probabilities in diagnosis responses and Firestore documents, and
+the JSON serializer for response bodies.
+
+A full score list is ~38 JSON floats (~800 bytes) per image. The compact formats keep what
+clients actually use, for clients that opt in:
+
+- "full":    all probabilities as a JSON list (`full_prediction_scores`, the original format; default)
+- "topk":    the k most likely classes with their probabilities
+- "float16": all probabilities as base64 of little-endian float16 (`scores_float16`, 2 bytes/class)
+- "uint8":   all probabilities quantized to round(p * 255), base64 (`scores_uint8`, 1 byte/class)
+- "none":    only the top-1 class and confidence
+"""
+import base64
+import json
+
+import numpy as np
+
+try:
+    import orjson  # Optional: several times faster than json.dumps for response bodies
+except ImportError:
+    orjson = None
+
+SCORE_FORMATS = ("topk", "full", "float16", "uint8", "none")
+
+# Quantization step of the "uint8" format
+UINT8_SCALE = 1.0 / 255.0
+
+
+def encode_scores(probabilities, class_names, score_format="full", top_k=5):
+    """
+    Returns the diagnosis fields carrying `probabilities` in `score_format` (see module docstring).
+
+    Raises:
+        ValueError: For an unknown format.
+    """
+    probabilities = np.asarray(probabilities, dtype=np.float32)
+    if score_format == "topk":
+        k = max(1, min(int(top_k), probabilities.size))
+        best = np.argpartition(probabilities, -k)[-k:]
+        best = best[np.argsort(probabilities[best])[::-1]]
+        return {"top_k": [
+            {"class_name": class_names[i], "confidence": float(probabilities[i])} for i in best
+        ]}
+    if score_format == "full":
+        return {"full_prediction_scores": probabilities.tolist()}
+    if score_format == "float16":
+        return {"scores_float16": base64.b64encode(probabilities.astype("<f2").tobytes()).decode("ascii")}
+    if score_format == "uint8":
+        quantized = np.clip(np.rint(probabilities / UINT8_SCALE), 0, 255).astype(np.uint8)
+        return {"scores_uint8": base64.b64encode(quantized.tobytes()).decode("ascii"), "scores_scale": UINT8_SCALE}
+    if score_format == "none":
+        return {}
+    raise ValueError(f"Unknown score format '{score_format}', expected one of {', '.join(SCORE_FORMATS)}")
+
+
+def decode_scores(fields):
+    """Inverse of encode_scores for the formats carrying all probabilities; None for the others."""
+    if "full_prediction_scores" in fields:
+        return np.asarray(fields["full_prediction_scores"], dtype=np.float32)
+    if "scores_float16" in fields:
+        return np.frombuffer(base64.b64decode(fields["scores_float16"]), dtype="<f2").astype(np.float32)
+    if "scores_uint8" in fields:
+        quantized = np.frombuffer(base64.b64decode(fields["scores_uint8"]), dtype=np.uint8)
+        return quantized.astype(np.float32) * fields.get("scores_scale", UINT8_SCALE)
+    return None
+
+
+def dumps(obj):
+    """Compact JSON of a response body: orjson when installed (bytes), otherwise json (str)."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"))
@@ -0,0 +1,78 @@
+"""
+Serving runtime selection for the inference function.
+
+The service only needs a TFLite interpreter, image decode/resize and a softmax, so it can
+run on the standalone LiteRT (`ai_edge_litert`) or `tflite_runtime` interpreter together
+with Pillow/NumPy, without paying for `import tensorflow` on cold start. Full TensorFlow
+remains available as the `tensorflow` runtime (the original serving path).
+"""
+import importlib
+import time
+
+import numpy as np
+
+RUNTIME_CHOICES = ("auto", "litert", "tflite_runtime", "tensorflow")
+
+# Slim interpreter packages, in order of preference for the "auto" runtime
+_SLIM_INTERPRETER_MODULES = (
+    ("litert", "ai_edge_litert.interpreter"),
+    ("tflite_runtime", "tflite_runtime.interpreter"),
+)
+
+
+class ServingRuntime:
+    """The resolved interpreter implementation and how long importing it took."""
+
+    def __init__(self, name, interpreter_class, import_seconds):
+        self.name = name
+        self.interpreter_class = interpreter_class
+        self.import_seconds = import_seconds
+
+    @property
+    def is_slim(self):
+        """True when serving without full TensorFlow (Pillow/NumPy preprocessing)."""
+        return self.name != "tensorflow"
+
+
+def resolve_runtime(preferred="auto"):
+    """
+    Imports the interpreter for the requested runtime.
+
+    Args:
+        preferred (str): One of RUNTIME_CHOICES. "auto" picks the first slim interpreter
+                         that is installed and falls back to full TensorFlow.
+
+    Returns:
+        ServingRuntime: The resolved runtime.
+    """
+    if preferred not in RUNTIME_CHOICES:
+        raise ValueError(f"Unknown serving runtime '{preferred}', expected one of {RUNTIME_CHOICES}")
+
+    candidates = [c for c in _SLIM_INTERPRETER_MODULES if preferred in ("auto", c[0])]
+    if preferred in ("auto", "tensorflow"):
+        candidates.append(("tensorflow", "tensorflow"))
+
+    for name, module_name in candidates:
+        started_at = time.perf_counter()
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            if preferred != "auto":
+                raise
+            continue
+        interpreter_class = module.lite.Interpreter if name == "tensorflow" else module.Interpreter
+        return ServingRuntime(name, interpreter_class, time.perf_counter() - started_at)
+
+    raise ImportError("No TFLite interpreter available: install ai-edge-litert, tflite-runtime or tensorflow")
+
+
+def softmax(logits, axis=-1, out=None):
+    """
+    NumPy equivalent of tf.nn.softmax (float32, numerically stabilized).
+    Computed in place in `out` (allocated when not given), which may alias `logits`.
+    """
+    logits = np.asarray(logits, dtype=np.float32)
+    out = np.subtract(logits, logits.max(axis=axis, keepdims=True), out=out)
+    np.exp(out, out=out)
+    out /= out.sum(axis=axis, keepdims=True)
+    return out
@@ -0,0 +1,243 @@
+"""
+Request instrumentation for the inference service: per-stage timing spans (reported in a
+`Server-Timing` header), Prometheus counters/histograms rendered in the text exposition
+format, and structured (JSON) logging with a configurable level.
+"""
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Latency buckets (seconds) covering cache hits (sub-millisecond) up to slow downloads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Parent logger of all service modules ("agroai.inference", "agroai.diagnosis_writer", ...)
+LOGGER_NAME = "agroai"
+
+
+class StageTimings:
+    """
+    Wall-clock durations of the named stages of one request (or one micro-batch).
+    A stage that runs several times (e.g. decode for each image of a batch) accumulates.
+    Safe to share between the threads working on the same request.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()  # stage -> seconds
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started_at)
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_ms(self):
+        """Returns {stage: milliseconds}, rounded for logs and JSON output."""
+        with self._lock:
+            return {stage: round(1000.0 * seconds, 3) for stage, seconds in self.stages.items()}
+
+    def server_timing_header(self):
+        """Formats the stages as a Server-Timing header value (durations in milliseconds)."""
+        return ", ".join(f"{stage};dur={ms:.3f}" for stage, ms in self.as_ms().items())
+
+
+@contextmanager
+def span(timings, stage):
+    """`timings.span(stage)`, or a no-op when no StageTimings is being collected."""
+    if timings is None:
+        yield
+    else:
+        with timings.span(stage):
+            yield
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter with optional labels."""
+
+    type_name = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values = {}  # label values -> count
+
+    def inc(self, amount=1, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram with optional labels."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        key = self._label_values(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the metrics of a process and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self, extra_lines=()):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+def stats_gauges(prefix, stats, help_text, label_name=None):
+    """
+    Renders the numeric entries of a component's stats() dict as Prometheus gauges named
+    `<prefix>_<key>`; nested dicts, strings and None are skipped. With `label_name`, `stats`
+    maps label values to stats dicts (e.g. one per model variant), rendered as labeled series.
+    """
+    series = OrderedDict()  # gauge name -> [(labels, value)]
+    keys = {}  # gauge name -> stats key
+    for label_value, component_stats in (stats.items() if label_name else [(None, stats)]):
+        for key, value in (component_stats or {}).items():
+            if isinstance(value, bool):
+                value = int(value)
+            if not isinstance(value, (int, float)):
+                continue
+            name = f"{prefix}_{key}"
+            keys[name] = key
+            labels = _format_labels((label_name,), (label_value,)) if label_name else ""
+            series.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, samples in series.items():
+        lines.extend([f"# HELP {name} {help_text} ({keys[name]}).", f"# TYPE {name} gauge"])
+        lines.extend(f"{name}{labels} {_format_value(value)}" for labels, value in samples)
+    return lines
+
+
+class JsonLogFormatter(logging.Formatter):
+    """
+    One JSON object per line, which Cloud Logging parses into structured entries
+    (`severity` and `message`, plus any `fields` passed through `extra=`).
+    """
+
+    def format(self, record):
+        entry = {
+            "severity": record.levelname,
+            "message": record.getMessage(),
+            "logger": record.name,
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level="INFO"):
+    """
+    Sends the service's loggers (everything under "agroai") to stdout as JSON lines at `level`
+    (e.g. "DEBUG", "INFO", "WARNING"). Library loggers keep their own configuration.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if not any(isinstance(h.formatter, JsonLogFormatter) for h in logger.handlers):
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonLogFormatter())
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(str(level).upper())
+    return logger
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The function's modules are imported from backend/python, as the Cloud Functions runtime does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, Deadline, DeadlineExceeded, Overloaded, SingleFlight  # noqa: E402
+
+
+def _slow_work(deadline, started, duration_s=0.2):
+    """Stands in for download + inference: checks its caller's deadline between stages."""
+    def work():
+        started.set()
+        for _ in range(4):
+            deadline.check("stage")
+            time.sleep(duration_s / 4)
+        deadline.check("stage")
+        return "diagnosis"
+    return work
+
+
+def test_follower_outlives_short_deadline_leader():
+    flight = SingleFlight()
+    leader_deadline, follower_deadline = Deadline(0.05), Deadline(5.0)
+    leader_started = threading.Event()
+    outcomes = {}
+
+    def leader():
+        try:
+            outcomes["leader"] = flight.do("image", _slow_work(leader_deadline, leader_started),
+                                           timeout=leader_deadline.remaining())
+        except DeadlineExceeded as e:
+            outcomes["leader"] = e
+
+    thread = threading.Thread(target=leader)
+    thread.start()
+    assert leader_started.wait(1.0)
+    result, shared = flight.do("image", _slow_work(follower_deadline, threading.Event()),
+                               timeout=follower_deadline.remaining())
+    thread.join()
+
+    assert isinstance(outcomes["leader"], DeadlineExceeded)
+    assert (result, shared) == ("diagnosis", False)  # Re-run under the follower's own deadline
+    assert flight.stats() == {"leaders": 2, "coalesced": 1, "retried": 1, "in_flight": 0}
+
+
+def test_followers_share_the_leader_result():
+    flight = SingleFlight()
+    leader_started = threading.Event()
+    outcomes = {}
+    thread = threading.Thread(target=lambda: outcomes.setdefault(
+        "leader", flight.do("image", _slow_work(Deadline(5.0), leader_started), timeout=5.0)))
+    thread.start()
+    assert leader_started.wait(1.0)
+    follower = flight.do("image", lambda: pytest.fail("follower ran its own work"), timeout=5.0)
+    thread.join()
+
+    assert outcomes["leader"] == ("diagnosis", False)
+    assert follower == ("diagnosis", True)
+
+
+def test_follower_fails_on_its_own_deadline():
+    flight = SingleFlight()
+    leader_started = threading.Event()
+    thread = threading.Thread(target=lambda: flight.do("image", _slow_work(Deadline(5.0), leader_started)))
+    thread.start()
+    assert leader_started.wait(1.0)
+    with pytest.raises(DeadlineExceeded):
+        flight.do("image", lambda: "unused", timeout=0.01)
+    thread.join()
+
+
+def test_admission_rejects_when_the_queue_is_full():
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    with controller.admit():
+        with pytest.raises(Overloaded):
+            with controller.admit():
+                pytest.fail("admitted past max_concurrent")
+    stats = controller.stats()
+    assert (stats["admitted"], stats["shed"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_admission_retry_after_reflects_the_estimated_wait():
+    controller = AdmissionController(max_concurrent=1, max_queue=8, max_wait_s=0.0)
+    with controller.admit():
+        time.sleep(0.05)  # Service time average the estimate is based on
+    with controller.admit():
+        estimated_wait_s = controller.estimated_wait_s(1)
+        with pytest.raises(Overloaded) as shed:
+            with controller.admit():
+                pytest.fail("admitted past max_wait_s")
+    assert shed.value.retry_after_s == pytest.approx(estimated_wait_s)
+    assert shed.value.retry_after_s >= 0.05
+    assert shed.value.retry_after_header == "1"  # Whole seconds, at least 1
+    assert Overloaded("shed", retry_after_s=2.1).retry_after_header == "3"
+
+
+def test_admission_releases_the_slot_on_exception():
+    controller = AdmissionController(max_concurrent=1, max_queue=0)
+    with pytest.raises(ValueError):
+        with controller.admit():
+            raise ValueError("inference failed")
+    assert controller.stats()["in_flight"] == 0
+    with controller.admit():
+        assert controller.stats()["in_flight"] == 1
+
+
+def test_admission_queued_request_gets_the_released_slot():
+    controller = AdmissionController(max_concurrent=1, max_queue=1, max_wait_s=5.0)
+    release = threading.Event()
+    holding = threading.Event()
+
+    def hold_slot():
+        with controller.admit():
+            holding.set()
+            release.wait(5.0)
+
+    thread = threading.Thread(target=hold_slot)
+    thread.start()
+    assert holding.wait(1.0)
+    threading.Timer(0.05, release.set).start()
+    with controller.admit(Deadline(5.0)):
+        assert controller.stats()["in_flight"] == 1
+    thread.join()
+    assert controller.stats()["admitted"] == 2
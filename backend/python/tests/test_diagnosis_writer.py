@@ -0,0 +1,76 @@
+import time
+
+import main
+from benchmarks.local_standins import InMemoryFirestore
+from diagnosis_writer import DiagnosisWriter
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _document(i):
+    return {"imageUrl": f"https://example.com/leaf_{i}.jpg", "diagnosis": {"class_name": "healthy"}}
+
+
+def test_dead_letters_are_retried_until_written():
+    db = InMemoryFirestore(fail_commits=2)
+    # One commit of all three documents: fails, fails again after its retry, then succeeds
+    writer = DiagnosisWriter(db, max_batch_size=3, max_wait_ms=1000, retries=0, backoff_seconds=0,
+                             dead_letter_retry_s=0.05)
+    for i in range(3):
+        writer.write(f"doc_{i}", _document(i))
+
+    _wait_for(lambda: len(db.documents("diagnoses")) == 3)
+    stats = writer.stats()
+    assert stats["failed_commits"] == 2
+    assert stats["requeued_dead_letters"] == 6
+    assert stats["commits"] == 1
+    assert writer.dead_letters() == []
+    writer.close()
+
+
+def test_close_retries_dead_letters():
+    db = InMemoryFirestore(fail_commits=1)
+    writer = DiagnosisWriter(db, max_wait_ms=10, retries=0, backoff_seconds=0, dead_letter_retry_s=None)
+    writer.write("doc_0", _document(0))
+    assert writer.flush(timeout=5)
+    assert [doc_id for doc_id, _, _ in writer.dead_letters()] == ["doc_0"]
+    assert db.documents("diagnoses") == {}
+
+    writer.close(timeout=5)
+    assert db.documents("diagnoses") == {"doc_0": _document(0)}
+    assert writer.dead_letters() == []
+
+
+def test_flush_and_close_drain_the_queue():
+    db = InMemoryFirestore(commit_latency_s=0.02)
+    writer = DiagnosisWriter(db, max_batch_size=4, max_wait_ms=50)
+    for i in range(10):
+        writer.write(f"doc_{i}", _document(i))
+    assert writer.flush(timeout=5)
+    assert len(db.documents("diagnoses")) == 10
+    assert writer.stats()["pending"] == 0
+
+    for i in range(10, 20):
+        writer.write(f"doc_{i}", _document(i))
+    writer.close(timeout=5)
+    assert len(db.documents("diagnoses")) == 20
+    assert writer.stats()["written"] == 20
+
+
+def test_identical_images_get_distinct_documents():
+    content_key = "0123456789abcdef" * 4
+    first, second = main._diagnosis_doc_id(content_key), main._diagnosis_doc_id(content_key)
+    assert first != second
+    assert first.startswith("diagnosis_0123456789abcdef_") and second.startswith("diagnosis_0123456789abcdef_")
+
+    db = InMemoryFirestore()
+    writer = DiagnosisWriter(db, max_wait_ms=10)
+    writer.write(first, _document(0))
+    writer.write(second, _document(0))
+    writer.close(timeout=5)
+    assert set(db.documents("diagnoses")) == {first, second}
@@ -0,0 +1,83 @@
+import os
+
+import download_cache
+from download_cache import DownloadCache
+
+
+def _fetch_from(blobs, calls=None):
+    def fetch_to(url, fileobj):
+        if calls is not None:
+            calls.append(url)
+        fileobj.write(blobs[url])
+    return fetch_to
+
+
+def test_misses_rescan_only_when_over_budget(tmp_path, monkeypatch):
+    blobs = {f"https://example.com/{i}.jpg": bytes([i]) * 100 for i in range(6)}
+    cache = DownloadCache(str(tmp_path), max_bytes=450, fetch_to=_fetch_from(blobs))
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(download_cache.os, "listdir", lambda path: scans.append(path) or listdir(path))
+
+    for url in list(blobs)[:4]:
+        assert cache.get_bytes(url) == blobs[url]
+    assert scans == []
+    assert cache.stats()["bytes"] == 400
+
+    for url in list(blobs)[4:]:
+        assert cache.get_bytes(url) == blobs[url]
+    assert len(scans) == 2
+    assert cache.stats()["bytes"] <= 450
+    assert sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path) if not name.startswith(".")) <= 450
+
+
+def test_evicted_files_are_downloaded_again(tmp_path, monkeypatch):
+    url = "https://example.com/leaf.jpg"
+    calls = []
+    cache = DownloadCache(str(tmp_path), max_bytes=1000, fetch_to=_fetch_from({url: b"leaf"}, calls))
+    get_path = cache.get_path
+
+    def get_path_then_evict(url, sha256=None):
+        # Another worker evicts the file between get_path and open
+        path = get_path(url, sha256)
+        if len(calls) == 1:
+            os.unlink(path)
+        return path
+
+    monkeypatch.setattr(cache, "get_path", get_path_then_evict)
+    assert cache.get_bytes(url) == b"leaf"
+    assert len(calls) == 2
+
+
+def _content(url):
+    index = int(url.rsplit("/", 1)[1].split(".")[0])
+    return bytes([index % 256]) * (1000 + 37 * index)
+
+
+def _fill_and_read(root_dir, max_bytes, urls):
+    """Worker process: reads every URL through a shared cache; returns the errors it saw."""
+    cache = DownloadCache(root_dir, max_bytes, fetch_to=lambda url, fileobj: fileobj.write(_content(url)))
+    errors = []
+    for url in urls:
+        try:
+            if cache.get_bytes(url) != _content(url):
+                errors.append(f"wrong content for {url}")
+        except Exception as e:
+            errors.append(repr(e))
+    return errors
+
+
+def test_processes_share_the_budget(tmp_path):
+    import multiprocessing
+
+    max_bytes = 20_000
+    urls = [f"https://example.com/{i}.jpg" for i in range(40)]
+    # Overlapping URLs in different orders: hits, misses and evictions of the other worker's files
+    orders = [urls * 3, list(reversed(urls)) * 3]
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        results = pool.starmap(_fill_and_read, [(str(tmp_path), max_bytes, order) for order in orders])
+
+    assert results == [[], []]
+    entries = [name for name in os.listdir(tmp_path) if not name.startswith(".")]
+    assert entries
+    assert sum(os.path.getsize(tmp_path / name) for name in entries) <= max_bytes
@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.local_standins import LocalImageServer
+from image_fetcher import FetchError, ImageFetcher, MAX_REDIRECTS
+
+IMAGE = b"\xff\xd8jpeg bytes\xff\xd9"
+
+
+def test_redirects_are_followed():
+    with LocalImageServer({"/objects/leaf.jpg": IMAGE}, redirects={
+        "/signed/leaf.jpg": "/cdn/leaf.jpg",
+        "/cdn/leaf.jpg": "/objects/leaf.jpg",
+    }) as server:
+        fetcher = ImageFetcher(retries=0)
+        assert fetcher.fetch_bytes(server.url("/signed/leaf.jpg")) == IMAGE
+        assert fetcher.stats()["failures"] == 0
+
+
+def test_redirect_loops_fail_without_retrying():
+    with LocalImageServer({}, redirects={"/loop.jpg": "/loop.jpg"}) as server:
+        fetcher = ImageFetcher(retries=2, backoff_seconds=0)
+        with pytest.raises(FetchError) as error:
+            fetcher.fetch_bytes(server.url("/loop.jpg"))
+        assert error.value.status == 302
+        assert fetcher.stats()["requests"] == 1
+    assert MAX_REDIRECTS > 0
+
+
+def test_missing_images_are_not_retried():
+    with LocalImageServer({}) as server:
+        fetcher = ImageFetcher(retries=2, backoff_seconds=0)
+        with pytest.raises(FetchError) as error:
+            fetcher.fetch_bytes(server.url("/missing.jpg"))
+        assert error.value.status == 404
+        assert fetcher.stats()["requests"] == 1
@@ -0,0 +1,73 @@
+import numpy as np
+
+from interpreter_pool import PooledInterpreter
+
+
+class FakeInterpreter:
+    """Stands in for tf.lite.Interpreter: the output is the first pixel of each input, dequantized."""
+
+    def __init__(self, input_dtype=np.float32, input_quantization=(0.0, 0), batch_size=1, image_shape=(2, 2, 3)):
+        self.input_dtype = input_dtype
+        self.input_quantization = input_quantization
+        self.image_shape = image_shape
+        self.input_shape = [batch_size, *image_shape]
+        self.allocations = 0
+        self.invoked_batch_sizes = []
+        self.last_input = None
+
+    def allocate_tensors(self):
+        self.allocations += 1
+        self._input = np.zeros(self.input_shape, dtype=self.input_dtype)
+        self._output = np.zeros((self.input_shape[0], 3), dtype=np.float32)
+
+    def resize_tensor_input(self, index, shape):
+        self.input_shape = list(shape)
+
+    def get_input_details(self):
+        return [{"index": 0, "dtype": self.input_dtype, "shape": np.array(self.input_shape),
+                 "quantization": self.input_quantization}]
+
+    def get_output_details(self):
+        return [{"index": 1, "dtype": np.float32, "shape": np.array([self.input_shape[0], 3]),
+                 "quantization": (0.0, 0)}]
+
+    def tensor(self, index):
+        return lambda: self._input if index == 0 else self._output
+
+    def invoke(self):
+        self.invoked_batch_sizes.append(self._input.shape[0])
+        self.last_input = self._input.copy()
+        self._output[:] = self._input[:, 0, 0, :]
+
+
+def test_int8_input_is_rounded_and_saturated():
+    pooled = PooledInterpreter(FakeInterpreter(np.int8, (1.0, 0)))
+    image = np.zeros((2, 2, 3), dtype=np.float32)
+    image[0, 0] = [127.6, 128.4, -129.5]
+    image[0, 1] = [130.0, -0.6, 0.4]
+    pooled.run([image])
+    quantized = pooled.interpreter.last_input[0]
+    assert quantized[0, 0].tolist() == [127, 127, -128]  # Saturated, not wrapped around
+    assert quantized[0, 1].tolist() == [127, -1, 0]  # Rounded, not truncated
+
+
+def test_batches_are_padded_to_the_allowed_sizes():
+    interpreter = FakeInterpreter()
+    pooled = PooledInterpreter(interpreter, batch_sizes=(1, 4))
+    for batch_size in (1, 3, 2, 4, 1, 3):
+        images = [np.full((2, 2, 3), i, dtype=np.float32) for i in range(batch_size)]
+        output = pooled.run(images)
+        assert output.shape == (batch_size, 3)
+        assert output[:, 0].tolist() == list(range(batch_size))  # Padding rows are sliced off
+    assert interpreter.invoked_batch_sizes == [1, 4, 4, 4, 1, 4]
+    assert pooled.resizes == 3  # Only when switching between 1 and 4, not for every new size
+
+
+def test_batches_larger_than_every_size_run_in_chunks():
+    interpreter = FakeInterpreter()
+    pooled = PooledInterpreter(interpreter, batch_sizes=(4,))
+    images = [np.full((2, 2, 3), i, dtype=np.float32) for i in range(10)]
+    output = pooled.run(images)
+    assert interpreter.invoked_batch_sizes == [4, 4, 4]
+    assert output[:, 0].tolist() == list(range(10))
+    assert pooled.resizes == 1
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+class RecordingPredictor:
+    """Doubles every payload and records the size of each batch it is called with."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.batch_sizes = []
+        self._lock = threading.Lock()
+
+    def __call__(self, payloads):
+        with self._lock:
+            self.batch_sizes.append(len(payloads))
+        if self.error is not None:
+            raise self.error
+        return [payload * 2 for payload in payloads]
+
+
+def test_full_batches_run_without_waiting():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=4, max_wait_ms=10_000)
+    started_at = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(8)]
+    assert [future.result(timeout=5) for future in futures] == [i * 2 for i in range(8)]
+    assert time.perf_counter() - started_at < 5
+    assert predictor.batch_sizes == [4, 4]
+    assert batcher.stats()["batch_size_counts"] == {4: 2}
+    batcher.close()
+
+
+def test_partial_batch_runs_after_max_wait():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=8, max_wait_ms=50)
+    started_at = time.perf_counter()
+    futures = [batcher.submit(i) for i in range(3)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4]
+    assert time.perf_counter() - started_at >= 0.04
+    assert predictor.batch_sizes == [3]
+    batcher.close()
+
+
+def test_batch_errors_reach_every_caller():
+    predictor = RecordingPredictor(error=ValueError("interpreter failed"))
+    batcher = MicroBatcher(predictor, max_batch_size=3, max_wait_ms=10_000)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="interpreter failed"):
+            future.result(timeout=5)
+    assert batcher.stats()["failed_batches"] == 1
+
+    # The worker survives the failure
+    predictor.error = None
+    assert [future.result(timeout=5) for future in [batcher.submit(i) for i in range(3)]] == [0, 2, 4]
+    batcher.close()
+
+
+def test_result_count_mismatch_fails_the_batch():
+    batcher = MicroBatcher(lambda payloads: payloads[:1], max_batch_size=2, max_wait_ms=10_000)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="1 results for 2 items"):
+            future.result(timeout=5)
+    batcher.close()
+
+
+def test_expired_items_are_left_out():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=2, max_wait_ms=10_000)
+    expired = batcher.submit(1, expires_at=time.perf_counter() - 1.0)
+    live = batcher.submit(2)
+    with pytest.raises(TimeoutError):
+        expired.result(timeout=5)
+    assert live.result(timeout=5) == 4
+    assert predictor.batch_sizes == [1]
+    assert batcher.stats()["expired"] == 1
+    batcher.close()
+
+
+def test_close_processes_queued_items_and_stops_workers():
+    predictor = RecordingPredictor()
+    batcher = MicroBatcher(predictor, max_batch_size=4, max_wait_ms=10_000, num_workers=2)
+    futures = [batcher.submit(i) for i in range(6)]
+    batcher.close()
+    assert all(future.done() for future in futures)
+    assert [future.result() for future in futures] == [i * 2 for i in range(6)]
+    assert sum(predictor.batch_sizes) == 6
+    assert not any(worker.is_alive() for worker in batcher._workers)
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import main
+
+
+class GetRequest:
+    """The parts of the Flask request predict_plant_disease reads for a GET."""
+
+    method = "GET"
+    headers = {}
+
+    def __init__(self, path):
+        self.path = path
+
+    def get_json(self, silent=False):
+        return None
+
+
+@pytest.fixture(autouse=True)
+def no_model_load(monkeypatch):
+    # Operational endpoints must answer without loading the model
+    monkeypatch.setattr(main, "_load_model_and_class_names", lambda: pytest.fail("model loaded"))
+
+
+def test_stats_are_served_by_the_predict_target():
+    body, status, headers = main.predict_plant_disease(GetRequest("/stats"))
+    assert status == 200
+    assert json.loads(body)["pid"] > 0
+    assert headers["Content-Type"] == "application/json"
+
+
+def test_metrics_are_served_by_the_predict_target():
+    body, status, headers = main.predict_plant_disease(GetRequest("/metrics"))
+    assert status == 200
+    assert headers["Content-Type"].startswith("text/plain")
+    assert "agroai_process_peak_rss_mb" in body
+
+
+@pytest.mark.parametrize("state, status", [("lazy", 200), ("ready", 200), ("starting", 503), ("failed", 503)])
+def test_readiness_reflects_this_process(monkeypatch, state, status):
+    monkeypatch.setitem(main._readiness, "state", state)
+    body, response_status, _ = main.predict_plant_disease(GetRequest("/ready"))
+    assert response_status == status
+    assert json.loads(body)["state"] == state
+
+
+def test_predictions_are_not_routed_by_path():
+    class PostRequest(GetRequest):
+        method = "POST"
+
+    with pytest.raises(pytest.fail.Exception, match="model loaded"):
+        main.predict_plant_disease(PostRequest("/ready"))
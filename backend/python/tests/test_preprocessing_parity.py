@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from benchmarks.load_test import synthetic_jpeg  # noqa: E402
+from benchmarks.tiny_model import build_tiny_tflite_model  # noqa: E402
+from interpreter_pool import PooledInterpreter  # noqa: E402
+from preprocessing import decode_and_resize_pil, decode_and_resize_tf  # noqa: E402
+
+SIZE = 224
+# Phone photos are several times the input size, so the reduced-resolution JPEG decode kicks in
+IMAGE_SIZES = [(224, 224), (640, 480), (1024, 768), (2048, 1536), (300, 900)]
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    path = build_tiny_tflite_model(str(tmp_path_factory.mktemp("model") / "tiny.tflite"), num_classes=10)
+    return PooledInterpreter(tf.lite.Interpreter(model_path=path))
+
+
+def test_fast_preprocessing_matches_the_tf_reference(model):
+    rng = np.random.default_rng(0)
+    agree = 0
+    max_probability_diff = 0.0
+    images = [synthetic_jpeg(rng, width, height) for width, height in IMAGE_SIZES for _ in range(4)]
+    for image_bytes in images:
+        reference = decode_and_resize_tf(image_bytes, SIZE)
+        candidate = decode_and_resize_pil(image_bytes, SIZE)
+        assert candidate.shape == reference.shape == (SIZE, SIZE, 3)
+        assert candidate.dtype == np.float32
+
+        probs = np.array(model.run(np.stack([reference, candidate])))
+        agree += int(np.argmax(probs[0]) == np.argmax(probs[1]))
+        max_probability_diff = max(max_probability_diff, float(np.max(np.abs(probs[0] - probs[1]))))
+
+    assert agree == len(images)
+    assert max_probability_diff < 0.005
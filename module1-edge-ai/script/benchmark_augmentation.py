@@ -0,0 +1,93 @@
+"""
+Augmentation throughput on CPU: the batched, in-graph BatchAugmenter (src.augmentation) against
+per-element maps over the same images.
+
+Pipelines (images/s over synthetic 0-255 float batches held in memory):
+    per_element_legacy    unbatch -> map(apply_data_augmentation) -> batch  (flip/contrast/brightness only)
+    per_element_full      unbatch -> map(BatchAugmenter on a batch of one) -> batch
+    batched               map(BatchAugmenter) on whole batches
+Also checks that two BatchAugmenter runs with the same seed produce identical batches.
+
+Usage (from module1-edge-ai):
+    python script/benchmark_augmentation.py --batch-size 64 --batches 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+
+from src.augmentation import BatchAugmenter  # noqa: E402
+from src.data_utils import apply_data_augmentation  # noqa: E402
+
+
+def _images_per_s(dataset, repeats):
+    for _ in dataset.take(2):  # Warm-up: tracing and thread pools
+        pass
+    best = 0.0
+    for _ in range(repeats):
+        images = 0
+        started_at = time.perf_counter()
+        for x, _ in dataset:
+            images += int(x.shape[0])
+        best = max(best, images / (time.perf_counter() - started_at))
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--img-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--batches", type=int, default=30)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    images = rng.integers(0, 256, size=(args.batches * args.batch_size, args.img_size, args.img_size, 3))
+    labels = rng.integers(0, 38, size=len(images))
+    source = tf.data.Dataset.from_tensor_slices((images.astype(np.float32), labels.astype(np.int32)))
+    batched_source = source.batch(args.batch_size).cache()
+    for _ in batched_source:  # Fill the cache so only augmentation is measured
+        pass
+    size = args.img_size
+
+    single_augmenter = BatchAugmenter(seed=args.seed)
+
+    def single(image, label):
+        augmented, _ = single_augmenter.augment(image[None], label, single_augmenter.next_seed())
+        return augmented[0], label
+
+    pipelines = {
+        "per_element_legacy": batched_source.unbatch()
+        .map(lambda x, y: apply_data_augmentation(x, y, size, size), num_parallel_calls=tf.data.AUTOTUNE)
+        .batch(args.batch_size),
+        "per_element_full": batched_source.unbatch()
+        .map(single, num_parallel_calls=tf.data.AUTOTUNE)
+        .batch(args.batch_size),
+        "batched": BatchAugmenter(seed=args.seed).apply_to(batched_source),
+    }
+    report = {"batch_size": args.batch_size, "img_size": size, "images_per_s": {}}
+    for name, dataset in pipelines.items():
+        report["images_per_s"][name] = round(_images_per_s(dataset.prefetch(tf.data.AUTOTUNE), args.repeats), 1)
+        print(f"{name}: {report['images_per_s'][name]} images/s")
+    report["speedup_vs_per_element_full"] = (
+        report["images_per_s"]["batched"] / report["images_per_s"]["per_element_full"]
+    )
+
+    first, second = (
+        next(iter(BatchAugmenter(seed=args.seed).apply_to(batched_source)))[0].numpy() for _ in range(2)
+    )
+    report["reproducible"] = bool(np.array_equal(first, second))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Microbenchmark of WeightedFocalLoss: the gather-based implementation (probabilities and
+from_logits) against the previous one-hot implementation, forward + gradient, for large batch
+sizes and class counts. Also reports the largest loss and gradient differences against the
+previous implementation (expected ~1e-7, float32 rounding).
+
+Usage (from module1-edge-ai):
+    python script/benchmark_focal_loss.py --batch-sizes 256,4096,16384 --classes 38,1000,10000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+
+from src.loss_functions import WeightedFocalLoss  # noqa: E402
+
+
+def legacy_focal_loss(y_true, y_pred, gamma, alpha):
+    """WeightedFocalLoss.call before the gather-based implementation."""
+    y_pred = tf.clip_by_value(y_pred, tf.keras.backend.epsilon(), 1 - tf.keras.backend.epsilon())
+    num_classes = tf.shape(y_pred)[-1]
+    y_true_one_hot = tf.one_hot(tf.cast(y_true, tf.int32), depth=num_classes)
+    ce_loss = -y_true_one_hot * tf.math.log(y_pred)
+    pt = tf.reduce_sum(y_true_one_hot * y_pred, axis=-1)
+    focal_term = tf.pow(1.0 - pt, gamma)
+    alpha_weight = tf.reduce_sum(y_true_one_hot * alpha, axis=-1)
+    return tf.reduce_mean(alpha_weight * focal_term * tf.reduce_sum(ce_loss, axis=-1))
+
+
+def _loss_and_gradient(loss_fn):
+    @tf.function
+    def run(y_true, logits):
+        with tf.GradientTape() as tape:
+            tape.watch(logits)
+            loss = loss_fn(y_true, logits)
+        return loss, tape.gradient(loss, logits)
+
+    return run
+
+
+def _time_ms(fn, args, repeats):
+    fn(*args)  # Trace
+    started_at = time.perf_counter()
+    for _ in range(repeats):
+        loss, grad = fn(*args)
+    grad.numpy()
+    return 1000.0 * (time.perf_counter() - started_at) / repeats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="256,4096,16384")
+    parser.add_argument("--classes", default="38,1000,10000")
+    parser.add_argument("--gamma", type=float, default=2.0)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for num_classes in (int(c) for c in args.classes.split(",")):
+        alpha = rng.uniform(0.5, 2.0, size=num_classes).astype(np.float32)
+        probs_loss = WeightedFocalLoss(gamma=args.gamma, alpha=alpha)
+        logits_loss = WeightedFocalLoss(gamma=args.gamma, alpha=alpha, from_logits=True)
+        alpha_tensor = tf.constant(alpha)
+        # All variants take logits, so the gradients are comparable (w.r.t. the same tensor)
+        variants = {
+            "legacy": _loss_and_gradient(
+                lambda y, z: legacy_focal_loss(y, tf.nn.softmax(z), args.gamma, alpha_tensor)
+            ),
+            "gather": _loss_and_gradient(lambda y, z: probs_loss.call(y, tf.nn.softmax(z))),
+            "gather_from_logits": _loss_and_gradient(lambda y, z: logits_loss.call(y, z)),
+        }
+        for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+            y_true = tf.constant(rng.integers(0, num_classes, size=batch_size), dtype=tf.int32)
+            logits = tf.constant(rng.normal(0, 2, size=(batch_size, num_classes)), dtype=tf.float32)
+            reference_loss, reference_grad = variants["legacy"](y_true, logits)
+            row = {"batch_size": batch_size, "classes": num_classes, "ms": {}, "max_abs_diff": {}}
+            for name, fn in variants.items():
+                row["ms"][name] = round(_time_ms(fn, (y_true, logits), args.repeats), 3)
+                loss, grad = fn(y_true, logits)
+                row["max_abs_diff"][name] = {
+                    "loss": float(abs(loss - reference_loss)),
+                    "gradient": float(tf.reduce_max(tf.abs(grad - reference_grad))),
+                }
+            print(f"B={batch_size:6d} C={num_classes:6d} " + "  ".join(f"{k}={v} ms" for k, v in row["ms"].items()))
+            results.append(row)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
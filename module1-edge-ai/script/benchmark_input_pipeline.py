@@ -0,0 +1,86 @@
+"""
+tf.data throughput benchmark: images per second of the directory loader (create_tf_dataset,
+decoding the image files every epoch) against the pre-decoded TFRecord shards (load_tfrecord_dataset).
+
+Both pipelines are iterated without a model, as training would consume them (shuffled, with
+preprocess_image applied); the shards are built from --data-dir first if --shard-dir has none.
+
+Usage (from module1-edge-ai):
+    python script/benchmark_input_pipeline.py \\
+        --data-dir data/PlantVillage_Subset/train --shard-dir data/PlantVillage_Subset_tfrecord/train
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+import tensorflow as tf  # noqa: E402
+
+from src.data_utils import create_tf_dataset, preprocess_image  # noqa: E402
+from src.models import IMG_SIZE  # noqa: E402
+from src.tfrecord_dataset import DATASET_INFO_FILE, load_tfrecord_dataset, write_tfrecord_shards  # noqa: E402
+
+
+def measure_throughput(dataset, epochs, max_batches=None):
+    """Iterates `dataset` for `epochs` epochs; returns images/s per epoch."""
+    results = []
+    for epoch in range(epochs):
+        images = 0
+        started_at = time.perf_counter()
+        for batch, (x, _) in enumerate(dataset):
+            images += int(x.shape[0])
+            if max_batches is not None and batch + 1 >= max_batches:
+                break
+        elapsed_s = time.perf_counter() - started_at
+        results.append({"epoch": epoch + 1, "images": images, "seconds": elapsed_s, "images_per_s": images / elapsed_s})
+        print(f"  epoch {epoch + 1}: {images} images in {elapsed_s:.2f} s ({images / elapsed_s:.1f} images/s)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", required=True, help="Directory with class subdirectories of images.")
+    parser.add_argument("--shard-dir", required=True, help="TFRecord shards of --data-dir (built if missing).")
+    parser.add_argument("--img-size", type=int, default=IMG_SIZE)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--max-batches", type=int, help="Stop each epoch after this many batches.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    img_size = (args.img_size, args.img_size)
+    if not os.path.exists(os.path.join(args.shard_dir, DATASET_INFO_FILE)):
+        print(f"Building TFRecord shards in {args.shard_dir}...")
+        write_tfrecord_shards(args.data_dir, args.shard_dir, img_size)
+
+    pipelines = {
+        "directory": create_tf_dataset(args.data_dir, img_size, args.batch_size, shuffle=True)
+        .map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+        .prefetch(tf.data.AUTOTUNE),
+        "tfrecord": load_tfrecord_dataset(args.shard_dir, args.batch_size, shuffle=True)
+        .map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE),
+    }
+    report = {"batch_size": args.batch_size, "img_size": args.img_size, "pipelines": {}}
+    for name, dataset in pipelines.items():
+        print(f"{name}:")
+        epochs = measure_throughput(dataset, args.epochs, args.max_batches)
+        report["pipelines"][name] = {
+            "epochs": epochs,
+            "best_images_per_s": max(epoch["images_per_s"] for epoch in epochs),
+        }
+    report["speedup"] = (report["pipelines"]["tfrecord"]["best_images_per_s"]
+                         / report["pipelines"]["directory"]["best_images_per_s"])
+    print(json.dumps({name: p["best_images_per_s"] for name, p in report["pipelines"].items()}, indent=2))
+    print(f"TFRecord speedup: {report['speedup']:.2f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Throughput and peak memory of the prepare_dataset caching modes.
+
+Modes:
+    legacy   the previous pipeline: augmentation, preprocessing, then an in-memory float32 cache
+             (augmentation frozen after epoch 1)
+    memory   uint8 in-memory cache of the decoded images, augmentation after the cache
+    disk     uint8 file-backed cache under --cache-dir, augmentation after the cache
+    none     no cache: decode every epoch
+
+Each mode runs in its own process, so the peak resident memory (ru_maxrss) is the mode's own.
+Without --data-dir, a synthetic dataset of --num-images images is used, each produced by
+resizing a random 512x512 image to stand in for JPEG decoding.
+
+Usage (from module1-edge-ai):
+    python script/benchmark_prepare_dataset.py --num-images 20000 --epochs 3
+    python script/benchmark_prepare_dataset.py --data-dir data/PlantVillage_Subset/train
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+MODES = ("legacy", "memory", "disk", "none")
+
+
+def _source_dataset(args, tf):
+    from src.data_utils import create_tf_dataset
+
+    img_size = (args.img_size, args.img_size)
+    if args.data_dir:
+        return create_tf_dataset(args.data_dir, img_size, args.batch_size, shuffle=False)
+
+    def synthetic(index):
+        image = tf.random.stateless_uniform([512, 512, 3], seed=tf.stack([index, 0]), maxval=256, dtype=tf.int32)
+        image = tf.image.resize(tf.cast(image, tf.float32), img_size, method="nearest")
+        return image, tf.cast(index % 38, tf.int32)
+
+    dataset = tf.data.Dataset.range(args.num_images).map(synthetic, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.batch(args.batch_size)
+
+
+def _legacy_prepare(dataset, img_height, img_width, tf):
+    """prepare_dataset before the cache was moved ahead of augmentation."""
+    from src.data_utils import apply_data_augmentation, preprocess_image
+
+    dataset = dataset.map(
+        lambda x, y: apply_data_augmentation(x, y, img_height, img_width), num_parallel_calls=tf.data.AUTOTUNE
+    )
+    dataset = dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.cache().prefetch(buffer_size=tf.data.AUTOTUNE)
+
+
+def run_mode(args):
+    """Runs one mode in this process; returns its measurements."""
+    import tensorflow as tf
+
+    from src.data_utils import prepare_dataset
+
+    source = _source_dataset(args, tf)
+    if args.mode == "legacy":
+        dataset = _legacy_prepare(source, args.img_size, args.img_size, tf)
+    else:
+        dataset = prepare_dataset(
+            source, args.img_size, args.img_size, augment=True,
+            cache=None if args.mode == "none" else args.mode,
+            cache_path=os.path.join(args.cache_dir, "prepare_dataset_cache") if args.mode == "disk" else None,
+        )
+
+    epochs = []
+    for epoch in range(args.epochs):
+        images = 0
+        started_at = time.perf_counter()
+        for x, _ in dataset:
+            images += int(x.shape[0])
+        elapsed_s = time.perf_counter() - started_at
+        epochs.append({"epoch": epoch + 1, "images_per_s": images / elapsed_s, "seconds": elapsed_s})
+    return {
+        "mode": args.mode,
+        "epochs": epochs,
+        "cached_epoch_images_per_s": max(e["images_per_s"] for e in epochs[1:]) if len(epochs) > 1 else None,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", help="Directory with class subdirectories (synthetic images if omitted).")
+    parser.add_argument("--num-images", type=int, default=10000, help="Synthetic dataset size.")
+    parser.add_argument("--img-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--cache-dir", help="Disk cache directory (a temporary one if omitted).")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)  # Set in the per-mode processes
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    if args.mode:
+        print(json.dumps(run_mode(args)))
+        return
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix="prepare_dataset_bench_")
+    child_args = [
+        "--num-images", str(args.num_images), "--img-size", str(args.img_size),
+        "--batch-size", str(args.batch_size), "--epochs", str(args.epochs),
+    ] + (["--data-dir", args.data_dir] if args.data_dir else [])
+    results = {}
+    try:
+        for mode in args.modes.split(","):
+            mode_cache = os.path.join(cache_dir, mode)
+            os.makedirs(mode_cache, exist_ok=True)
+            print(f"Running {mode}...")
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *child_args, "--mode", mode, "--cache-dir", mode_cache],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results[mode] = json.loads(out.strip().splitlines()[-1])
+            print(f"  cached-epoch throughput {results[mode]['cached_epoch_images_per_s']} images/s, "
+                  f"peak RSS {results[mode]['peak_rss_mb']:.0f} MB")
+    finally:
+        if not args.cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+One-time ingest of the PlantVillage class directories into sharded TFRecord files of images
+already resized to the model input size (see src.tfrecord_dataset), for the training input pipeline.
+
+Usage (from module1-edge-ai), once per split:
+    python script/build_tfrecord_shards.py \\
+        --data-dir data/PlantVillage_Subset/train --output-dir data/PlantVillage_Subset_tfrecord/train
+"""
+import argparse
+import os
+import sys
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+from src.models import IMG_SIZE  # noqa: E402
+from src.tfrecord_dataset import write_tfrecord_shards  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", required=True, help="Directory with class subdirectories of images.")
+    parser.add_argument("--output-dir", required=True, help="Directory of the shards and dataset_info.json.")
+    parser.add_argument("--img-size", type=int, default=IMG_SIZE, help="Stored image size (default: %(default)s).")
+    parser.add_argument("--images-per-shard", type=int, default=1024)
+    parser.add_argument("--compression", choices=("GZIP", "ZLIB"))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    info = write_tfrecord_shards(
+        args.data_dir, args.output_dir, (args.img_size, args.img_size),
+        images_per_shard=args.images_per_shard, seed=args.seed, compression=args.compression,
+    )
+    print(f"{info['num_examples']} images of {len(info['class_names'])} classes written to "
+          f"{len(info['shards'])} shards in {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,154 +1,319 @@
-import tensorflow as tf
-import numpy as np
+"""
+Converts the trained Keras model to TFLite variants and writes the model manifest used by the backend.
+
+Each variant (see src.quantization.QUANTIZATION_VARIANTS) is converted in its own worker process.
+A variant is skipped when its `.tflite` file was already produced from the same inputs: the model
+file's hash, the variant, the calibration images and settings, and the TensorFlow version are
+hashed into a conversion key that is stored in `<output-dir>/.conversion_cache.json`.
+
+The output directory ends up with:
+    <name>_<variant>.tflite         one file per variant
+    class_names.txt                 one class name per line, in model output order
+    <name>_manifest.json            model registry manifest (AGROAI_MODELS / AGROAI_MODEL_REGISTRY_URL)
+                                    with the checksum and size of every artifact
+    <name>_quantization_report.*    variant comparison, when --eval-data is given
+
+Usage (from module1-edge-ai):
+    python script/convert_to_tflite.py \\
+        --keras-model trained_models/fp32_mvp_best_final.h5 \\
+        --output-dir trained_models/tflite \\
+        --calibration-data data/PlantVillage_Subset/train \\
+        --eval-data data/PlantVillage_Subset/test \\
+        --base-url gs://<bucket>/ml_models
+
+In Colab, clone the repository, mount Google Drive and run the same command with `!python`,
+pointing the paths at the AgroAI_Project_Data directory in Drive.
+"""
+import argparse
+import json
+import multiprocessing
 import os
-import sys # For manipulating sys.path
-import shutil # For potential cleanup like deleting previous runs
-
-# --- IMPORTANT: CLONE YOUR REPO OR SYNC VIA DRIVE ---
-# This section ensures your project code (including src/ and scripts/) is accessible.
-# Option A: Clone the repo directly into Colab's ephemeral environment (recommended for active development)
-# Make sure to update the URL with your actual GitHub repo URL
-REPO_URL = "https://github.com/HasithaDilshan/agro-ai-copilot" # <--- CUSTOMIZE THIS TO YOUR ACTUAL REPO URL
-REPO_NAME = "agro-ai-copilot"
-
-# Check if the repository is already cloned to avoid re-cloning on subsequent runs
-if not os.path.exists(REPO_NAME):
-    print(f"Cloning repository: {REPO_URL}")
-    !git clone {REPO_URL}
-    %cd {REPO_NAME}
-    # If using private repo, Colab will ask for credentials or you can set up SSH keys.
-else:
-    print(f"Repository '{REPO_NAME}' already cloned. Pulling latest changes...")
-    %cd {REPO_NAME}
-    !git pull origin main # Assuming your development is on main for simplicity, adjust if on feature branch
-
-# --- Navigate to the specific module directory ---
-# This ensures that 'src/' and 'scripts/' are relative to the current working directory
-%cd module1-edge-ai
-
-# Add project root (module1-edge-ai) to Python path to import from src/
-project_root_in_colab = os.getcwd() # This will be /content/agro-ai-copilot/module1-edge-ai
-if project_root_in_colab not in sys.path:
-    sys.path.insert(0, project_root_in_colab) # Add to the beginning of sys.path
-
-# Install module-specific dependencies from requirements.txt
-print(f"Installing requirements from: {os.path.join(project_root_in_colab, 'requirements.txt')}")
-!pip install -r requirements.txt
-!pip install opencv-python-headless # Often useful for image processing (if not already in requirements)
-
-# --- IMPORTANT: MOUNT GOOGLE DRIVE ---
-# This is crucial for accessing your persistently stored data and saving models.
-from google.colab import drive
-drive.mount('/content/drive')
-
-# --- DEFINE GOOGLE DRIVE PROJECT DATA PATHS (MATCHING drive_setup_project_data_dirs.ipynb) ---
-# Ensure GOOGLE_DRIVE_PROJECT_ROOT matches the path you set in the setup notebook.
-GOOGLE_DRIVE_PROJECT_ROOT = '/content/drive/MyDrive/AgroAI_Project_Data' # <--- ENSURE THIS MATCHES YOUR SETUP!
-MODULE1_DRIVE_DATA_DIR = os.path.join(GOOGLE_DRIVE_PROJECT_ROOT, 'module1_edge_ai', 'data')
-MODULE1_DRIVE_MODELS_DIR = os.path.join(GOOGLE_DRIVE_PROJECT_ROOT, 'module1_edge_ai', 'trained_models')
-
-# Verify Drive paths exist (they should if setup notebook was run)
-if not os.path.exists(MODULE1_DRIVE_DATA_DIR):
-    raise FileNotFoundError(f"Module 1 data directory not found in Drive: {MODULE1_DRIVE_DATA_DIR}. Run setup notebook first.")
-if not os.path.exists(MODULE1_DRIVE_MODELS_DIR):
-    raise FileNotFoundError(f"Module 1 models directory not found in Drive: {MODULE1_DRIVE_MODELS_DIR}. Run setup notebook first.")
-
-print(f"Module 1 data will be accessed from: {MODULE1_DRIVE_DATA_DIR}")
-print(f"Module 1 models will be saved to: {MODULE1_DRIVE_MODELS_DIR}")
-
-# Import custom loss function needed for loading the model
-# This import will now work because module1-edge-ai (which contains src/) is in sys.path
-from src.loss_functions import WeightedFocalLoss
-
-print("Environment setup and imports complete.")
-print(f"TensorFlow version: {tf.__version__}")
-print(f"Num GPUs Available: {len(tf.config.list_physical_devices('GPU'))}")
-
-
-def convert_keras_to_tflite(keras_model_path, tflite_output_path, num_classes, representative_dataset_path=None):
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+# Make src/ importable when run as `python script/convert_to_tflite.py` (and in worker processes)
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+import tensorflow as tf  # noqa: E402
+
+from src.artifacts import (  # noqa: E402
+    SERVABLE_URL_SCHEMES, ConversionCache, atomic_write_bytes, build_manifest, conversion_key, directory_fingerprint,
+    file_sha256,
+)
+from src.data_utils import create_tf_dataset, get_class_names, preprocess_image  # noqa: E402
+from src.loss_functions import WeightedFocalLoss  # noqa: E402
+from src.models import probability_model  # noqa: E402
+from src.quantization import QUANTIZATION_VARIANTS, convert_variant, representative_dataset  # noqa: E402
+from src.tflite_evaluation import evaluate_tflite_model, write_comparison_report  # noqa: E402
+
+
+def load_keras_model(keras_model_path):
+    """
+    Loads the trained Keras model, providing custom_objects for the WeightedFocalLoss.
+    A model saved with a logits output gets its softmax back, so every variant outputs probabilities.
+    """
+    print(f"Loading Keras model from: {keras_model_path}")
+    model = tf.keras.models.load_model(
+        keras_model_path,
+        custom_objects={'WeightedFocalLoss': WeightedFocalLoss}
+    )
+    print("Keras model loaded successfully.")
+    return probability_model(model)
+
+
+def convert_keras_to_tflite(keras_model_path, tflite_output_path, num_classes=None, representative_dataset_path=None,
+                            num_calibration_samples=300, variant=None):
     """
     Converts a Keras FP32 model to TensorFlow Lite (TFLite).
 
     Args:
         keras_model_path (str): Path to the saved Keras .h5 model file.
         tflite_output_path (str): Path to save the converted .tflite model.
-        num_classes (int): Number of classes your model predicts.
-        representative_dataset_path (str, optional): Path to a directory
-                                                    containing representative images for full integer quantization.
-                                                    If None, dynamic range quantization is applied.
+        num_classes (int, optional): Number of classes your model predicts; checked against the model output.
+        representative_dataset_path (str, optional): Path to a directory (class subdirectories, e.g. the
+                                                    train split) whose images calibrate full integer quantization.
+        num_calibration_samples (int): Number of real images streamed for calibration.
+        variant (str, optional): Variant to produce (see src.quantization.QUANTIZATION_VARIANTS). Defaults to
+                                 "int8" when a representative dataset is given, "dynamic" otherwise.
+
+    Returns:
+        str: `tflite_output_path`.
     """
-    print(f"Loading Keras model from: {keras_model_path}")
     try:
-        # Load the Keras model, providing custom_objects for the WeightedFocalLoss
-        model = tf.keras.models.load_model(
-            keras_model_path,
-            custom_objects={'WeightedFocalLoss': WeightedFocalLoss}
-        )
+        model = load_keras_model(keras_model_path)
     except Exception as e:
         print(f"Error loading Keras model: {e}")
         print("Ensure WeightedFocalLoss class is correctly defined and imported, and model path is correct.")
-        return
+        raise
+    if num_classes is not None and model.output_shape[-1] != num_classes:
+        raise ValueError(f"Model predicts {model.output_shape[-1]} classes, expected {num_classes}")
 
-    print("Keras model loaded successfully.")
+    if variant is None:
+        variant = "int8" if representative_dataset_path else "dynamic"
+    representative_data = None
+    if variant == "int8":
+        if not representative_dataset_path:
+            raise ValueError("The int8 variant needs --calibration-data")
+        print(f"Calibrating full integer quantization (INT8) on {num_calibration_samples} images "
+              f"from {representative_dataset_path}...")
+        representative_data = representative_dataset(
+            representative_dataset_path, tuple(model.input_shape[1:3]), num_calibration_samples
+        )
+    tflite_model = convert_variant(model, variant, representative_data)
+
+    os.makedirs(os.path.dirname(tflite_output_path) or ".", exist_ok=True)
+    atomic_write_bytes(tflite_output_path, tflite_model)
+    print(f"{variant} TFLite model saved to: {tflite_output_path} ({len(tflite_model) / 1e6:.2f} MB)")
+    return tflite_output_path
+
+
+def _convert_job(job):
+    """Worker process entry point: one variant conversion."""
+    return convert_keras_to_tflite(
+        job["keras_model_path"], job["output_path"], job["num_classes"],
+        representative_dataset_path=job["calibration_data_dir"],
+        num_calibration_samples=job["num_calibration_samples"],
+        variant=job["variant"],
+    )
+
+
+def convert_variants_parallel(keras_model_path, output_dir, variants=QUANTIZATION_VARIANTS, calibration_data_dir=None,
+                              num_calibration_samples=300, num_classes=None, workers=None, force=False,
+                              name="mvp_model"):
+    """
+    Converts a Keras model to several TFLite variants, one worker process per conversion,
+    skipping variants whose output was already produced from the same inputs.
+
+    Args:
+        keras_model_path (str): Path to the saved Keras .h5 model file.
+        output_dir (str): Directory the `<name>_<variant>.tflite` files are written to.
+        variants (sequence): Variants to produce.
+        calibration_data_dir (str, optional): Calibration images, required for "int8".
+        num_calibration_samples (int): Number of calibration images.
+        num_classes (int, optional): Expected number of model outputs.
+        workers (int, optional): Worker processes; defaults to one per variant (capped by the CPU count).
+        force (bool): Convert even when the conversion key is unchanged.
+        name (str): File name prefix of the variants.
+
+    Returns:
+        dict: Variant name -> {"path", "sha256", "size_bytes", "key", "converted"}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cache = ConversionCache(output_dir)
+    model_sha256 = file_sha256(keras_model_path)
+    calibration_fingerprint = directory_fingerprint(calibration_data_dir) if calibration_data_dir else None
+
+    keys, jobs = {}, []
+    for variant in variants:
+        output_path = os.path.join(output_dir, f"{name}_{variant}.tflite")
+        uses_calibration = variant == "int8"
+        keys[variant] = conversion_key(
+            model_sha256=model_sha256,
+            variant=variant,
+            calibration=calibration_fingerprint if uses_calibration else None,
+            num_calibration_samples=num_calibration_samples if uses_calibration else None,
+            tensorflow=tf.__version__,
+        )
+        if not force and cache.lookup(output_path, keys[variant]):
+            print(f"{variant}: inputs unchanged, keeping {output_path}")
+            continue
+        jobs.append({
+            "keras_model_path": keras_model_path,
+            "output_path": output_path,
+            "num_classes": num_classes,
+            "calibration_data_dir": calibration_data_dir,
+            "num_calibration_samples": num_calibration_samples,
+            "variant": variant,
+        })
+
+    converted = set()
+    if jobs:
+        workers = workers or min(len(jobs), os.cpu_count() or 1)
+        print(f"Converting {', '.join(job['variant'] for job in jobs)} with {workers} worker process(es)...")
+        # spawn: TensorFlow's runtime threads do not survive fork
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                for job, _ in zip(jobs, executor.map(_convert_job, jobs)):
+                    cache.record(job["output_path"], keys[job["variant"]])
+                    converted.add(job["variant"])
+        finally:
+            cache.save()  # Keep the conversions that finished if another one failed
+
+    artifacts = {}
+    for variant in variants:
+        output_path = os.path.join(output_dir, f"{name}_{variant}.tflite")
+        entry = cache.entries[os.path.basename(output_path)]
+        artifacts[variant] = {
+            "path": output_path,
+            "sha256": entry["sha256"],
+            "size_bytes": entry["size_bytes"],
+            "key": entry["key"],
+            "converted": variant in converted,
+        }
+    return artifacts
+
+
+def _tflite_input_size(model_path):
+    """Input (height, width) of a TFLite model."""
+    interpreter = tf.lite.Interpreter(model_path=model_path)
+    return tuple(int(d) for d in interpreter.get_input_details()[0]["shape"][1:3])
+
+
+def evaluate_variants(artifacts, eval_data_dir, output_dir, accuracy_budget=0.01, max_eval_images=None,
+                      num_threads=None, name="mvp_model"):
+    """
+    Compares the converted variants on a held-out split (sequentially, so latencies are not skewed).
+
+    Returns:
+        dict: The comparison report (see src.tflite_evaluation.write_comparison_report).
+    """
+    img_size = _tflite_input_size(next(iter(artifacts.values()))["path"])
+    eval_ds = create_tf_dataset(eval_data_dir, img_size, batch_size=32, shuffle=False).map(preprocess_image)
+    results = {}
+    for variant, artifact in artifacts.items():
+        print(f"Evaluating {variant} variant on {eval_data_dir}...")
+        results[variant] = evaluate_tflite_model(
+            artifact["path"], eval_ds, num_threads=num_threads, max_images=max_eval_images
+        )
+    return write_comparison_report(results, output_dir, accuracy_budget, name=f"{name}_quantization_report")
+
+
+def write_class_names(output_dir, class_names_path=None, data_dir=None):
+    """Copies (or derives from the data directory's class subdirectories) `<output_dir>/class_names.txt`."""
+    path = os.path.join(output_dir, "class_names.txt")
+    if class_names_path:
+        if os.path.abspath(class_names_path) != os.path.abspath(path):
+            shutil.copyfile(class_names_path, path)
+    elif data_dir:
+        atomic_write_bytes(path, ("\n".join(get_class_names(data_dir)) + "\n").encode())
+    elif not os.path.exists(path):
+        raise ValueError("Pass --class-names, or --calibration-data/--eval-data to derive them")
+    with open(path) as f:
+        return path, [line.strip() for line in f if line.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keras-model", required=True, help="Trained Keras .h5 model.")
+    parser.add_argument("--output-dir", required=True, help="Directory of the variants, class names and manifest.")
+    parser.add_argument("--variants", default=",".join(QUANTIZATION_VARIANTS),
+                        help="Comma-separated variants to produce (default: %(default)s).")
+    parser.add_argument("--calibration-data", help="Class subdirectories of calibration images (needed for int8).")
+    parser.add_argument("--num-calibration-samples", type=int, default=300)
+    parser.add_argument("--class-names", help="Class names file (one per line); derived from the data if omitted.")
+    parser.add_argument("--eval-data", help="Held-out class subdirectories to compare the variants on.")
+    parser.add_argument("--accuracy-budget", type=float, default=0.01,
+                        help="Largest accepted accuracy drop against fp32 when selecting the default variant.")
+    parser.add_argument("--max-eval-images", type=int)
+    parser.add_argument("--num-threads", type=int, help="Interpreter threads for the latency measurements.")
+    parser.add_argument("--default-variant", help="Default variant of the manifest (default: the selected one, "
+                                                  "or the first variant without --eval-data).")
+    parser.add_argument("--base-url", required=True,
+                        help="Where the artifacts will be uploaded (gs:// or http(s), e.g. gs://<bucket>/ml_models); "
+                             "the manifest's model URLs point there.")
+    parser.add_argument("--name", default="mvp_model", help="File name prefix (default: %(default)s).")
+    parser.add_argument("--workers", type=int, help="Conversion worker processes (default: one per variant).")
+    parser.add_argument("--force", action="store_true", help="Convert even if the inputs are unchanged.")
+    args = parser.parse_args(argv)
+    args.variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    unknown = set(args.variants) - set(QUANTIZATION_VARIANTS)
+    if unknown:
+        parser.error(f"Unknown variants {sorted(unknown)}, expected some of {QUANTIZATION_VARIANTS}")
+    if "int8" in args.variants and not args.calibration_data:
+        parser.error("The int8 variant needs --calibration-data")
+    if not args.base_url.startswith(SERVABLE_URL_SCHEMES):
+        # Checked before converting: the serving side cannot load models from local paths
+        parser.error(f"--base-url must start with one of {', '.join(SERVABLE_URL_SCHEMES)}")
+    if args.default_variant and args.default_variant not in args.variants:
+        parser.error(f"--default-variant {args.default_variant} is not one of the converted variants")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    class_names_path, class_names = write_class_names(
+        args.output_dir, args.class_names, args.calibration_data or args.eval_data
+    )
+
+    artifacts = convert_variants_parallel(
+        args.keras_model, args.output_dir, args.variants,
+        calibration_data_dir=args.calibration_data,
+        num_calibration_samples=args.num_calibration_samples,
+        num_classes=len(class_names),
+        workers=args.workers,
+        force=args.force,
+        name=args.name,
+    )
+
+    default = args.default_variant
+    extra = {
+        "source_model_sha256": file_sha256(args.keras_model),
+        "tensorflow_version": tf.__version__,
+    }
+    if args.eval_data:
+        report = evaluate_variants(
+            artifacts, args.eval_data, args.output_dir, args.accuracy_budget,
+            max_eval_images=args.max_eval_images, num_threads=args.num_threads, name=args.name,
+        )
+        default = default or report["selected"]
+        extra["evaluation"] = {
+            variant: {"accuracy": r["accuracy"], "latency_single_p50_ms": r["latency_single_ms"]["p50"]}
+            for variant, r in report["variants"].items()
+        }
+
+    manifest = build_manifest(artifacts, class_names_path, base_url=args.base_url, default=default, extra=extra)
+    manifest_path = os.path.join(args.output_dir, f"{args.name}_manifest.json")
+    atomic_write_bytes(manifest_path, json.dumps(manifest, indent=2).encode())
+
+    for variant, artifact in artifacts.items():
+        status = "converted" if artifact["converted"] else "unchanged"
+        print(f"{variant:8s} {status:9s} {artifact['size_bytes'] / 1e6:7.2f} MB  sha256 {artifact['sha256'][:12]}")
+    print(f"Manifest (default variant: {manifest['default']}) written to: {manifest_path}")
 
-    converter = tf.lite.TFLiteConverter.from_keras_model(model)
-
-    converter.optimizations = [tf.lite.Optimize.DEFAULT]
-
-    if representative_dataset_path:
-        print("Representative dataset path provided. Attempting full integer quantization...")
-        def representative_dataset_gen():
-            # For this to work, ensure representative_dataset_path is a directory
-            # and contains images. You might use data_utils.create_tf_dataset
-            # to load these images into a TF dataset.
-            # Example (assuming create_tf_dataset and preprocess_image are available)
-            # from src.data_utils import create_tf_dataset, preprocess_image
-            # dataset_raw = create_tf_dataset(representative_dataset_path, (224, 224), 1, shuffle=False)
-            # for images, _ in dataset_raw.map(preprocess_image).take(100): # Take a few batches
-            #     yield [images] # Yield a list of inputs
-            # For MVP, a dummy generator if you don't have representative_dataset setup yet:
-            for _ in range(100):
-                yield [np.random.uniform(0, 255, size=(1, 224, 224, 3)).astype(np.float32)] # Dummy data for calibration
-
-        converter.representative_dataset = representative_dataset_gen
-        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
-        converter.inference_input_type = tf.int8
-        converter.inference_output_type = tf.int8
-        print("Configured for full integer quantization (INT8).")
-    else:
-        print("No representative dataset path provided. Applying dynamic range quantization.")
-
-    tflite_model = converter.convert()
-
-    os.makedirs(os.path.dirname(tflite_output_path), exist_ok=True)
-    with open(tflite_output_path, 'wb') as f:
-        f.write(tflite_model)
-
-    print(f"TFLite model saved to: {tflite_output_path}")
 
 if __name__ == "__main__":
-    # Ensure the current directory is module1-edge-ai
-    if os.path.basename(os.getcwd()) != 'module1-edge-ai':
-        # This block ensures if the script is run standalone, it navigates correctly
-        # However, the top-level setup block handles this when run in notebook cells.
-        print("Script not run from module1-edge-ai directory. Adjusting path...")
-        current_script_path = os.path.abspath(__file__)
-        module_root = os.path.dirname(current_script_path)
-        sys.path.insert(0, module_root)
-        os.chdir(module_root)
-
-    # Paths for model and class names, now correctly referencing Google Drive
-    keras_model_path = os.path.join(MODULE1_DRIVE_MODELS_DIR, 'fp32_mvp_best_final.h5') # This path comes from training notebook
-    tflite_output_path = os.path.join(MODULE1_DRIVE_MODELS_DIR, 'fp32_mvp_model.tflite')
-
-    # Get number of classes from the saved class_names.txt in Google Drive
-    class_names_path = os.path.join(MODULE1_DRIVE_DATA_DIR, 'class_names.txt')
-    if os.path.exists(class_names_path):
-        with open(class_names_path, 'r') as f:
-            num_classes = len(f.readlines())
-    else:
-        print(f"Warning: {class_names_path} not found in Google Drive. Assuming 38 classes for PlantVillage MVP.")
-        num_classes = 38 # Default for PlantVillage
-
-    convert_keras_to_tflite(keras_model_path, tflite_output_path, num_classes)
-    print("TFLite conversion script finished.")
\ No newline at end of file
+    main()
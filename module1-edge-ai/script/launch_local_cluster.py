@@ -0,0 +1,144 @@
+"""
+Runs script/train_distributed.py as a local multi-worker cluster (one process per worker, each
+with its own TF_CONFIG on localhost ports) and reports scaling efficiency.
+
+For each worker count in --workers, a cluster is started, its per-worker step-time metrics are
+collected, and the global throughput is compared with the single-worker run:
+    efficiency(N) = throughput(N) / (N x throughput(1))
+The per-worker batch size is fixed (weak scaling) and the cores are split evenly between the
+workers (--threads-per-worker), so the numbers reflect the multi-process overhead on one host.
+
+Everything after `--` is passed to train_distributed.py (except --model-dir: every cluster gets a
+fresh directory under --run-dir, so it never resumes from, or reports, an earlier run).
+
+Usage (from module1-edge-ai):
+    python script/launch_local_cluster.py --workers 1,2,4 --run-dir runs/scaling -- \\
+        --synthetic-images 2048 --epochs 2 --steps-per-epoch 20
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_distributed.py")
+
+
+def _free_ports(count):
+    sockets = []
+    try:
+        for _ in range(count):
+            s = socket.socket()
+            s.bind(("localhost", 0))
+            sockets.append(s)
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+
+def run_cluster(num_workers, run_dir, train_args, threads_per_worker=None, timeout_s=None):
+    """
+    Starts `num_workers` worker processes and waits for them.
+
+    Returns:
+        tuple: (model directory of this run, the workers' metrics (metrics/worker_<index>.json)
+            by worker index).
+    """
+    ports = _free_ports(num_workers)
+    cluster = {"worker": [f"localhost:{port}" for port in ports]}
+    os.makedirs(run_dir, exist_ok=True)
+    model_dir = tempfile.mkdtemp(prefix=f"workers_{num_workers}_{time.strftime('%Y%m%d-%H%M%S')}_", dir=run_dir)
+    started_at = time.time()
+    args = [sys.executable, TRAIN_SCRIPT, *train_args, "--model-dir", model_dir]
+    if threads_per_worker:
+        args += ["--threads", str(threads_per_worker)]
+
+    processes = []
+    for index in range(num_workers):
+        env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}))
+        log = open(os.path.join(model_dir, f"worker_{index}.log"), "w")
+        processes.append((subprocess.Popen(args, env=env, stdout=log, stderr=subprocess.STDOUT), log))
+
+    deadline = None if timeout_s is None else time.monotonic() + timeout_s
+    try:
+        for index, (process, _) in enumerate(processes):
+            process.wait(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if process.returncode != 0:
+                raise RuntimeError(
+                    f"Worker {index} of {num_workers} exited with {process.returncode}; "
+                    f"see {os.path.join(model_dir, f'worker_{index}.log')}"
+                )
+    finally:
+        for process, log in processes:
+            if process.poll() is None:  # A failed or timed-out worker leaves the others blocked in collectives
+                process.kill()
+                process.wait()
+            log.close()
+
+    metrics = []
+    for index in range(num_workers):
+        path = os.path.join(model_dir, "metrics", f"worker_{index}.json")
+        if not os.path.exists(path) or os.path.getmtime(path) < started_at:
+            raise RuntimeError(f"Worker {index} of {num_workers} wrote no metrics for this run ({path})")
+        with open(path) as f:
+            worker_metrics = json.load(f)
+        if not worker_metrics["steps"] or worker_metrics["step_time_ms"] is None:
+            raise RuntimeError(f"Worker {index} of {num_workers} ran no training steps ({path})")
+        metrics.append(worker_metrics)
+    return model_dir, metrics
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    train_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, train_args = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2", help="Comma-separated worker counts to run (default: %(default)s).")
+    parser.add_argument("--run-dir", default="runs/local_cluster", help="Model directories and the scaling report.")
+    parser.add_argument("--threads-per-worker", type=int,
+                        help="Intra-op threads per worker (default: CPU count / workers).")
+    parser.add_argument("--timeout-s", type=float, help="Kill a cluster that runs longer than this.")
+    args = parser.parse_args(argv)
+
+    cpu_count = os.cpu_count() or 1
+    report = {"cpu_count": cpu_count, "train_args": train_args, "runs": {}}
+    for num_workers in (int(n) for n in args.workers.split(",")):
+        threads = args.threads_per_worker or max(1, cpu_count // num_workers)
+        print(f"Running {num_workers} worker(s) with {threads} thread(s) each...")
+        model_dir, metrics = run_cluster(num_workers, args.run_dir, train_args, threads, args.timeout_s)
+        # Steps are synchronous: the cluster runs at the pace of its slowest worker
+        slowest_ms = max(m["step_time_ms"]["mean"] for m in metrics)
+        report["runs"][num_workers] = {
+            "model_dir": model_dir,
+            "threads_per_worker": threads,
+            "global_batch_size": metrics[0]["global_batch_size"],
+            "step_time_ms": slowest_ms,
+            "images_per_s": metrics[0]["global_batch_size"] / (slowest_ms / 1000.0),
+            "workers": metrics,
+        }
+
+    baseline = report["runs"].get(1)
+    print(f"{'workers':>7} {'step ms':>9} {'images/s':>9} {'speedup':>8} {'efficiency':>10}")
+    for num_workers, run in report["runs"].items():
+        if baseline:
+            run["speedup"] = run["images_per_s"] / baseline["images_per_s"]
+            run["scaling_efficiency"] = run["speedup"] / num_workers
+        print(f"{num_workers:>7} {run['step_time_ms']:>9.1f} {run['images_per_s']:>9.1f} "
+              f"{run.get('speedup', float('nan')):>8.2f} {run.get('scaling_efficiency', float('nan')):>10.2f}")
+
+    os.makedirs(args.run_dir, exist_ok=True)
+    report_path = os.path.join(args.run_dir, "scaling_report.json")
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Scaling report written to: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Multi-worker CPU training of the FP32 baseline with tf.distribute.MultiWorkerMirroredStrategy.
+
+Without TF_CONFIG it trains in one process; with TF_CONFIG (set per process by
+script/launch_local_cluster.py, or by the cluster scheduler) every worker runs this same
+script and gradients are all-reduced between them each step. Each worker reads a disjoint
+shard of the input, selected at the start of the pipeline (file paths or TFRecord shards),
+so no worker decodes images it then discards.
+
+Training runs a custom loop over strategy.run rather than model.fit, which cannot drive
+MultiWorkerMirroredStrategy across workers under Keras 3. It resumes from the last completed epoch
+after an interruption (tf.train.Checkpoint in <model-dir>/backup); the chief keeps per-epoch
+weights in <model-dir>/checkpoints and saves the final model to <model-dir>/final_model.h5 (with a
+softmax output, also when trained on logits).
+Every worker writes its step-time metrics to <model-dir>/metrics/worker_<index>.json.
+
+Usage (from module1-edge-ai):
+    python script/train_distributed.py --train-dir data/PlantVillage_Subset/train --model-dir runs/fp32
+    python script/launch_local_cluster.py --workers 1,2,4 -- --synthetic-images 2048 --epochs 2
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+import numpy as np  # noqa: E402
+import tensorflow as tf  # noqa: E402
+
+from src.data_utils import augment_batch, preprocess_image  # noqa: E402
+from src.feature_cache import inverse_frequency_alpha  # noqa: E402
+from src.loss_functions import WeightedFocalLoss  # noqa: E402
+from src.models import IMG_SIZE, build_fp32_efficientnet_model, probability_model  # noqa: E402
+from src.tfrecord_dataset import (  # noqa: E402
+    decode_and_resize, list_image_files, load_tfrecord_dataset, read_class_counts, read_dataset_info,
+)
+
+
+def _task():
+    """(task type, task index, number of workers) from TF_CONFIG; a single worker without it."""
+    tf_config = json.loads(os.environ.get("TF_CONFIG", "{}"))
+    task = tf_config.get("task", {})
+    num_workers = len(tf_config.get("cluster", {}).get("worker", [])) or 1
+    return task.get("type", "worker"), int(task.get("index", 0)), num_workers
+
+
+def _is_chief(task_type, task_id):
+    return task_type == "chief" or (task_type == "worker" and task_id == 0)
+
+
+def _write_dir(path, task_type, task_id):
+    """Non-chief workers take part in saving (collective ops) but write to a throwaway directory."""
+    if _is_chief(task_type, task_id):
+        return path
+    return os.path.join(os.path.dirname(path), f".worker_{task_id}_tmp", os.path.basename(path))
+
+
+def _make_dataset_fn(args, global_batch_size, num_classes):
+    """dataset_fn for strategy.distribute_datasets_from_function: builds one worker's shard of the training input."""
+    img_size = (IMG_SIZE, IMG_SIZE)
+
+    def dataset_fn(input_context):
+        batch_size = input_context.get_per_replica_batch_size(global_batch_size)
+        num_pipelines, pipeline_id = input_context.num_input_pipelines, input_context.input_pipeline_id
+        if args.train_shards:
+            dataset = load_tfrecord_dataset(
+                args.train_shards, batch_size, shuffle=True, seed=args.seed,
+                num_input_pipelines=num_pipelines, input_pipeline_id=pipeline_id, drop_remainder=True,
+            ).repeat()
+        else:
+            if args.synthetic_images:
+                dataset = tf.data.Dataset.range(args.synthetic_images).shard(num_pipelines, pipeline_id).map(
+                    lambda i: (
+                        tf.random.stateless_uniform([*img_size, 3], seed=tf.stack([i, 0]), maxval=255.0),
+                        tf.cast(i % num_classes, tf.int32),
+                    ),
+                    num_parallel_calls=tf.data.AUTOTUNE,
+                )
+            else:
+                paths, labels, _ = list_image_files(args.train_dir)
+                dataset = tf.data.Dataset.from_tensor_slices((paths, labels)).shard(num_pipelines, pipeline_id)
+                dataset = dataset.shuffle(len(paths) // num_pipelines + 1, seed=args.seed)
+                dataset = dataset.map(
+                    lambda path, label: decode_and_resize(path, label, img_size), num_parallel_calls=tf.data.AUTOTUNE
+                )
+            dataset = dataset.repeat().batch(batch_size, drop_remainder=True)
+            dataset = dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
+        if args.augment:
+            dataset = dataset.map(augment_batch, num_parallel_calls=tf.data.AUTOTUNE)
+        # Sharding is done above; stop tf.distribute from sharding the result again
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+        return dataset.with_options(options).prefetch(tf.data.AUTOTUNE)
+
+    return dataset_fn
+
+
+def _make_train_step(strategy, model, loss_fn, optimizer):
+    """
+    Returns train_step(iterator): one synchronous step on every replica, returning the global
+    mean loss and the number of correct predictions of the global batch.
+    """
+    def replica_step(images, labels):
+        with tf.GradientTape() as tape:
+            predictions = model(images, training=True)
+            # Mean over this replica's batch (all equal, see drop_remainder); the optimizer sums
+            # the replicas' gradients, so dividing by their number gives the global mean
+            loss = loss_fn.call(labels, predictions) / strategy.num_replicas_in_sync
+        gradients = tape.gradient(loss, model.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+        predicted = tf.argmax(predictions, axis=-1, output_type=tf.int32)
+        correct = tf.reduce_sum(tf.cast(tf.equal(predicted, labels), tf.float32))
+        return loss, correct
+
+    @tf.function
+    def train_step(iterator):
+        loss, correct = strategy.run(replica_step, args=next(iterator))
+        return (strategy.reduce(tf.distribute.ReduceOp.SUM, loss, axis=None),
+                strategy.reduce(tf.distribute.ReduceOp.SUM, correct, axis=None))
+
+    return train_step
+
+
+class StepTimeMetrics:
+    """Records this worker's step times and writes a summary to <metrics_dir>/worker_<index>.json."""
+
+    def __init__(self, metrics_path, global_batch_size, num_workers, task, warmup_steps=5):
+        self.metrics_path = metrics_path
+        self.global_batch_size = global_batch_size
+        self.num_workers = num_workers
+        self.task = task
+        self.warmup_steps = warmup_steps
+        self.step_times = []
+
+    def record(self, seconds):
+        self.step_times.append(seconds)
+
+    def write(self):
+        """
+        Writes the summary, also when no step ran (e.g. resuming an already finished run): then
+        "steps" is 0 and the timings are null, so a reader never picks up an older file instead.
+        """
+        measured = self.step_times[self.warmup_steps:] or self.step_times
+        summary = {
+            "task_type": self.task[0],
+            "task_index": self.task[1],
+            "num_workers": self.num_workers,
+            "global_batch_size": self.global_batch_size,
+            "steps": len(self.step_times),
+            "step_time_ms": None,
+            "worker_images_per_s": None,
+            "global_images_per_s": None,
+        }
+        if measured:
+            mean_s = float(np.mean(measured))
+            summary.update({
+                "step_time_ms": {
+                    "mean": 1000.0 * mean_s,
+                    "p50": 1000.0 * float(np.percentile(measured, 50)),
+                    "p95": 1000.0 * float(np.percentile(measured, 95)),
+                },
+                "worker_images_per_s": self.global_batch_size / self.num_workers / mean_s,
+                "global_images_per_s": self.global_batch_size / mean_s,
+            })
+        os.makedirs(os.path.dirname(self.metrics_path), exist_ok=True)
+        with open(self.metrics_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        if measured:
+            print(f"Worker {self.task[1]}: {summary['step_time_ms']['mean']:.1f} ms/step, "
+                  f"{summary['global_images_per_s']:.1f} images/s (all workers)")
+        else:
+            print(f"Worker {self.task[1]}: no training steps ran")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--train-dir", help="Directory with class subdirectories of images.")
+    source.add_argument("--train-shards", help="TFRecord shards (script/build_tfrecord_shards.py).")
+    source.add_argument("--synthetic-images", type=int, help="Random images, for scaling tests without data.")
+    parser.add_argument("--num-classes", type=int, default=38, help="Classes of --synthetic-images.")
+    parser.add_argument("--model-dir", required=True, help="Checkpoints, backup, metrics and the final model.")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--per-worker-batch-size", type=int, default=32)
+    parser.add_argument("--steps-per-epoch", type=int, help="Default: one pass over the training images.")
+    parser.add_argument("--learning-rate", type=float, default=5e-4)
+    parser.add_argument("--gamma", type=float, default=2.0, help="WeightedFocalLoss focusing parameter.")
+    parser.add_argument("--logits", action=argparse.BooleanOptionalAction, default=True,
+                        help="Train on logits with WeightedFocalLoss(from_logits=True); the final model "
+                             "still outputs probabilities (default: %(default)s).")
+    parser.add_argument("--augment", action="store_true")
+    parser.add_argument("--random-init", action="store_true",
+                        help="Randomly initialized backbone instead of ImageNet weights (scaling tests "
+                             "without network access; the step time is the same).")
+    parser.add_argument("--threads", type=int, help="Intra-op threads of this worker (share the cores).")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.threads:
+        tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, args.threads // 2))
+
+    task_type, task_id, num_workers = _task()
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING
+        )
+    )
+    global_batch_size = args.per_worker_batch_size * strategy.num_replicas_in_sync
+
+    alpha = None
+    if args.synthetic_images:
+        num_examples, num_classes = args.synthetic_images, args.num_classes
+    elif args.train_shards:
+        info = read_dataset_info(args.train_shards)
+        num_examples, num_classes = info["num_examples"], len(info["class_names"])
+        counts = read_class_counts(args.train_shards)
+        alpha = inverse_frequency_alpha(np.repeat(np.arange(num_classes), counts), num_classes)
+    else:
+        _, labels, class_names = list_image_files(args.train_dir)
+        num_examples, num_classes = len(labels), len(class_names)
+        alpha = inverse_frequency_alpha(np.asarray(labels), num_classes)
+    steps_per_epoch = args.steps_per_epoch or max(1, num_examples // global_batch_size)
+
+    loss_fn = WeightedFocalLoss(gamma=args.gamma, alpha=alpha, from_logits=args.logits)
+    with strategy.scope():
+        model = build_fp32_efficientnet_model(num_classes, weights=None if args.random_init else "imagenet",
+                                              logits=args.logits)
+        optimizer = tf.keras.optimizers.Adam(learning_rate=args.learning_rate)
+        # Compiled only so that the saved model records its loss, as with the other training scripts
+        model.compile(optimizer=optimizer, loss=loss_fn, metrics=["accuracy"])
+        epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+    train_step = _make_train_step(strategy, model, loss_fn, optimizer)
+    iterator = iter(strategy.distribute_datasets_from_function(_make_dataset_fn(args, global_batch_size, num_classes)))
+
+    # Every worker saves (the save is collective); only the chief's copy is kept
+    backup = tf.train.Checkpoint(model=model, optimizer=optimizer, epoch=epoch)
+    backup_dir = os.path.join(args.model_dir, "backup")
+    backup_manager = tf.train.CheckpointManager(backup, _write_dir(backup_dir, task_type, task_id), max_to_keep=1)
+    latest = tf.train.latest_checkpoint(backup_dir)
+    if latest:
+        backup.restore(latest)
+        print(f"Resuming after epoch {int(epoch.numpy())} from {latest}")
+
+    checkpoint_dir = _write_dir(os.path.join(args.model_dir, "checkpoints"), task_type, task_id)
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    step_metrics = StepTimeMetrics(
+        os.path.join(args.model_dir, "metrics", f"worker_{task_id}.json"),
+        global_batch_size, num_workers, (task_type, task_id),
+    )
+    print(f"Worker {task_id}/{num_workers}: {strategy.num_replicas_in_sync} replicas, "
+          f"global batch {global_batch_size}, {steps_per_epoch} steps/epoch")
+    while int(epoch.numpy()) < args.epochs:
+        total_loss = total_correct = 0.0
+        for _ in range(steps_per_epoch):
+            started_at = time.perf_counter()
+            loss, correct = train_step(iterator)
+            total_loss += float(loss)  # Also waits for the step, so the recorded time is complete
+            total_correct += float(correct)
+            step_metrics.record(time.perf_counter() - started_at)
+        epoch.assign_add(1)
+        print(f"Epoch {int(epoch.numpy())}/{args.epochs}: loss {total_loss / steps_per_epoch:.4f}, "
+              f"accuracy {total_correct / (steps_per_epoch * global_batch_size):.4f}")
+        model.save_weights(os.path.join(checkpoint_dir, f"epoch_{int(epoch.numpy()):03d}.weights.h5"))
+        backup_manager.save()
+    step_metrics.write()
+
+    final_path = _write_dir(os.path.join(args.model_dir, "final_model.h5"), task_type, task_id)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    final_model = probability_model(model)
+    if final_model is not model:
+        with strategy.scope():
+            final_model.compile(optimizer=optimizer, loss=WeightedFocalLoss(gamma=args.gamma, alpha=alpha),
+                                metrics=["accuracy"])
+    final_model.save(final_path)
+    if not _is_chief(task_type, task_id):
+        shutil.rmtree(os.path.join(args.model_dir, f".worker_{task_id}_tmp"), ignore_errors=True)
+    else:
+        print(f"Final model saved to: {final_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Trains the FP32 baseline's classification head on cached backbone features.
+
+The EfficientNetV2-B0 backbone is frozen, so its pooled output for an image never changes:
+it is computed once per split (src.feature_cache) and every head-training epoch reads the
+memory-mapped features instead of pushing each image through the backbone again. The caches
+are rebuilt only when the image directory's fingerprint changes. The trained head is then
+joined back onto the backbone and saved as a regular Keras model, servable and convertible
+with script/convert_to_tflite.py.
+
+Usage (from module1-edge-ai):
+    python script/train_head_on_features.py \\
+        --train-dir data/PlantVillage_Subset/train --val-dir data/PlantVillage_Subset/val \\
+        --cache-dir data/feature_cache --output trained_models/fp32_head_on_features.h5
+"""
+import argparse
+import os
+import sys
+import time
+
+MODULE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if MODULE_ROOT not in sys.path:
+    sys.path.insert(0, MODULE_ROOT)
+
+import tensorflow as tf  # noqa: E402
+
+from src.artifacts import directory_fingerprint  # noqa: E402
+from src.data_utils import create_tf_dataset, get_class_names, preprocess_image  # noqa: E402
+from src.feature_cache import (  # noqa: E402
+    extract_features, feature_dataset, inverse_frequency_alpha, load_feature_cache, read_cache_info,
+)
+from src.loss_functions import WeightedFocalLoss  # noqa: E402
+from src.models import IMG_SIZE, attach_head, build_classification_head, build_feature_extractor  # noqa: E402
+
+
+def ensure_feature_cache(data_dir, cache_dir, make_feature_extractor, batch_size=32):
+    """Builds the feature cache of `data_dir` unless an up-to-date one exists; returns its info."""
+    source = {"data_dir": os.path.abspath(data_dir), "fingerprint": directory_fingerprint(data_dir)}
+    info = read_cache_info(cache_dir)
+    if info is not None and info.get("source") == source:
+        print(f"Using cached features in {cache_dir}")
+        return info
+    print(f"Extracting backbone features of {data_dir}...")
+    dataset = create_tf_dataset(data_dir, (IMG_SIZE, IMG_SIZE), batch_size, shuffle=False)
+    dataset = dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE).prefetch(tf.data.AUTOTUNE)
+    return extract_features(make_feature_extractor(), dataset, cache_dir, source=source)
+
+
+class _EpochTimer(tf.keras.callbacks.Callback):
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started_at = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        print(f"Epoch {epoch + 1} took {time.perf_counter() - self._started_at:.2f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--train-dir", required=True)
+    parser.add_argument("--val-dir")
+    parser.add_argument("--cache-dir", required=True, help="Feature caches are kept in <cache-dir>/<split>.")
+    parser.add_argument("--output", required=True, help="Path of the joined Keras model (.h5).")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--learning-rate", type=float, default=5e-4)
+    parser.add_argument("--gamma", type=float, default=2.0, help="WeightedFocalLoss focusing parameter.")
+    parser.add_argument("--logits", action=argparse.BooleanOptionalAction, default=True,
+                        help="Train the head on logits with WeightedFocalLoss(from_logits=True); the saved "
+                             "model still outputs probabilities (default: %(default)s).")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    class_names = get_class_names(args.train_dir)
+    extractor = None
+
+    def feature_extractor():
+        nonlocal extractor
+        if extractor is None:  # Only needed when a cache is (re)built
+            extractor = build_feature_extractor()
+        return extractor
+
+    train_cache = os.path.join(args.cache_dir, "train")
+    info = ensure_feature_cache(args.train_dir, train_cache, feature_extractor, args.batch_size)
+    val_ds = None
+    if args.val_dir:
+        val_cache = os.path.join(args.cache_dir, "val")
+        ensure_feature_cache(args.val_dir, val_cache, feature_extractor, args.batch_size)
+        val_ds = feature_dataset(val_cache, args.batch_size, shuffle=False)
+
+    _, train_labels = load_feature_cache(train_cache)
+    head = build_classification_head(info["feature_dim"], len(class_names), logits=args.logits)
+    head.compile(
+        optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate),
+        loss=WeightedFocalLoss(gamma=args.gamma, alpha=inverse_frequency_alpha(train_labels, len(class_names)),
+                               from_logits=args.logits),
+        metrics=["accuracy"],
+    )
+    head.fit(
+        feature_dataset(train_cache, args.batch_size, shuffle=True, seed=args.seed),
+        validation_data=val_ds,
+        epochs=args.epochs,
+        callbacks=[_EpochTimer()],
+    )
+
+    model = attach_head(head, len(class_names))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    model.save(args.output)
+    print(f"Joined model saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
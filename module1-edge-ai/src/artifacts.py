@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# File of the conversion pipeline recording which inputs produced each artifact
+CONVERSION_CACHE_FILE = ".conversion_cache.json"
+
+# URL schemes the serving side downloads models from (backend/python/image_fetcher.py)
+SERVABLE_URL_SCHEMES = ("gs://", "http://", "https://")
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Hex SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def directory_fingerprint(data_dir):
+    """
+    Cheap fingerprint of an image directory: relative paths and sizes of all files.
+    Changes when images are added, removed, renamed or replaced by a different-sized file.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(data_dir):
+        dirs.sort()
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            digest.update(os.path.relpath(path, data_dir).encode())
+            digest.update(str(os.path.getsize(path)).encode())
+    return digest.hexdigest()
+
+
+def conversion_key(**inputs):
+    """Hash of everything a conversion depends on (model hash, variant, settings, tool versions)."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def atomic_write_bytes(path, data):
+    """Writes `data` to `path` through a temporary file, so readers never see a partial file."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ConversionCache:
+    """
+    Records, per artifact, the conversion key it was produced from and its checksum, in
+    `<output_dir>/.conversion_cache.json`, so conversions whose inputs are unchanged are skipped.
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, CONVERSION_CACHE_FILE)
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def lookup(self, artifact_path, key):
+        """Returns the cached entry if `artifact_path` exists, was made from `key` and is unmodified."""
+        entry = self.entries.get(os.path.basename(artifact_path))
+        if entry is None or entry["key"] != key or not os.path.exists(artifact_path):
+            return None
+        if os.path.getsize(artifact_path) != entry["size_bytes"] or file_sha256(artifact_path) != entry["sha256"]:
+            return None
+        return entry
+
+    def record(self, artifact_path, key):
+        entry = {
+            "key": key,
+            "sha256": file_sha256(artifact_path),
+            "size_bytes": os.path.getsize(artifact_path),
+        }
+        self.entries[os.path.basename(artifact_path)] = entry
+        return entry
+
+    def save(self):
+        atomic_write_bytes(self.path, json.dumps(self.entries, indent=2, sort_keys=True).encode())
+
+
+def build_manifest(artifacts, class_names_path, base_url, default=None, extra=None):
+    """
+    Builds the model registry manifest loaded by the serving side
+    (backend/python/model_registry.py, AGROAI_MODEL_REGISTRY_URL).
+
+    Args:
+        artifacts (dict): Variant name -> {"path", "sha256", "size_bytes", ...} of each `.tflite` file.
+        class_names_path (str): The class names file uploaded next to the models.
+        base_url (str): Where the files will be served from (gs:// or http(s), e.g. gs://bucket/ml_models).
+        default (str, optional): Default variant (receives all weighted traffic); the first one when None.
+        extra (dict, optional): Additional top-level metadata (evaluation summary, tool versions).
+
+    Returns:
+        dict: `{"default", "variants": {name: {model_url, class_names_url, sha256, version, weight, ...}}, ...}`
+
+    Raises:
+        ValueError: If `base_url` is not a URL the serving side can download from.
+    """
+    if not base_url or not base_url.startswith(SERVABLE_URL_SCHEMES):
+        raise ValueError(f"base_url must start with one of {', '.join(SERVABLE_URL_SCHEMES)}, got {base_url!r}")
+
+    def url(path):
+        return f"{base_url.rstrip('/')}/{os.path.basename(path)}"
+
+    default = default or next(iter(artifacts))
+    variants = {}
+    for name, artifact in artifacts.items():
+        variants[name] = {
+            "model_url": url(artifact["path"]),
+            "class_names_url": url(class_names_path),
+            "sha256": artifact["sha256"],
+            "version": f"{os.path.splitext(os.path.basename(artifact['path']))[0]}@{artifact['sha256'][:12]}",
+            "weight": 1 if name == default else 0,  # Others are reachable with the X-Model-Variant header
+            "size_bytes": artifact["size_bytes"],
+        }
+    manifest = {
+        "default": default,
+        "variants": variants,
+        "class_names_sha256": file_sha256(class_names_path),
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    manifest.update(extra or {})
+    return manifest
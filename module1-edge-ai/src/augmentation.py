@@ -0,0 +1,142 @@
+import math
+
+import tensorflow as tf
+
+
+class BatchAugmenter:
+    """
+    Random flip, zoom/crop, rotation and color jitter applied to whole batches of images.
+
+    Flip, zoom/crop and rotation are composed into one affine transform per image and applied
+    with a single projective-transform op over the batch; color jitter is a few broadcast ops.
+    Every image gets its own random parameters, all drawn with stateless random ops from one
+    seed per batch. Those seeds come from a tf.random.Generator seeded with `seed`, so a run
+    is reproducible while each epoch still sees new augmentations.
+    """
+
+    def __init__(
+        self,
+        flip=True,
+        zoom_range=(0.8, 1.0),
+        max_rotation_deg=15.0,
+        brightness=0.1,
+        contrast=(0.8, 1.2),
+        saturation=(0.8, 1.2),
+        value_range=(0.0, 255.0),
+        seed=42,
+    ):
+        """
+        Args:
+            flip (bool): Random horizontal flip (probability 0.5).
+            zoom_range (tuple): Fraction of the image kept by the random crop (min, max); 1.0 = no zoom.
+            max_rotation_deg (float): Rotations are drawn from [-max_rotation_deg, max_rotation_deg].
+            brightness (float): Largest brightness shift, as a fraction of the value range.
+            contrast (tuple): Contrast factor range around each image's per-channel mean.
+            saturation (tuple): Saturation factor range around each pixel's grayscale value.
+            value_range (tuple): Pixel range of the images (0-255 for create_tf_dataset output);
+                                 results are clipped to it.
+            seed (int, optional): Seed of the augmentation sequence; None for a non-deterministic one.
+        """
+        self.flip = flip
+        self.zoom_range = tuple(float(v) for v in zoom_range)
+        self.max_rotation = math.radians(max_rotation_deg)
+        self.brightness = float(brightness)
+        self.contrast = tuple(float(v) for v in contrast)
+        self.saturation = tuple(float(v) for v in saturation)
+        self.value_range = tuple(float(v) for v in value_range)
+        if seed is None:
+            self._generator = tf.random.Generator.from_non_deterministic_state()
+        else:
+            self._generator = tf.random.Generator.from_seed(seed)
+
+    def next_seed(self):
+        """Draws the stateless seed of the next batch (shape [2], int64)."""
+        return self._generator.make_seeds(1)[:, 0]
+
+    def apply_to(self, dataset):
+        """
+        Augments a dataset of (images, labels) batches.
+
+        Seeds are drawn in a cheap sequential step, so the augmentation itself runs in a
+        parallel map and the result still depends only on `seed` and the batch order.
+        """
+        dataset = dataset.map(lambda images, labels: (images, labels, self.next_seed()))
+        return dataset.map(self.augment, num_parallel_calls=tf.data.AUTOTUNE, deterministic=True)
+
+    @tf.function(reduce_retracing=True)
+    def augment(self, images, labels, seed):
+        """
+        Augments one batch.
+
+        Args:
+            images (tf.Tensor): Float images (batch, height, width, 3) in `value_range`.
+            labels (tf.Tensor): Labels, returned unchanged.
+            seed (tf.Tensor): Stateless seed of the batch (shape [2]).
+
+        Returns:
+            tuple: (augmented images, labels).
+        """
+        images = tf.cast(images, tf.float32)
+        seeds = tf.random.experimental.stateless_split(seed, num=7)
+        images = self._geometric(images, seeds[:4])
+        images = self._color(images, seeds[4:])
+        return images, labels
+
+    def _geometric(self, images, seeds):
+        """Flip, zoom/crop and rotation as one per-image affine transform."""
+        shape = tf.shape(images)
+        batch_size = shape[0]
+        height = tf.cast(shape[1], tf.float32)
+        width = tf.cast(shape[2], tf.float32)
+
+        if self.flip:
+            flip = tf.where(tf.random.stateless_uniform([batch_size], seeds[0]) < 0.5, -1.0, 1.0)
+        else:
+            flip = tf.ones([batch_size])
+        zoom = tf.random.stateless_uniform([batch_size], seeds[1], self.zoom_range[0], self.zoom_range[1])
+        angle = tf.random.stateless_uniform([batch_size], seeds[2], -self.max_rotation, self.max_rotation)
+        # Crop position: anywhere the zoomed window stays inside the image (before rotation)
+        shift = tf.random.stateless_uniform([batch_size, 2], seeds[3], -1.0, 1.0)
+        center_x = (width - 1.0) / 2.0
+        center_y = (height - 1.0) / 2.0
+        offset_x = shift[:, 0] * (1.0 - zoom) * center_x
+        offset_y = shift[:, 1] * (1.0 - zoom) * center_y
+
+        # Output pixel (x, y) samples the input at
+        #   center + zoom * R(angle) @ (flip * (x - cx), y - cy) + offset
+        cos, sin = tf.cos(angle), tf.sin(angle)
+        a0 = zoom * cos * flip
+        a1 = -zoom * sin
+        b0 = zoom * sin * flip
+        b1 = zoom * cos
+        a2 = center_x + offset_x - a0 * center_x - a1 * center_y
+        b2 = center_y + offset_y - b0 * center_x - b1 * center_y
+        zeros = tf.zeros([batch_size])
+        transforms = tf.stack([a0, a1, a2, b0, b1, b2, zeros, zeros], axis=1)
+
+        return tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=shape[1:3],
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode="REFLECT",
+        )
+
+    def _color(self, images, seeds):
+        """Per-image brightness, contrast and saturation jitter."""
+        low, high = self.value_range
+        per_image = tf.stack([tf.shape(images)[0], 1, 1, 1])
+
+        delta = self.brightness * (high - low)
+        images = images + tf.random.stateless_uniform(per_image, seeds[0], -delta, delta)
+
+        mean = tf.reduce_mean(images, axis=[1, 2], keepdims=True)
+        factor = tf.random.stateless_uniform(per_image, seeds[1], self.contrast[0], self.contrast[1])
+        images = (images - mean) * factor + mean
+
+        gray = tf.image.rgb_to_grayscale(images)
+        factor = tf.random.stateless_uniform(per_image, seeds[2], self.saturation[0], self.saturation[1])
+        images = (images - gray) * factor + gray
+
+        return tf.clip_by_value(images, low, high)
@@ -83,8 +83,7 @@ def apply_data_augmentation(image, label, img_height, img_width):
     image = tf.image.random_contrast(image, lower=0.8, upper=1.2)
     # Random brightness
     image = tf.image.random_brightness(image, max_delta=0.2)
-    # Random zoom (TensorFlow Addons might be needed for advanced transforms, or implement manually)
-    # This basic example sticks to built-in TF ops
+    # Random zoom/crop and rotation: see src.augmentation.BatchAugmenter (batched, in-graph)
     return image, label
 
 
@@ -101,15 +100,97 @@ def preprocess_image(image, label):
     return image, label
 
 
+def augment_batch(images, labels):
+    """
+    Batched version of apply_data_augmentation: random horizontal flip, contrast and brightness
+    with independent random parameters for every image of a (batch, height, width, 3) batch,
+    computed with a few whole-batch ops instead of one op chain per image.
+    """
+    batch_size = tf.shape(images)[0]
+    per_image = [batch_size, 1, 1, 1]
+    # Random horizontal flip
+    flip = tf.random.uniform(per_image) < 0.5
+    images = tf.where(flip, tf.reverse(images, axis=[2]), images)
+    # Random contrast (as tf.image.adjust_contrast: scale around the per-channel mean)
+    mean = tf.reduce_mean(images, axis=[1, 2], keepdims=True)
+    images = (images - mean) * tf.random.uniform(per_image, 0.8, 1.2) + mean
+    # Random brightness
+    images = images + tf.random.uniform(per_image, -0.2, 0.2)
+    return images, labels
+
+
+def _to_uint8(image, label):
+    """Decoded pixels are whole numbers in [0, 255]: cached as uint8, a quarter of the float32 size."""
+    return tf.saturate_cast(image, tf.uint8), label
+
+
+def estimate_cache_bytes(dataset):
+    """Size of `dataset` (batches of 3-channel images) cached as uint8 pixels; None if its length is unknown."""
+    num_batches = int(dataset.cardinality())
+    if num_batches < 0:  # tf.data.INFINITE_CARDINALITY / UNKNOWN_CARDINALITY
+        return None
+    images, _ = next(iter(dataset.take(1)))
+    return num_batches * int(tf.size(images))
+
+
 def prepare_dataset(
-    dataset, img_height, img_width, augment=False, prefetch_buffer=tf.data.AUTOTUNE
+    dataset,
+    img_height,
+    img_width,
+    augment=False,
+    prefetch_buffer=tf.data.AUTOTUNE,
+    cache="auto",
+    cache_path=None,
+    memory_budget_mb=2048,
+    augmenter=None,
 ):
-    """Applies preprocessing and optional augmentation, then prefetches."""
-    if augment:
-        dataset = dataset.map(
-            lambda x, y: apply_data_augmentation(x, y, img_height, img_width),
-            num_parallel_calls=tf.data.AUTOTUNE,
-        )
+    """
+    Caches the decoded images, then applies optional augmentation and preprocessing, then prefetches.
+
+    Only the deterministic decode/resize output is cached (as uint8 pixels), so augmentation,
+    batched per dataset element (see augment_batch), draws new random parameters every epoch.
+
+    Args:
+        dataset (tf.data.Dataset): Batches of decoded images and labels (e.g. from create_tf_dataset).
+        img_height (int): Image height.
+        img_width (int): Image width.
+        augment (bool): Apply random flip/contrast/brightness after the cache.
+        prefetch_buffer (int): Prefetch buffer size.
+        cache (str or None): "memory", "disk" (a file cache at `cache_path`), "auto" (memory if the
+                             estimated size fits in `memory_budget_mb`, else disk when `cache_path`
+                             is given) or None (decode every epoch).
+        cache_path (str, optional): File name prefix of the disk cache. It is only valid for this
+                                    exact dataset; delete the files when the data changes.
+        memory_budget_mb (float): Largest dataset cached in memory by "auto".
+        augmenter (src.augmentation.BatchAugmenter, optional): Augmentation used instead of
+                                                               augment_batch (adds zoom/crop and rotation).
+
+    Returns:
+        tf.data.Dataset: The prepared dataset.
+    """
+    if cache == "auto":
+        cache_bytes = estimate_cache_bytes(dataset)
+        if cache_bytes is not None and cache_bytes <= memory_budget_mb * 1e6:
+            cache = "memory"
+        elif cache_path:
+            cache = "disk"
+        else:
+            print(f"Dataset too large to cache in {memory_budget_mb} MB and no cache_path given; not caching.")
+            cache = None
+    if cache not in ("memory", "disk", None):
+        raise ValueError(f"Unknown cache mode '{cache}', expected 'memory', 'disk', 'auto' or None")
+    if cache == "disk" and not cache_path:
+        raise ValueError("cache='disk' needs a cache_path")
+
+    if cache is not None:
+        dataset = dataset.map(_to_uint8, num_parallel_calls=tf.data.AUTOTUNE)
+        if cache == "disk":
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        dataset = dataset.cache(cache_path if cache == "disk" else "")
 
     dataset = dataset.map(preprocess_image, num_parallel_calls=tf.data.AUTOTUNE)
-    return dataset.cache().prefetch(buffer_size=prefetch_buffer)
+    if augment and augmenter is not None:
+        dataset = augmenter.apply_to(dataset)
+    elif augment:
+        dataset = dataset.map(augment_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(buffer_size=prefetch_buffer)
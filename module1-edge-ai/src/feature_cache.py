@@ -0,0 +1,127 @@
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+# Files of a feature cache directory
+FEATURES_FILE = "features.f32"  # Raw float32 rows, read through np.memmap
+LABELS_FILE = "labels.npy"
+CACHE_INFO_FILE = "cache_info.json"
+
+
+def extract_features(feature_extractor, dataset, cache_dir, source=None):
+    """
+    Runs the frozen backbone once over a dataset and stores the pooled features on disk.
+
+    Features are appended batch by batch to a raw float32 file (never held in memory as a
+    whole) and labels are saved next to them.
+
+    Args:
+        feature_extractor (tf.keras.Model): Images to pooled features (see src.models.build_feature_extractor).
+        dataset (tf.data.Dataset): Batches of (images, int labels), e.g. create_tf_dataset(...).map(preprocess_image);
+                                   unshuffled, so cached rows keep a fixed order.
+        cache_dir (str): Directory of the cache files.
+        source (dict, optional): Description of the inputs (data directory, fingerprint), stored in
+                                 cache_info.json to tell when the cache is stale.
+
+    Returns:
+        dict: The cache info (num_examples, feature_dim, extraction time, source).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    info_path = os.path.join(cache_dir, CACHE_INFO_FILE)
+    if os.path.exists(info_path):
+        os.unlink(info_path)  # Written last: the cache only counts as complete once it is back
+    features_path = os.path.join(cache_dir, FEATURES_FILE)
+    tmp_path = features_path + ".tmp"
+
+    @tf.function
+    def embed(images):
+        return feature_extractor(images, training=False)
+
+    labels = []
+    feature_dim = None
+    started_at = time.perf_counter()
+    with open(tmp_path, "wb") as f:
+        for images, batch_labels in dataset:
+            features = embed(images).numpy().astype(np.float32, copy=False)
+            feature_dim = features.shape[1]
+            f.write(features.tobytes())
+            labels.append(batch_labels.numpy().astype(np.int32))
+    if feature_dim is None:
+        os.unlink(tmp_path)
+        raise ValueError("The dataset is empty")
+    os.replace(tmp_path, features_path)
+    labels = np.concatenate(labels)
+    np.save(os.path.join(cache_dir, LABELS_FILE), labels)
+
+    info = {
+        "num_examples": int(len(labels)),
+        "feature_dim": int(feature_dim),
+        "extraction_s": time.perf_counter() - started_at,
+        "source": source,
+    }
+    with open(info_path, "w") as f:
+        json.dump(info, f, indent=2)
+    print(f"Cached {info['num_examples']} x {feature_dim} features in {cache_dir} ({info['extraction_s']:.1f} s)")
+    return info
+
+
+def read_cache_info(cache_dir):
+    """Returns the cache_info.json of a feature cache, or None if there is no complete cache."""
+    try:
+        with open(os.path.join(cache_dir, CACHE_INFO_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def load_feature_cache(cache_dir):
+    """
+    Opens a feature cache.
+
+    Returns:
+        tuple: (features as a read-only np.memmap of shape (num_examples, feature_dim), int32 labels).
+    """
+    info = read_cache_info(cache_dir)
+    if info is None:
+        raise FileNotFoundError(f"No feature cache in {cache_dir}")
+    features = np.memmap(
+        os.path.join(cache_dir, FEATURES_FILE), dtype=np.float32, mode="r",
+        shape=(info["num_examples"], info["feature_dim"]),
+    )
+    return features, np.load(os.path.join(cache_dir, LABELS_FILE))
+
+
+def feature_dataset(cache_dir, batch_size, shuffle=True, seed=42):
+    """
+    Batches of (features, labels) read from the memory-mapped cache.
+
+    With `shuffle`, examples are permuted every epoch (in a sequence fixed by `seed`); each batch's
+    rows are read in file order, so the page cache serves them with mostly sequential reads.
+
+    Returns:
+        tf.data.Dataset: Batches of float32 features (batch, feature_dim) and int32 labels.
+    """
+    features, labels = load_feature_cache(cache_dir)
+    rng = np.random.default_rng(seed)
+
+    def batches():
+        order = rng.permutation(len(labels)) if shuffle else np.arange(len(labels))
+        for start in range(0, len(order), batch_size):
+            index = np.sort(order[start:start + batch_size])
+            yield np.asarray(features[index]), labels[index]
+
+    dataset = tf.data.Dataset.from_generator(batches, output_signature=(
+        tf.TensorSpec(shape=(None, features.shape[1]), dtype=tf.float32),
+        tf.TensorSpec(shape=(None,), dtype=tf.int32),
+    ))
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def inverse_frequency_alpha(labels, num_classes):
+    """Per-class WeightedFocalLoss alpha from label counts: inverse frequency, normalized to mean 1."""
+    counts = np.bincount(labels, minlength=num_classes).astype(np.float64)
+    alpha = 1.0 / np.maximum(counts, 1.0)
+    return (alpha * num_classes / alpha.sum()).astype(np.float32)
@@ -8,7 +8,8 @@ class WeightedFocalLoss(tf.keras.losses.Loss):
     with additional weighting for rare classes.
     """
 
-    def __init__(self, gamma=2.0, alpha=None, name="weighted_focal_loss", reduction="sum_over_batch_size", **kwargs):
+    def __init__(self, gamma=2.0, alpha=None, from_logits=False, name="weighted_focal_loss",
+                 reduction="sum_over_batch_size", **kwargs):
         """
         Initializes the WeightedFocalLoss.
 
@@ -16,12 +17,15 @@ class WeightedFocalLoss(tf.keras.losses.Loss):
             gamma (float): Focusing parameter. When gamma > 0, easy examples are down-weighted.
             alpha (tf.Tensor or None): A 1D tensor of shape (num_classes,) containing
                                         per-class weighting factors. If None, no alpha weighting is applied.
+            from_logits (bool): Whether y_pred are logits (log-softmax is taken inside the loss, which is
+                                more stable than a softmax output layer) rather than probabilities.
             name (str): Name of the loss function.
             reduction (str): Type of reduction to apply to the loss. Defaults to "sum_over_batch_size".
             **kwargs: Keyword arguments for the base tf.keras.losses.Loss class.
         """
         super().__init__(name=name, reduction=reduction, **kwargs)  # Pass reduction explicitly
         self.gamma = float(gamma)  # Ensure gamma is a float
+        self.from_logits = bool(from_logits)
         
         # Handle alpha parameter - it might come as a list from deserialization
         if alpha is not None:
@@ -43,42 +47,42 @@ class WeightedFocalLoss(tf.keras.losses.Loss):
         """
         Calculates the Weighted Focal Loss.
 
+        Only the true class's probability (and alpha weight) of each example is needed, so they are
+        gathered by integer label: O(batch) work on top of the log-softmax when `from_logits`,
+        instead of building (batch, num_classes) one-hot and log tensors.
+
         Args:
-            y_true (tf.Tensor): True labels (one-hot encoded or integer labels if sparse_categorical_crossentropy is used).
-                                Expected shape: (batch_size, num_classes) for one-hot, or (batch_size,) for integer.
-            y_pred (tf.Tensor): Predicted probabilities. Expected shape: (batch_size, num_classes).
+            y_true (tf.Tensor): Integer labels (SparseCategoricalCrossentropy style), shape (batch_size,)
+                                or (batch_size, 1).
+            y_pred (tf.Tensor): Predicted probabilities, or logits if `from_logits`.
+                                Expected shape: (batch_size, num_classes). Any float dtype (e.g. float16
+                                under mixed precision); the loss is computed in float32.
 
         Returns:
             tf.Tensor: Scalar loss value.
         """
-        # Ensure y_pred is within valid range for log
-        y_pred = tf.clip_by_value(
-            y_pred, tf.keras.backend.epsilon(), 1 - tf.keras.backend.epsilon()
-        )
-
-        # Convert y_true to one-hot if it's not already (for sparse_categorical_crossentropy compatibility)
-        # Assuming y_true is integer-encoded (SparseCategoricalCrossentropy style)
-        # We need to make it one-hot to multiply with y_pred and alpha weights
-        num_classes = tf.shape(y_pred)[-1]
-        y_true_one_hot = tf.one_hot(tf.cast(y_true, tf.int32), depth=num_classes)
+        labels = tf.reshape(tf.cast(y_true, tf.int32), [-1])
+        y_pred = tf.cast(y_pred, tf.float32)
 
-        # Calculate Cross-Entropy Loss (element-wise)
-        ce_loss = -y_true_one_hot * tf.math.log(y_pred)
-
-        # Calculate pt (probability of true class)
-        pt = tf.reduce_sum(y_true_one_hot * y_pred, axis=-1)
+        if self.from_logits:
+            # log p_t = logit_t - logsumexp(logits)
+            log_pt = tf.gather(y_pred, labels, batch_dims=1) - tf.reduce_logsumexp(y_pred, axis=-1)
+            pt = tf.exp(log_pt)
+        else:
+            # Ensure pt is within valid range for log
+            pt = tf.clip_by_value(
+                tf.gather(y_pred, labels, batch_dims=1),
+                tf.keras.backend.epsilon(),
+                1 - tf.keras.backend.epsilon(),
+            )
+            log_pt = tf.math.log(pt)
 
-        # Calculate Focal Term
-        focal_term = tf.pow(1.0 - pt, self.gamma)
+        # Focal term times the cross-entropy of the true class
+        loss = -tf.pow(1.0 - pt, self.gamma) * log_pt
 
         # Apply alpha weighting
         if self.alpha is not None:
-            # Ensure alpha has correct shape for broadcasting or element-wise multiplication
-            # It should broadcast across the batch dimension
-            alpha_weight = tf.reduce_sum(y_true_one_hot * self.alpha, axis=-1)
-            loss = alpha_weight * focal_term * tf.reduce_sum(ce_loss, axis=-1)
-        else:
-            loss = focal_term * tf.reduce_sum(ce_loss, axis=-1)
+            loss = tf.gather(self.alpha, labels) * loss
 
         return tf.reduce_mean(loss)  # Return scalar mean loss per batch
 
@@ -91,6 +95,7 @@ class WeightedFocalLoss(tf.keras.losses.Loss):
         config.update(
             {
                 "gamma": self.gamma,
+                "from_logits": self.from_logits,
                 "alpha": (
                     self.alpha.numpy().tolist() if self.alpha is not None else None
                 ),  # Convert tensor to list for serialization
@@ -108,8 +113,9 @@ class WeightedFocalLoss(tf.keras.losses.Loss):
         # Extract only the parameters that our __init__ method accepts
         gamma = config.get('gamma', 2.0)
         alpha = config.get('alpha', None)
+        from_logits = config.get('from_logits', False)
         name = config.get('name', 'weighted_focal_loss')
         
         # Explicitly create instance with only valid parameters
         # This avoids passing 'reduction' or other Keras-added parameters
-        return cls(gamma=gamma, alpha=alpha, name=name)
+        return cls(gamma=gamma, alpha=alpha, from_logits=from_logits, name=name)
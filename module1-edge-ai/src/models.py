@@ -5,12 +5,15 @@ from tensorflow.keras import layers, models
 IMG_SIZE = 224  # Standard input size for EfficientNetV2-B0
 
 
-def build_fp32_efficientnet_model(num_classes):
+def build_fp32_efficientnet_model(num_classes, weights="imagenet", logits=False):
     """
     Builds the FP32 baseline EfficientNetV2-B0 model with a custom classification head.
 
     Args:
         num_classes (int): The number of output classes for classification.
+        weights (str, optional): Backbone weights, "imagenet" or None (random initialization).
+        logits (bool): Output logits instead of softmax probabilities, for training with
+                       WeightedFocalLoss(from_logits=True). Export through `probability_model`.
 
     Returns:
         tf.keras.Model: The compiled Keras model.
@@ -20,7 +23,7 @@ def build_fp32_efficientnet_model(num_classes):
     # weights='imagenet': Use pre-trained weights
     # input_shape: Define the expected input size (channels_last for TF)
     base_model = EfficientNetV2B0(
-        include_top=False, weights="imagenet", input_shape=(IMG_SIZE, IMG_SIZE, 3)
+        include_top=False, weights=weights, input_shape=(IMG_SIZE, IMG_SIZE, 3)
     )
 
     # Freeze the base model's weights to prevent them from being updated during training
@@ -33,15 +36,91 @@ def build_fp32_efficientnet_model(num_classes):
         inputs, training=False
     )  # Important: set training=False when using a frozen base
     x = layers.GlobalAveragePooling2D()(x)
+    outputs = _classification_head(x, num_classes, logits)
+
+    model = models.Model(inputs, outputs)
+
+    return model
+
+
+def _classification_head(x, num_classes, logits=False):
+    """The trainable head on top of the pooled backbone features."""
     x = layers.Dense(128, activation="relu")(x)  # A dense layer
     x = layers.Dropout(0.3)(x)  # Dropout for regularization
-    outputs = layers.Dense(num_classes, activation="softmax")(
+    return layers.Dense(num_classes, activation=None if logits else "softmax")(
         x
     )  # Final classification layer
 
-    model = models.Model(inputs, outputs)
 
-    return model
+def outputs_logits(model):
+    """Whether `model` ends in a classification layer without softmax (see the `logits` options)."""
+    last = model.layers[-1]
+    return isinstance(last, layers.Dense) and last.get_config()["activation"] == "linear"
+
+
+def probability_model(model):
+    """
+    Returns `model` with softmax probabilities as output: a logits model gets a Softmax layer
+    appended (sharing its layers and weights), any other model is returned as is. Saved and
+    converted models always output probabilities, which the backend and TFLite evaluation expect.
+    """
+    if not outputs_logits(model):
+        return model
+    outputs = layers.Softmax(name="probabilities")(model.outputs[0])
+    return models.Model(model.inputs, outputs, name=model.name)
+
+
+def build_feature_extractor():
+    """
+    Builds the frozen part of the FP32 baseline: the EfficientNetV2-B0 backbone followed by
+    global average pooling, mapping images to the pooled features the head is trained on.
+
+    Returns:
+        tf.keras.Model: Model from (IMG_SIZE, IMG_SIZE, 3) images to (1280,) features.
+    """
+    base_model = EfficientNetV2B0(
+        include_top=False, weights="imagenet", input_shape=(IMG_SIZE, IMG_SIZE, 3)
+    )
+    base_model.trainable = False
+    inputs = layers.Input(shape=(IMG_SIZE, IMG_SIZE, 3))
+    x = base_model(inputs, training=False)
+    outputs = layers.GlobalAveragePooling2D()(x)
+    return models.Model(inputs, outputs, name="feature_extractor")
+
+
+def build_classification_head(feature_dim, num_classes, logits=False):
+    """
+    Builds the baseline's classification head on its own, to train on cached backbone features.
+
+    Args:
+        feature_dim (int): Size of the pooled features (the feature extractor's output).
+        num_classes (int): The number of output classes for classification.
+        logits (bool): Output logits instead of softmax probabilities.
+
+    Returns:
+        tf.keras.Model: Model from (feature_dim,) features to class probabilities (or logits).
+    """
+    inputs = layers.Input(shape=(feature_dim,))
+    return models.Model(inputs, _classification_head(inputs, num_classes, logits), name="classification_head")
+
+
+def attach_head(head, num_classes):
+    """
+    Joins a head trained on cached features back onto the backbone.
+
+    Returns:
+        tf.keras.Model: The same architecture as build_fp32_efficientnet_model, with the head's
+                        weights and softmax probabilities as output (also for a logits head),
+                        ready to save and convert to TFLite.
+    """
+    model = build_fp32_efficientnet_model(num_classes, logits=outputs_logits(head))
+    model_dense = [layer for layer in model.layers if isinstance(layer, layers.Dense)]
+    head_dense = [layer for layer in head.layers if isinstance(layer, layers.Dense)]
+    if len(model_dense) != len(head_dense):
+        raise ValueError("The head does not match the baseline's classification head")
+    for target, source in zip(model_dense, head_dense):
+        target.set_weights(source.get_weights())
+    return probability_model(model)
 
 
 # Add an empty __init__.py in src/ if not already present to make it a package
@@ -0,0 +1,66 @@
+import tensorflow as tf
+
+from src.data_utils import create_tf_dataset, preprocess_image
+
+# Post-training variants produced from one Keras model, in increasing order of compression
+QUANTIZATION_VARIANTS = ("fp32", "dynamic", "float16", "int8")
+
+
+def representative_dataset(data_dir, img_size=(224, 224), num_samples=300, seed=42):
+    """
+    Builds the calibration generator for full integer quantization from real images.
+
+    Images are streamed from `data_dir` (class subdirectories, e.g. the train split) through
+    the same loading and preprocessing as training, shuffled across classes, one image per
+    calibration step, so the activation ranges match what the model sees in production.
+
+    Args:
+        data_dir (str): Directory with class subdirectories to sample calibration images from.
+        img_size (tuple): Model input size (height, width).
+        num_samples (int): Number of calibration images (a few hundred is usually enough).
+        seed (int): Shuffle seed, for reproducible calibration.
+
+    Returns:
+        callable: A generator function yielding `[image_batch]` lists, as expected by
+                  `TFLiteConverter.representative_dataset`.
+    """
+
+    def representative_dataset_gen():
+        dataset = create_tf_dataset(data_dir, img_size, batch_size=1, shuffle=True, seed=seed)
+        for images, _ in dataset.map(preprocess_image).take(num_samples):
+            yield [images]
+
+    return representative_dataset_gen
+
+
+def convert_variant(model, variant, representative_data=None):
+    """
+    Converts a Keras model to one TFLite variant.
+
+    Args:
+        model (tf.keras.Model): The trained FP32 model.
+        variant (str): One of QUANTIZATION_VARIANTS:
+            "fp32" (no optimization), "dynamic" (INT8 weights, float activations),
+            "float16" (FP16 weights) or "int8" (full integer, INT8 input/output).
+        representative_data (callable, optional): Calibration generator (see representative_dataset),
+                                                  required for "int8".
+
+    Returns:
+        bytes: The serialized TFLite model.
+    """
+    if variant not in QUANTIZATION_VARIANTS:
+        raise ValueError(f"Unknown variant '{variant}', expected one of {QUANTIZATION_VARIANTS}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if variant != "fp32":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        if representative_data is None:
+            raise ValueError("Full integer quantization needs representative data for calibration")
+        converter.representative_dataset = representative_data
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    return converter.convert()
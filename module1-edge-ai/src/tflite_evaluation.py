@@ -0,0 +1,184 @@
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+
+def _quantize_input(images, input_details):
+    """Converts float images to the interpreter's input type (quantizing for INT8 models)."""
+    if input_details["dtype"] == np.float32:
+        return images.astype(np.float32)
+    scale, zero_point = input_details["quantization"]
+    info = np.iinfo(input_details["dtype"])
+    return np.clip(np.round(images / scale + zero_point), info.min, info.max).astype(input_details["dtype"])
+
+
+def _dequantize_output(output, output_details):
+    """Converts the interpreter's output back to float scores."""
+    if output_details["dtype"] == np.float32:
+        return output
+    scale, zero_point = output_details["quantization"]
+    return (output.astype(np.float32) - zero_point) * scale
+
+
+class TFLiteClassifier:
+    """A TFLite interpreter wrapped for float image batches of any size."""
+
+    def __init__(self, model_path, num_threads=None):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()[0]
+        self.batch_size = int(self.input_details["shape"][0])
+
+    def _set_batch_size(self, batch_size):
+        if batch_size != self.batch_size:
+            shape = list(self.input_details["shape"])
+            shape[0] = batch_size
+            self.interpreter.resize_tensor_input(self.input_details["index"], shape)
+            self.interpreter.allocate_tensors()
+            self.input_details = self.interpreter.get_input_details()[0]
+            self.output_details = self.interpreter.get_output_details()[0]
+            self.batch_size = batch_size
+
+    def predict(self, images):
+        """Returns the float scores for a batch of float images (batch, height, width, 3)."""
+        images = np.asarray(images)
+        self._set_batch_size(images.shape[0])
+        self.interpreter.set_tensor(self.input_details["index"], _quantize_input(images, self.input_details))
+        self.interpreter.invoke()
+        return _dequantize_output(self.interpreter.get_tensor(self.output_details["index"]), self.output_details)
+
+
+def _latency_ms(classifier, images, runs, warmup=3):
+    """Per-invocation latency percentiles (ms) of `images` as one batch."""
+    for _ in range(warmup):
+        classifier.predict(images)
+    timings = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        classifier.predict(images)
+        timings.append(1000.0 * (time.perf_counter() - started_at))
+    p50, p95 = np.percentile(timings, [50, 95])
+    return {"p50": float(p50), "p95": float(p95), "mean": float(np.mean(timings))}
+
+
+def evaluate_tflite_model(model_path, dataset, num_threads=None, latency_runs=50, batch_size=8, max_images=None):
+    """
+    Evaluates one TFLite model on a held-out dataset.
+
+    Args:
+        model_path (str): Path to the `.tflite` file.
+        dataset (tf.data.Dataset): Batches of (float images, int labels), not shuffled.
+        num_threads (int, optional): Interpreter CPU threads.
+        latency_runs (int): Timed invocations for each latency measurement.
+        batch_size (int): Batch size of the batched-latency measurement.
+        max_images (int, optional): Evaluate accuracy on at most this many images.
+
+    Returns:
+        dict: size_mb, cold_load_ms (interpreter creation, tensor allocation and first invocation),
+              accuracy, evaluated_images, latency_single_ms, latency_batch_ms and
+              latency_batch_per_image_ms (p50/p95/mean).
+    """
+    size_mb = os.path.getsize(model_path) / 1e6
+
+    started_at = time.perf_counter()
+    classifier = TFLiteClassifier(model_path, num_threads=num_threads)
+    sample_shape = [1] + list(classifier.input_details["shape"][1:])
+    classifier.predict(np.zeros(sample_shape, dtype=np.float32))
+    cold_load_ms = 1000.0 * (time.perf_counter() - started_at)
+
+    correct = 0
+    evaluated = 0
+    sample_images = []
+    for images, labels in dataset:
+        images, labels = images.numpy(), labels.numpy()
+        if max_images is not None:
+            images, labels = images[: max_images - evaluated], labels[: max_images - evaluated]
+        scores = classifier.predict(images)
+        correct += int(np.sum(np.argmax(scores, axis=-1) == labels))
+        evaluated += len(labels)
+        if len(sample_images) < batch_size:
+            sample_images.extend(images[: batch_size - len(sample_images)])
+        if max_images is not None and evaluated >= max_images:
+            break
+    if not sample_images:
+        raise ValueError("The evaluation dataset is empty")
+
+    sample_images = np.stack(sample_images)
+    single = _latency_ms(classifier, sample_images[:1], latency_runs)
+    batched = _latency_ms(classifier, sample_images, latency_runs)
+    return {
+        "model_path": model_path,
+        "size_mb": size_mb,
+        "cold_load_ms": cold_load_ms,
+        "accuracy": correct / evaluated,
+        "evaluated_images": evaluated,
+        "latency_single_ms": single,
+        "latency_batch_ms": batched,
+        "latency_batch_per_image_ms": {key: value / len(sample_images) for key, value in batched.items()},
+        "latency_batch_size": len(sample_images),
+    }
+
+
+def select_variant(results, accuracy_budget=0.01, reference="fp32"):
+    """
+    Picks the variant with the lowest single-image p50 latency whose accuracy is within
+    `accuracy_budget` (absolute, e.g. 0.01 = 1 point) of the reference variant.
+
+    Returns:
+        str: The selected variant name (the reference if no other variant qualifies).
+    """
+    reference_accuracy = results[reference]["accuracy"] if reference in results else max(
+        r["accuracy"] for r in results.values()
+    )
+    eligible = [
+        name for name, r in results.items() if r["accuracy"] >= reference_accuracy - accuracy_budget
+    ]
+    return min(eligible, key=lambda name: results[name]["latency_single_ms"]["p50"])
+
+
+def write_comparison_report(results, output_dir, accuracy_budget=0.01, reference="fp32", name="quantization_report"):
+    """
+    Writes the variant comparison as `<name>.json` and a Markdown table `<name>.md`.
+
+    Args:
+        results (dict): Variant name -> evaluate_tflite_model() result.
+        output_dir (str): Directory of the report files.
+        accuracy_budget (float): Largest accepted accuracy drop against the reference variant.
+        reference (str): Variant the accuracy drop is measured against.
+        name (str): Report file name prefix.
+
+    Returns:
+        dict: The report, including the selected variant.
+    """
+    selected = select_variant(results, accuracy_budget, reference)
+    reference_accuracy = results.get(reference, results[selected])["accuracy"]
+    report = {
+        "reference": reference,
+        "accuracy_budget": accuracy_budget,
+        "selected": selected,
+        "variants": results,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f"{name}.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+    lines = [
+        "| Variant | Size (MB) | Accuracy | Δ vs " + reference + " | Cold load (ms) | Single p50/p95 (ms) "
+        f"| Batch-{next(iter(results.values()))['latency_batch_size']} per image p50 (ms) |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for variant, r in results.items():
+        marker = " **(selected)**" if variant == selected else ""
+        lines.append(
+            f"| {variant}{marker} | {r['size_mb']:.2f} | {r['accuracy']:.4f} | {r['accuracy'] - reference_accuracy:+.4f} "
+            f"| {r['cold_load_ms']:.1f} | {r['latency_single_ms']['p50']:.2f} / {r['latency_single_ms']['p95']:.2f} "
+            f"| {r['latency_batch_per_image_ms']['p50']:.2f} |"
+        )
+    with open(os.path.join(output_dir, f"{name}.md"), "w") as f:
+        f.write("\n".join(lines) + "\n")
+    print("\n".join(lines))
+    return report
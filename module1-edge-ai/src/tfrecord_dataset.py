@@ -0,0 +1,203 @@
+import json
+import os
+import random
+
+import tensorflow as tf
+
+from src.data_utils import get_class_names
+
+# Image types read by tf.keras.utils.image_dataset_from_directory (and so by create_tf_dataset)
+IMAGE_EXTENSIONS = (".bmp", ".gif", ".jpeg", ".jpg", ".png")
+
+# Written next to the shards: class names and counts, image size, shard files and example counts
+DATASET_INFO_FILE = "dataset_info.json"
+
+_FEATURES = {
+    "image": tf.io.FixedLenFeature([], tf.string),
+    "label": tf.io.FixedLenFeature([], tf.int64),
+}
+
+
+def list_image_files(data_dir):
+    """
+    Lists the images of a class-subdirectory dataset.
+
+    Returns:
+        tuple: (file paths, int labels, class names), labels indexing the sorted class names
+               as with create_tf_dataset.
+    """
+    class_names = get_class_names(data_dir)
+    paths, labels = [], []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(data_dir, class_name)
+        for root, dirs, files in os.walk(class_dir):
+            dirs.sort()
+            for file_name in sorted(files):
+                if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, file_name))
+                    labels.append(label)
+    return paths, labels, class_names
+
+
+def decode_and_resize(path, label, img_size):
+    """Decodes an image file to uint8 RGB at `img_size`, resized like create_tf_dataset (nearest)."""
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    image = tf.image.resize(image, img_size, method="nearest")
+    return tf.cast(image, tf.uint8), label
+
+
+def _serialize(image, label):
+    return tf.train.Example(features=tf.train.Features(feature={
+        "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+    })).SerializeToString()
+
+
+def write_tfrecord_shards(data_dir, output_dir, img_size=(224, 224), images_per_shard=1024, seed=42,
+                          compression=None):
+    """
+    One-time ingest of a class-subdirectory dataset into sharded TFRecord files of pre-decoded images.
+
+    Images are decoded and resized to `img_size` once (in parallel) and stored as raw uint8
+    pixels with their labels, so training epochs read a few large sequential files instead of
+    decoding thousands of full-size JPEGs. Files are shuffled (with `seed`) before sharding, so
+    every shard holds a mix of classes.
+
+    Args:
+        data_dir (str): Directory with class subdirectories (e.g. data/PlantVillage_Subset/train).
+        output_dir (str): Directory for the `shard-XXXXX-of-YYYYY.tfrecord` files and dataset_info.json.
+        img_size (tuple): Stored image size (height, width); the model input size.
+        images_per_shard (int): Images per shard file (a 224x224 image takes ~150 KB).
+        seed (int): Seed of the file order.
+        compression (str, optional): TFRecord compression ("GZIP", "ZLIB"), trading CPU for disk.
+
+    Returns:
+        dict: The dataset info (also written to `<output_dir>/dataset_info.json`).
+    """
+    paths, labels, class_names = list_image_files(data_dir)
+    if not paths:
+        raise ValueError(f"No images found in {data_dir}")
+    order = list(range(len(paths)))
+    random.Random(seed).shuffle(order)
+    paths = [paths[i] for i in order]
+    labels = [labels[i] for i in order]
+
+    num_shards = (len(paths) + images_per_shard - 1) // images_per_shard
+    os.makedirs(output_dir, exist_ok=True)
+    decoded = tf.data.Dataset.from_tensor_slices((paths, labels)).map(
+        lambda path, label: decode_and_resize(path, label, img_size),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True,
+    ).prefetch(tf.data.AUTOTUNE).as_numpy_iterator()
+
+    shards = []
+    for shard in range(num_shards):
+        file_name = f"shard-{shard:05d}-of-{num_shards:05d}.tfrecord"
+        count = min(images_per_shard, len(paths) - shard * images_per_shard)
+        with tf.io.TFRecordWriter(os.path.join(output_dir, file_name), options=compression) as writer:
+            for _ in range(count):
+                writer.write(_serialize(*next(decoded)))
+        shards.append({"file": file_name, "num_examples": count})
+        print(f"Wrote {file_name} ({count} images)")
+
+    info = {
+        "source_dir": os.path.abspath(data_dir),
+        "class_names": class_names,
+        "img_size": list(img_size),
+        "num_examples": len(paths),
+        "class_counts": [labels.count(label) for label in range(len(class_names))],
+        "compression": compression,
+        "shards": shards,
+    }
+    with open(os.path.join(output_dir, DATASET_INFO_FILE), "w") as f:
+        json.dump(info, f, indent=2)
+    return info
+
+
+def read_dataset_info(shard_dir):
+    """Returns the dataset_info.json written by write_tfrecord_shards."""
+    with open(os.path.join(shard_dir, DATASET_INFO_FILE)) as f:
+        return json.load(f)
+
+
+def read_class_counts(shard_dir):
+    """
+    Examples per class of the shards, in class name order: from dataset_info.json, or counted
+    from the records' labels for shards written before the counts were recorded there.
+    """
+    info = read_dataset_info(shard_dir)
+    if "class_counts" in info:
+        return info["class_counts"]
+    num_classes = len(info["class_names"])
+    files = [os.path.join(shard_dir, shard["file"]) for shard in info["shards"]]
+    labels = tf.data.TFRecordDataset(
+        files, compression_type=info.get("compression") or "", num_parallel_reads=tf.data.AUTOTUNE
+    ).batch(4096).map(lambda records: tf.io.parse_example(records, {"label": _FEATURES["label"]})["label"])
+    counts = labels.reduce(
+        tf.zeros([num_classes], tf.int64),
+        lambda total, batch: total + tf.math.bincount(
+            tf.cast(batch, tf.int32), minlength=num_classes, maxlength=num_classes, dtype=tf.int64
+        ),
+    )
+    return [int(count) for count in counts.numpy()]
+
+
+def load_tfrecord_dataset(shard_dir, batch_size, shuffle=True, seed=42, shuffle_buffer=4096, cycle_length=8,
+                          num_input_pipelines=1, input_pipeline_id=0, drop_remainder=False):
+    """
+    Reads shards written by write_tfrecord_shards as batches of (float32 images, int32 labels),
+    the same element structure as create_tf_dataset.
+
+    Shards are read with parallel interleave; with `shuffle`, the shard order and the examples
+    (through a `shuffle_buffer` window spanning several shards) are reshuffled every epoch in a
+    sequence fixed by `seed`. Records are parsed a batch at a time and the result is prefetched
+    with an autotuned buffer.
+
+    Args:
+        shard_dir (str): Directory of the shards and dataset_info.json.
+        batch_size (int): Batch size of the dataset.
+        shuffle (bool): Shuffle shards and examples (training); False reads them in the written order.
+        seed (int): Shuffle seed.
+        shuffle_buffer (int): Examples in the shuffle window.
+        cycle_length (int): Shards read concurrently.
+        num_input_pipelines (int): Number of workers reading the dataset (tf.distribute.InputContext);
+                                   each reads a disjoint part: whole shard files when there are at least
+                                   as many files as workers, every n-th record otherwise.
+        input_pipeline_id (int): This worker's index among them.
+        drop_remainder (bool): Drop the last partial batch, so every batch has `batch_size` examples
+                               (a static batch dimension, as synchronous multi-worker training expects).
+
+    Returns:
+        tf.data.Dataset: Batches of images (batch, height, width, 3) and labels.
+    """
+    info = read_dataset_info(shard_dir)
+    height, width = info["img_size"]
+    files = [os.path.join(shard_dir, shard["file"]) for shard in info["shards"]]
+
+    shard_files = num_input_pipelines > 1 and len(files) >= num_input_pipelines
+    if shard_files:
+        files = files[input_pipeline_id::num_input_pipelines]
+
+    dataset = tf.data.Dataset.from_tensor_slices(files)
+    if shuffle:
+        dataset = dataset.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.interleave(
+        lambda path: tf.data.TFRecordDataset(path, compression_type=info.get("compression") or ""),
+        cycle_length=min(cycle_length, len(files)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=True,
+    )
+    if num_input_pipelines > 1 and not shard_files:
+        dataset = dataset.shard(num_input_pipelines, input_pipeline_id)
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+
+    def parse_batch(records):
+        examples = tf.io.parse_example(records, _FEATURES)
+        images = tf.io.decode_raw(examples["image"], tf.uint8)
+        images = tf.reshape(images, [batch_size if drop_remainder else -1, height, width, 3])
+        return tf.cast(images, tf.float32), tf.cast(examples["label"], tf.int32)
+
+    dataset = dataset.batch(batch_size, drop_remainder=drop_remainder)
+    dataset = dataset.map(parse_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)